@@ -1,7 +1,7 @@
+# Deprecated: this copy is a variant of rebellion.rules; use rebellion.model.Model(..., rules='extension3_origin')
 # origin
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import Enum
 
 
@@ -170,24 +170,27 @@ class Model:
             cop.position = (nx, ny)
 
 
-# 实例化并运行模型
-AGENT_DENSITY = 20
-COP_DENSITY = 1
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.7
-MAX_JAIL_TERM = 200
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(200):
-    model.step()
-
-# 绘制结果
-plt.figure(figsize=(10, 6))
-plt.plot(model.data['quiet'], label='Quiet Agents', color="green")
-plt.plot(model.data['jail'], label='Jailed Agents',color="black")
-plt.plot(model.data['active'], label='Active Agents',color="red")
-plt.xlabel('Time Steps')
-plt.ylabel('Number of Agents')
-plt.title('Agent Status Over Time')
-plt.legend()
-plt.show()
\ No newline at end of file
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    # 实例化并运行模型
+    AGENT_DENSITY = 20
+    COP_DENSITY = 1
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.7
+    MAX_JAIL_TERM = 200
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(200):
+        model.step()
+
+    # 绘制结果
+    plt.figure(figsize=(10, 6))
+    plt.plot(model.data['quiet'], label='Quiet Agents', color="green")
+    plt.plot(model.data['jail'], label='Jailed Agents',color="black")
+    plt.plot(model.data['active'], label='Active Agents',color="red")
+    plt.xlabel('Time Steps')
+    plt.ylabel('Number of Agents')
+    plt.title('Agent Status Over Time')
+    plt.legend()
+    plt.show()
\ No newline at end of file
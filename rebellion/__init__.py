@@ -0,0 +1,6 @@
+"""
+Importable tooling for the Rebellion model replication.
+
+The scripts under `scripts/` are the experiments used in the report; this
+package holds the reusable pieces they (and the notebooks) can share.
+"""
@@ -0,0 +1,328 @@
+"""
+Reader for NetLogo BehaviorSpace exports (table and spreadsheet formats).
+
+BehaviorSpace files start with a multi-line preamble (NetLogo version, model
+file, experiment name, timestamp, world size and, for the spreadsheet format,
+per-run parameter values and summary rows) followed by the actual data. The
+preamble is parsed with the csv module, which is cheap because it is only a
+handful of lines. The data block is located with a memory map (no Python-level
+scan of the file) and parsed in a single pass either by pyarrow, when it is
+installed, or by NumPy's C tokenizer.
+
+Both formats are returned in the same long, columnar layout: one array per
+column with one row per (run, step), so `rep1.nlogo.csv` (spreadsheet) and a
+table export of the same experiment produce identical `columns`.
+
+Example:
+    result = read_behaviorspace('scripts/replication/rep1.nlogo.csv')
+    result.runs[1]['government-legitimacy']   # 0.9
+    result.columns['count agents with [active?]']
+"""
+import csv
+import io
+import mmap
+
+import numpy as np
+
+RUN_COLUMN = '[run number]'
+STEP_COLUMN = '[step]'
+
+TABLE = 'table'
+SPREADSHEET = 'spreadsheet'
+
+# Rows of the spreadsheet preamble that summarise runs rather than describe them
+_SUMMARY_ROWS = ('[final]', '[min]', '[max]', '[mean]', '[total steps]', '[steps]')
+
+
+class BehaviorSpaceResult:
+    """The parsed content of one BehaviorSpace export."""
+    def __init__(self, path, format, netlogo_version, model, experiment, timestamp, world,
+                 runs, reporters, columns):
+        """
+        Initializes a BehaviorSpaceResult object.
+
+        Parameters:
+        path (str): The file the result was read from.
+        format (str): Either 'table' or 'spreadsheet'.
+        netlogo_version (str): The NetLogo version string from the first line.
+        model (str): The model file name, e.g. 'Rebellion.nlogo'.
+        experiment (str): The BehaviorSpace experiment name.
+        timestamp (str): The export timestamp as written by NetLogo.
+        world (dict): The world dimensions (min-pxcor, max-pxcor, ...).
+        runs (dict): Maps each run number to a dict of its parameter values.
+        reporters (list): The reporter expressions, in export order.
+        columns (dict): Maps each column name to a NumPy array (one row per run and step).
+        """
+        self.path = path
+        self.format = format
+        self.netlogo_version = netlogo_version
+        self.model = model
+        self.experiment = experiment
+        self.timestamp = timestamp
+        self.world = world
+        self.runs = runs
+        self.reporters = reporters
+        self.columns = columns
+
+    def __repr__(self):
+        return (f"BehaviorSpaceResult({self.experiment!r}, format={self.format!r}, "
+                f"runs={len(self.runs)}, rows={len(self)})")
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    @property
+    def parameters(self):
+        """list: The names of the varied/fixed model parameters."""
+        names = []
+        for values in self.runs.values():
+            for name in values:
+                if name not in names:
+                    names.append(name)
+        return names
+
+    def run(self, run_number):
+        """
+        Returns the columns restricted to a single run.
+
+        Parameters:
+        run_number (int): The BehaviorSpace run number.
+
+        Returns:
+        dict: Maps each column name to the rows of that run.
+        """
+        mask = self.columns[RUN_COLUMN] == run_number
+        return {name: values[mask] for name, values in self.columns.items()}
+
+    def to_arrow(self):
+        """
+        Converts the columns to a pyarrow Table (requires pyarrow).
+
+        Returns:
+        pyarrow.Table: The data, sharing memory with the NumPy columns where possible.
+        """
+        import pyarrow as pa
+        return pa.table(self.columns)
+
+
+def read_behaviorspace(path, engine='auto'):
+    """
+    Reads a BehaviorSpace export in table or spreadsheet format.
+
+    Parameters:
+    path (str): The path of the CSV file.
+    engine (str, optional): 'arrow', 'numpy' or 'auto' (arrow if importable). Defaults to 'auto'.
+
+    Returns:
+    BehaviorSpaceResult: The parsed preamble and columnar data.
+    """
+    if engine not in ('auto', 'arrow', 'numpy'):
+        raise ValueError(f"Unknown engine {engine!r}; expected 'auto', 'arrow' or 'numpy'")
+    if engine == 'auto':
+        try:
+            import pyarrow.csv  # noqa: F401
+            engine = 'arrow'
+        except ImportError:
+            engine = 'numpy'
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        first_line = _read_line(mm, 0).decode('utf-8')
+        title = next(csv.reader([first_line]))
+        if len(title) < 2 or not title[0].startswith('BehaviorSpace results'):
+            raise ValueError(f"{path} is not a BehaviorSpace export")
+        netlogo_version = title[0][len('BehaviorSpace results'):].strip(' ()')
+        if title[1].startswith('Table'):
+            fmt = TABLE
+            header_offset, data_offset = _line_offset(mm, 6), _line_offset(mm, 7)
+        elif title[1].startswith('Spreadsheet'):
+            fmt = SPREADSHEET
+            marker = mm.find(b'"[all run data]"')
+            if marker < 0:
+                raise ValueError(f"{path} has no '[all run data]' section")
+            header_offset = marker
+            data_offset = mm.find(b'\n', marker) + 1
+        else:
+            raise ValueError(f"Unknown BehaviorSpace format {title[1]!r} in {path}")
+        preamble = list(csv.reader(io.StringIO(mm[:header_offset].decode('utf-8'))))
+        header = next(csv.reader([_read_line(mm, header_offset).decode('utf-8')]))
+
+    model, experiment, timestamp = preamble[1][0], preamble[2][0], preamble[3][0]
+    world = {name: _parse_value(value) for name, value in zip(preamble[4], preamble[5])}
+    raw = _load_body(path, data_offset, len(header), engine)
+
+    if fmt == TABLE:
+        columns = {name: _convert(raw[i]) for i, name in enumerate(header)}
+        step_index = header.index(STEP_COLUMN)
+        reporters = header[step_index + 1:]
+        parameter_names = header[1:step_index]
+        runs = {}
+        if len(columns[RUN_COLUMN]):
+            run_numbers, first_rows = np.unique(columns[RUN_COLUMN], return_index=True)
+            for run_number, row in zip(run_numbers.tolist(), first_rows.tolist()):
+                runs[run_number] = {name: _item(columns[name][row]) for name in parameter_names}
+        return BehaviorSpaceResult(path, fmt, netlogo_version, model, experiment, timestamp,
+                                   world, runs, reporters, columns)
+
+    runs, reporters, columns = _reshape_spreadsheet(preamble[6:], header, raw)
+    return BehaviorSpaceResult(path, fmt, netlogo_version, model, experiment, timestamp,
+                               world, runs, reporters, columns)
+
+
+def _read_line(mm, offset):
+    end = mm.find(b'\n', offset)
+    return mm[offset:end if end >= 0 else len(mm)].rstrip(b'\r')
+
+
+def _line_offset(mm, line_number):
+    offset = 0
+    for _ in range(line_number):
+        offset = mm.find(b'\n', offset) + 1
+        if offset == 0:
+            return len(mm)
+    return offset
+
+
+def _load_body(path, offset, width, engine):
+    """
+    Parses the data block starting at a byte offset into a list of columns.
+
+    pyarrow infers each column's type while parsing (numbers, booleans, strings; empty cells of
+    numeric columns become NaN), so its columns need no further conversion. NumPy returns strings.
+    """
+    if engine == 'arrow':
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+        source = pa.memory_map(path)
+        source.seek(offset)
+        table = pacsv.read_csv(
+            source,
+            read_options=pacsv.ReadOptions(column_names=[f'c{i}' for i in range(width)]),
+            convert_options=pacsv.ConvertOptions(strings_can_be_null=False))
+        return [column.to_numpy() for column in table.columns]
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        f.seek(offset)
+        body = np.loadtxt(f, delimiter=',', quotechar='"', dtype=str, ndmin=2,
+                          usecols=range(width), comments=None)
+    if body.shape[0] == 0:
+        return [np.empty(0, dtype=str) for _ in range(width)]
+    return [body[:, i] for i in range(width)]
+
+
+def _convert(values):
+    """
+    Converts a column to int, float or bool where every value allows it.
+    """
+    if values.dtype.kind == 'O':
+        # Columns pyarrow could not type (booleans with gaps, or nothing but gaps)
+        values = np.array(['nan' if value is None else str(value) for value in values])
+    if values.dtype.kind in 'biu':
+        return values
+    try:
+        numeric = values.astype(np.float64)
+    except ValueError:
+        lowered = np.char.lower(values)
+        if np.isin(lowered, ('true', 'false')).all():
+            return lowered == 'true'
+        return values
+    if numeric.size and np.isfinite(numeric).all() and (numeric == np.round(numeric)).all():
+        return numeric.astype(np.int64)
+    return numeric
+
+
+def _blank(values):
+    """
+    Marks the empty cells of a column (empty strings, or the NaN/None pyarrow reads them as).
+    """
+    if values.dtype.kind == 'f':
+        return np.isnan(values)
+    if values.dtype.kind == 'O':
+        return np.array([value is None or value == '' for value in values], dtype=bool)
+    if values.dtype.kind == 'U':
+        return values == ''
+    return np.zeros(len(values), dtype=bool)
+
+
+def _concatenate(parts):
+    """
+    Joins the pieces of a column, as strings unless every piece is numeric or boolean.
+    """
+    if all(part.dtype.kind in 'biuf' for part in parts):
+        return np.concatenate(parts)
+    return np.concatenate([part.astype(str) for part in parts])
+
+
+def _reshape_spreadsheet(rows, header, raw):
+    """
+    Turns the wide spreadsheet layout (one column block per run) into long columns.
+    """
+    run_row = next(row for row in rows if row and row[0] == RUN_COLUMN)
+    parameter_rows = []
+    reporter_row = None
+    for row in rows[rows.index(run_row) + 1:]:
+        if not row or row[0] in _SUMMARY_ROWS:
+            continue
+        if row[0] == '[reporter]':
+            reporter_row = row
+            break
+        parameter_rows.append(row)
+    names = reporter_row if reporter_row is not None else header
+
+    # Column blocks: the run number is repeated over every column of a run's block
+    blocks = {}
+    for col, cell in enumerate(run_row[1:], start=1):
+        if cell:
+            blocks.setdefault(int(cell), []).append(col)
+    reporters = []
+    for cols in blocks.values():
+        for col in cols:
+            if names[col] != STEP_COLUMN and names[col] not in reporters:
+                reporters.append(names[col])
+
+    runs = {}
+    for run_number, cols in blocks.items():
+        first = cols[0]
+        runs[run_number] = {row[0]: _parse_value(row[first]) for row in parameter_rows
+                            if first < len(row)}
+
+    pieces = {name: [] for name in [RUN_COLUMN] + [row[0] for row in parameter_rows]
+              + [STEP_COLUMN] + reporters}
+    for run_number, cols in blocks.items():
+        by_name = {names[col]: raw[col] for col in cols}
+        # Shorter runs leave trailing empty cells in their block
+        present = ~_blank(by_name.get(STEP_COLUMN, raw[cols[0]]))
+        length = int(present.sum())
+        pieces[RUN_COLUMN].append(np.full(length, run_number, dtype=np.int64))
+        for row in parameter_rows:
+            value = runs[run_number].get(row[0])
+            pieces[row[0]].append(np.full(length, value, dtype=object))
+        if STEP_COLUMN in by_name:
+            pieces[STEP_COLUMN].append(by_name[STEP_COLUMN][present])
+        else:
+            pieces[STEP_COLUMN].append(np.arange(length).astype(str))
+        for name in reporters:
+            pieces[name].append(by_name.get(name, np.full(len(present), np.nan))[present])
+
+    columns = {}
+    for name, parts in pieces.items():
+        values = _concatenate(parts) if parts else np.empty(0, dtype=str)
+        columns[name] = values if name == RUN_COLUMN else _convert(values)
+    return runs, reporters, columns
+
+
+def _parse_value(value):
+    """
+    Parses one NetLogo value (number, boolean or string) from the preamble.
+    """
+    if value in ('true', 'false'):
+        return value == 'true'
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return int(number) if number.is_integer() and 'e' not in value.lower() else number
+
+
+def _item(value):
+    return value.item() if isinstance(value, np.generic) else value
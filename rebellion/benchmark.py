@@ -0,0 +1,131 @@
+"""
+Benchmarks of import time and simulation throughput.
+
+Process-pool sweeps start a fresh interpreter per worker (always with the
+'spawn' start method, and on every pool with 'forkserver'), so the time to
+import a module is paid hundreds of times per sweep. `import_times` measures
+every module of the package in a fresh interpreter with `python -X
+importtime` and lists the heavy third-party packages it loads; the core
+modules (`rebellion`, `rebellion.model`, `rebellion.metrics`) must stay
+free of them. `step_times` measures steps per second of each engine.
+
+Run `python -m rebellion bench` to print both tables.
+"""
+import os
+import re
+import subprocess
+import sys
+import time
+
+MODULES = ('rebellion', 'rebellion.model', 'rebellion.counter', 'rebellion.metrics', 'rebellion.cli',
+           'rebellion.ledger', 'rebellion.cache', 'rebellion.experiment', 'rebellion.sweep', 'rebellion.trace',
+           'rebellion.spatial', 'rebellion.render', 'rebellion.network', 'rebellion.meanfield',
+           'rebellion.equivalence', 'rebellion.divergence', 'rebellion.ensemble', 'rebellion.behaviorspace',
+           'rebellion.store', 'rebellion.surrogate', 'rebellion.sensitivity', 'rebellion.kernel')
+# Modules that must import without any of the HEAVY packages
+CORE = ('rebellion', 'rebellion.model', 'rebellion.metrics', 'rebellion.cli')
+HEAVY = ('numpy', 'numba', 'scipy', 'matplotlib', 'pyarrow', 'yaml')
+BENCHMARK_PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82,
+                            max_jail_term=30)
+
+_IMPORTTIME = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def _package_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module, repeat=5):
+    """
+    Measures the time to import a module in a fresh interpreter.
+
+    Parameters:
+    module (str): The dotted module name.
+    repeat (int, optional): The number of interpreters started; the fastest counts. Defaults to 5.
+
+    Returns:
+    tuple: (seconds, list of the HEAVY packages the import loaded).
+    """
+    best = None
+    heavy = []
+    code = f"import sys, {module}; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [_package_root(), os.environ.get('PYTHONPATH')])))
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                                env=env, check=True)
+        cumulative = None
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME.match(line)
+            if match and match.group(4) == module:
+                cumulative = int(match.group(2)) / 1e6
+        if cumulative is None:  # Already imported by the interpreter itself
+            cumulative = 0.0
+        best = cumulative if best is None else min(best, cumulative)
+        heavy = [name for name in result.stdout.strip().split(',') if name]
+    return best, heavy
+
+
+def import_times(modules=MODULES, repeat=5):
+    """
+    Measures the import time of several modules.
+
+    Parameters:
+    modules (iterable, optional): The dotted module names. Defaults to every module of the package.
+    repeat (int, optional): Interpreters started per module. Defaults to 5.
+
+    Returns:
+    list: (module, seconds, heavy packages) triples.
+    """
+    return [(module,) + import_time(module, repeat) for module in modules]
+
+
+def step_time(engine='object', ticks=100, seed=0, params=None):
+    """
+    Measures the steps per second of an engine, excluding construction.
+
+    Parameters:
+    engine (str, optional): 'object' (rebellion.model) or 'kernel' (rebellion.kernel). Defaults to 'object'.
+    ticks (int, optional): The number of steps timed. Defaults to 100.
+    seed (int, optional): The seed of the run. Defaults to 0.
+    params (dict, optional): Model parameters. Defaults to BENCHMARK_PARAMETERS.
+
+    Returns:
+    tuple: (seconds for construction, seconds per step).
+    """
+    if engine == 'kernel':
+        from .kernel import KernelModel as engine_class
+        engine_class(**(params or BENCHMARK_PARAMETERS), seed=seed).run(1)  # Compile outside the timing
+    else:
+        from .model import Model as engine_class
+    started = time.perf_counter()
+    model = engine_class(**(params or BENCHMARK_PARAMETERS), seed=seed)
+    built = time.perf_counter()
+    model.run(ticks)
+    return built - started, (time.perf_counter() - built) / ticks
+
+
+def main(stream=sys.stdout, repeat=5, ticks=100, engines=('object', 'kernel')):
+    """
+    Prints the import and step benchmarks.
+
+    Parameters:
+    stream (file, optional): Where the tables are written. Defaults to sys.stdout.
+    repeat (int, optional): Interpreters started per module. Defaults to 5.
+    ticks (int, optional): Steps timed per engine. Defaults to 100.
+    engines (iterable, optional): The engines timed. Defaults to both.
+
+    Returns:
+    int: 1 if a core module loaded a heavy package, else 0.
+    """
+    status = 0
+    stream.write(f"{'module':<24}{'import ms':>10}  heavy dependencies\n")
+    for module, seconds, heavy in import_times(repeat=repeat):
+        flag = ' (core module!)' if heavy and module in CORE else ''
+        if flag:
+            status = 1
+        stream.write(f"{module:<24}{seconds * 1000:>10.1f}  {', '.join(heavy) or '-'}{flag}\n")
+    stream.write(f"\n{'engine':<24}{'setup ms':>10}{'step ms':>10}\n")
+    for engine in engines:
+        setup, step = step_time(engine, ticks)
+        stream.write(f"{engine:<24}{setup * 1000:>10.1f}{step * 1000:>10.2f}\n")
+    return status
@@ -0,0 +1,354 @@
+"""
+Content-addressed cache of simulation runs.
+
+A run is identified by the hash of everything that determines its output:
+the model variant, the constructor parameters, the schedule (per-tick policy
+such as legitimacy decay or cop removal), the seed and the number of ticks.
+Each entry is one compressed `.npz` file holding the per-tick series, the
+summary metrics and the description the key was computed from, so a cached
+file always records which parameters and seed produced it.
+
+Entries are evicted least-recently-used first once the cache grows past
+`max_bytes` or `max_entries`; a hit refreshes the file's modification time,
+which serves as the LRU clock and is shared by every process using the same
+directory. A cache keeps a running total of the entries instead of scanning
+the directory on every store; it scans when the total crosses a limit (and
+then evicts down to `LOW_WATER` of it), or after a tenth of the counted
+entries were added, which also picks up the entries of other processes.
+
+Example:
+    cache = RunCache('.rebellion-cache', max_bytes=500 * 2 ** 20)
+    run = cache.get_or_run(dict(agent_density=70, cop_density=4, vision=7, k=2.3,
+                                gov_legitimacy=0.65, max_jail_term=30), seed=1, ticks=200)
+    run.data['active'], run.summary['peak_active']
+"""
+import functools
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .metrics import summarize
+from .model import Model
+
+# Bump when the stored layout or the meaning of a key changes
+CACHE_VERSION = 3
+# A store that crosses a limit evicts down to this fraction of it, so the next stores do not scan again
+LOW_WATER = 0.9
+
+
+def _canonical(value):
+    """
+    Normalises a value so that equal configurations hash equally (70 == 70.0).
+    """
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def run_key(params, seed, ticks, variant='origin', schedule=None):
+    """
+    Computes the cache key of a run.
+
+    Parameters:
+    params (dict): Keyword arguments of the model constructor (without the seed).
+    seed (int): The seed of the run.
+    ticks (int): The number of steps.
+    variant (str, optional): The name of the model variant. Defaults to 'origin'.
+    schedule (object, optional): A JSON-serialisable description of per-tick policies. Defaults to None.
+
+    Returns:
+    str: The hex SHA-256 digest identifying the run.
+    """
+    spec = describe_run(params, seed, ticks, variant, schedule)
+    payload = json.dumps(spec, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def describe_run(params, seed, ticks, variant='origin', schedule=None):
+    """
+    Returns the canonical description a run's key is computed from.
+    """
+    return {
+        'version': CACHE_VERSION,
+        'variant': variant,
+        'params': _canonical(params),
+        'schedule': _canonical(schedule),
+        'seed': _canonical(seed),
+        'ticks': int(ticks),
+    }
+
+
+def simulate(params, seed, ticks, rules='origin'):
+    """
+    Runs the object model and returns its series.
+
+    Parameters:
+    params (dict): Keyword arguments of the Model constructor (without the seed).
+    seed (int): The seed of the run.
+    ticks (int): The number of steps.
+    rules (str, optional): The model variant (see rebellion.rules.VARIANTS). Defaults to 'origin'.
+
+    Returns:
+    dict: The 'quiet', 'jail' and 'active' series (plus the variant's extra series).
+    """
+    return Model(**params, seed=seed, rules=rules).run(ticks)
+
+
+class CachedRun:
+    """One run served from (or stored into) the cache."""
+    def __init__(self, key, spec, data, summary):
+        """
+        Initializes a CachedRun object.
+
+        Parameters:
+        key (str): The run's cache key.
+        spec (dict): The description the key was computed from.
+        data (dict): Maps each series name to a NumPy array with one value per tick.
+        summary (dict): The summary metrics of the run.
+        """
+        self.key = key
+        self.spec = spec
+        self.data = data
+        self.summary = summary
+
+    def __repr__(self):
+        return f"CachedRun({self.key[:12]}, {self.spec['variant']}, seed={self.spec['seed']})"
+
+
+class RunCache:
+    """A directory of compressed runs addressed by their configuration hash."""
+    def __init__(self, directory, max_bytes=None, max_entries=None):
+        """
+        Initializes a RunCache object.
+
+        Parameters:
+        directory (str): Where the entries are stored; created if missing.
+        max_bytes (int, optional): Evict LRU entries beyond this total size. Defaults to unlimited.
+        max_entries (int, optional): Evict LRU entries beyond this count. Defaults to unlimited.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # Size and count of the entries as of the last scan plus the entries stored since
+        self._bytes = None
+        self._count = 0
+        self._stored = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        """
+        Returns the file an entry is (or would be) stored in.
+
+        Parameters:
+        key (str): The run's cache key.
+
+        Returns:
+        str: The path of the .npz file.
+        """
+        return os.path.join(self.directory, key[:2], key + '.npz')
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def __len__(self):
+        return len(self._entries())
+
+    def get(self, key):
+        """
+        Loads a run, refreshing its LRU position.
+
+        Parameters:
+        key (str): The run's cache key.
+
+        Returns:
+        CachedRun: The cached run, or None if it is not cached.
+        """
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                meta = json.loads(stored['__meta__'].item())
+                data = {name: stored[name] for name in meta['series']}
+        except (FileNotFoundError, KeyError, ValueError, OSError):
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # Evicted by another process in the meantime; the loaded copy is still valid
+        self.hits += 1
+        return CachedRun(key, meta['spec'], data, meta['summary'])
+
+    def put(self, key, spec, data, summary):
+        """
+        Stores a run atomically and applies the eviction policy.
+
+        Parameters:
+        key (str): The run's cache key.
+        spec (dict): The description the key was computed from.
+        data (dict): Maps each series name to a sequence with one value per tick.
+        summary (dict): The summary metrics of the run.
+
+        Returns:
+        CachedRun: The stored run.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {name: np.asarray(values) for name, values in data.items()}
+        summary = _canonical(summary)
+        meta = json.dumps({'spec': spec, 'summary': summary, 'series': list(arrays)})
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez_compressed(f, __meta__=np.array(meta), **arrays)
+            size = os.path.getsize(tmp)
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = None
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self._record(size, replaced)
+        return CachedRun(key, spec, arrays, summary)
+
+    def _record(self, size, replaced):
+        """
+        Adds a stored entry to the running total and evicts when a limit may be exceeded.
+        """
+        if self.max_bytes is None and self.max_entries is None:
+            return
+        if self._bytes is None:
+            self.evict()
+            return
+        self._bytes += size - (replaced or 0)
+        self._count += replaced is None
+        self._stored += 1
+        over_size = self.max_bytes is not None and self._bytes > self.max_bytes
+        over_count = self.max_entries is not None and self._count > self.max_entries
+        if over_size or over_count:
+            self.evict(LOW_WATER)
+        elif self._stored > self._count // 10:
+            self.evict()
+
+    def get_or_run(self, params, seed, ticks, variant='origin', schedule=None, run=None):
+        """
+        Returns a run from the cache, simulating and storing it on a miss.
+
+        Parameters:
+        params (dict): Keyword arguments of the model constructor (without the seed).
+        seed (int): The seed of the run.
+        ticks (int): The number of steps.
+        variant (str, optional): The name of the model variant. Defaults to 'origin'.
+        schedule (object, optional): A JSON-serialisable description of per-tick policies. Defaults to None.
+        run (callable, optional): (params, seed, ticks) -> series dict, used on a miss; it must run
+            `variant` and `schedule`. Defaults to simulate with the rules of `variant` (a name of
+            rebellion.rules.VARIANTS; the default cannot apply a schedule).
+
+        Returns:
+        CachedRun: The cached or freshly computed run.
+        """
+        if run is None:
+            if schedule:
+                raise ValueError("The default runner cannot apply a schedule; pass run")
+            run = functools.partial(simulate, rules=variant)
+        key = run_key(params, seed, ticks, variant, schedule)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        data = run(params, seed, ticks)
+        spec = describe_run(params, seed, ticks, variant, schedule)
+        return self.put(key, spec, data, summarize(data))
+
+    def _entries(self):
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.npz'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def summaries(self):
+        """
+        Yields the description and summary of every entry without loading the series.
+
+        Reading summaries does not count as a use for LRU purposes.
+
+        Returns:
+        generator: (spec, summary) pairs in no particular order.
+        """
+        for _, _, path in self._entries():
+            try:
+                with np.load(path, allow_pickle=False) as stored:
+                    meta = json.loads(stored['__meta__'].item())
+            except (FileNotFoundError, KeyError, ValueError, OSError):
+                continue
+            yield meta['spec'], meta['summary']
+
+    def size(self):
+        """
+        Returns the total size of the cached entries.
+
+        Returns:
+        int: The size in bytes.
+        """
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, fraction=1.0):
+        """
+        Removes least-recently-used entries until the size and count limits hold.
+
+        Scans the directory and resets the running total to what is left.
+
+        Parameters:
+        fraction (float, optional): Evict down to this fraction of the limits. Defaults to 1.0.
+
+        Returns:
+        int: The number of removed entries.
+        """
+        if self.max_bytes is None and self.max_entries is None:
+            return 0
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            over_size = self.max_bytes is not None and total > self.max_bytes * fraction
+            over_count = self.max_entries is not None and len(entries) - removed > self.max_entries * fraction
+            if not (over_size or over_count):
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        self._bytes, self._count, self._stored = total, len(entries) - removed, 0
+        return removed
+
+    def clear(self):
+        """
+        Removes every entry.
+        """
+        self._bytes = None
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
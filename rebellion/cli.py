@@ -0,0 +1,174 @@
+"""
+Command-line entry point: `python -m rebellion <command> ...`.
+"""
+import argparse
+import sys
+
+
+def sweep(args):
+    """Runs an experiment file."""
+    from .experiment import Experiment, execute, parse_memory, write_summary
+
+    experiment = Experiment.from_file(args.experiment)
+    if args.cache is not None:
+        experiment.cache = args.cache or None
+    if args.ledger is not None:
+        experiment.ledger = args.ledger or None
+    if args.store is not None:
+        experiment.store = args.store or None
+    if args.dry_run:
+        for params, seed in experiment.jobs():
+            print(params, seed)
+        return 0
+    memory_limit = parse_memory(args.max_memory) if args.max_memory else None
+    results = execute(experiment, backend=args.backend, workers=args.workers, memory_limit=memory_limit,
+                      batch_size=args.batch_size, progress=None if args.quiet else sys.stderr,
+                      retry_failed=args.retry_failed)
+    write_summary(experiment, results, args.output)
+    if not args.quiet:
+        print(f"Wrote {len(results)} runs to {args.output or experiment.output}", file=sys.stderr)
+    if experiment.store:
+        from .store import record_experiment
+        added = record_experiment(experiment, results, backend=args.backend)
+        if not args.quiet:
+            print(f"Added {added} runs to {experiment.store}", file=sys.stderr)
+    return 0
+
+
+def bench(args):
+    """Prints the import-time and step-time benchmarks."""
+    from .benchmark import main as run_benchmarks
+
+    return run_benchmarks(repeat=args.repeat, ticks=args.ticks, engines=args.engines)
+
+
+def equivalence(args):
+    """Checks a candidate engine against the reference engine over the case matrix."""
+    from .equivalence import check, format_report
+
+    report = check(args.candidate, reference=args.reference, mode=args.mode, names=args.cases, ticks=args.ticks,
+                   seeds=args.seeds, exact_seeds=args.exact_seeds, alpha=args.alpha, workers=args.workers)
+    print(format_report(report))
+    return 0 if report['passed'] else 1
+
+
+def divergence(args):
+    """Finds the first tick at which two variants diverge."""
+    from .divergence import find_divergence, format_divergence, parse_assignment
+    from .equivalence import BASE_PARAMETERS
+
+    params = dict(BASE_PARAMETERS, **dict(parse_assignment(assignment) for assignment in args.set))
+    result = find_divergence(args.first, args.second, params, seed=args.seed, ticks=args.ticks,
+                             interval=args.interval)
+    print(format_divergence(result, limit=args.limit))
+    return 0 if result['tick'] is None else 1
+
+
+def query(args):
+    """Prints an aggregation of a result store."""
+    from .divergence import parse_assignment
+    from .store import ResultStore, format_table
+
+    store = ResultStore(args.store)
+    try:
+        where = {}
+        for condition in args.where:
+            name, value = parse_assignment(condition)
+            where[name] = tuple(value) if isinstance(value, list) and len(value) == 2 and args.range else value
+        print(format_table(store.aggregate(args.metric, where, args.by)))
+    finally:
+        store.close()
+    return 0
+
+
+def build_parser():
+    """
+    Builds the argument parser with one sub-command per tool.
+
+    Returns:
+    argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog='python -m rebellion', description=__doc__.strip())
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('sweep', help='run a declarative experiment file (.toml/.yaml/.json)')
+    command.add_argument('experiment', help='the experiment file')
+    command.add_argument('--backend', choices=('serial', 'process', 'array'), default='serial',
+                         help='serial: object model in-process; process: object model on a process pool; '
+                              'array: compiled kernel (rebellion.kernel), one run per job (default: serial)')
+    command.add_argument('--workers', type=int, default=None, help='worker processes (default: all CPUs)')
+    command.add_argument('--max-memory', default=None,
+                         help='address-space limit per worker (serial: while running), e.g. 2G')
+    command.add_argument('--batch-size', type=int, default=4, help='jobs sent to a worker at once (default: 4)')
+    command.add_argument('--cache', default=None,
+                         help="run cache directory (overrides the file; '' disables caching and resuming)")
+    command.add_argument('--ledger', default=None,
+                         help="SQLite job ledger shared by concurrent invocations (overrides the file; '' disables)")
+    command.add_argument('--retry-failed', action='store_true',
+                         help='give ledger jobs that failed every attempt another round of attempts')
+    command.add_argument('--output', default=None, help='summary CSV path (overrides the file)')
+    command.add_argument('--store', default=None,
+                         help="result store directory the runs are added to (overrides the file; '' disables)")
+    command.add_argument('--dry-run', action='store_true', help='list the jobs without running them')
+    command.add_argument('--quiet', action='store_true', help='do not report progress')
+    command.set_defaults(handler=sweep)
+
+    command = commands.add_parser('bench', help='measure import time of every module and step time of the engines')
+    command.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module (default: 5)')
+    command.add_argument('--ticks', type=int, default=100, help='steps timed per engine (default: 100)')
+    command.add_argument('--engines', nargs='*', choices=('object', 'kernel'), default=['object', 'kernel'],
+                         help='engines to time (default: both)')
+    command.set_defaults(handler=bench)
+
+    command = commands.add_parser('equivalence', help='check that an engine simulates the same model as the reference')
+    command.add_argument('candidate', nargs='?', default='kernel',
+                         help="the engine checked: 'object', 'kernel' or 'module:Class' (default: kernel)")
+    command.add_argument('--reference', default='object', help='the trusted engine (default: object)')
+    command.add_argument('--mode', choices=('exact', 'statistical', 'both'), default='both',
+                         help='exact: identical runs with the counter generator; statistical: equivalent '
+                              'ensembles with each engine\'s own generator (default: both)')
+    command.add_argument('--cases', nargs='*', default=None, help='the cases run (default: all)')
+    command.add_argument('--ticks', type=int, default=100, help='steps per run (default: 100)')
+    command.add_argument('--seeds', type=int, default=20,
+                         help='runs per engine and case, statistical mode (default: 20)')
+    command.add_argument('--exact-seeds', type=int, default=2, help='seeds per case, exact mode (default: 2)')
+    command.add_argument('--alpha', type=float, default=0.001,
+                         help='chance that a correct engine fails a statistical case (default: 0.001)')
+    command.add_argument('--workers', type=int, default=None, help='worker processes (default: all CPUs)')
+    command.set_defaults(handler=equivalence)
+
+    command = commands.add_parser('divergence', help='find the first tick and turtles where two variants diverge')
+    command.add_argument('first', help="the reference variant: 'object', 'kernel', a model file such as "
+                                       "src/model_v4.5_lwz.py, or 'module:Class', with ',name=value' options")
+    command.add_argument('second', help='the variant compared with it')
+    command.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                         help='a model parameter of both variants (repeatable)')
+    command.add_argument('--seed', type=int, default=0, help='the seed of both variants (default: 0)')
+    command.add_argument('--ticks', type=int, default=1000, help='the length of the run (default: 1000)')
+    command.add_argument('--interval', type=int, default=50, help='ticks between checkpoints (default: 50)')
+    command.add_argument('--limit', type=int, default=20, help='differing turtles listed (default: 20)')
+    command.set_defaults(handler=divergence)
+
+    command = commands.add_parser('query', help='aggregate a metric of a result store, filtered and grouped')
+    command.add_argument('store', help='the result store directory')
+    command.add_argument('metric', help='the aggregated column, e.g. peak_active')
+    command.add_argument('--where', action='append', default=[], metavar='NAME=VALUE',
+                         help='a filter; a JSON list value matches any of its items (repeatable)')
+    command.add_argument('--range', action='store_true', help='read two-item list values as (low, high) ranges')
+    command.add_argument('--by', nargs='*', default=[], help='the grouping columns')
+    command.set_defaults(handler=query)
+    return parser
+
+
+def main(argv=None):
+    """
+    Parses the command line and runs the selected command.
+
+    Parameters:
+    argv (list, optional): The arguments. Defaults to sys.argv[1:].
+
+    Returns:
+    int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
@@ -0,0 +1,102 @@
+"""
+Counter-based random numbers keyed by (seed, tick, turtle, purpose).
+
+`Model` and `KernelModel` normally draw from a sequential generator, so the
+numbers a turtle gets depend on how many were drawn before it: on the loop
+structure of the engine, not on the model. With `rng='counter'` every draw
+is instead a pure function of its key, computed with the Threefry-2x64-13
+block cipher of Salmon et al. (Random123): the seed and the purpose of the
+draw form the cipher key, the tick and the turtle (or cell) id the counter.
+Any engine, loop order or worker partition then sees the same numbers, and
+two engines implementing the same rules produce the same run, tick for tick.
+
+The draws of a run:
+
+- SHUFFLE: the update order is the turtles sorted by their key of the tick
+  (ties by id), which is a uniformly random permutation;
+- MOVE, ARREST: the index into the candidate list of a moving turtle or an
+  arresting cop, int(u * len(candidates));
+- JAIL: the term of an arrested agent (keyed by the agent), int(u * (max + 1));
+- RISK_AVERSION, HARDSHIP, VISION: the attributes of a turtle, at
+  INITIAL_TICK;
+- PLACE: the initial cells are the cells sorted by their key (ties by id).
+
+This module is plain Python; `rebellion.kernel` has a compiled copy of
+`threefry` for the array engine.
+
+Example:
+    uniform(seed=7, tick=12, key=301, purpose=MOVE)
+"""
+
+MASK = (1 << 64) - 1
+# Rotation constants and key-schedule parity of Threefry-2x64
+ROTATIONS = (16, 42, 12, 31, 16, 32, 24, 21)
+PARITY = 0x1BD11BDAA9FC1A22
+ROUNDS = 13
+
+SHUFFLE, MOVE, ARREST, JAIL, RISK_AVERSION, HARDSHIP, PLACE, VISION = range(8)
+# The tick of the draws made while setting a model up
+INITIAL_TICK = -1
+
+
+def threefry(key0, key1, counter0, counter1, rounds=ROUNDS):
+    """
+    Encrypts a 128-bit counter with Threefry-2x64.
+
+    Parameters:
+    key0 (int): The first key word.
+    key1 (int): The second key word.
+    counter0 (int): The first counter word.
+    counter1 (int): The second counter word.
+    rounds (int, optional): The number of rounds. Defaults to 13.
+
+    Returns:
+    tuple: The two 64-bit output words.
+    """
+    key0 &= MASK
+    key1 &= MASK
+    schedule = (key0, key1, PARITY ^ key0 ^ key1)
+    x0 = (counter0 + key0) & MASK
+    x1 = (counter1 + key1) & MASK
+    for r in range(rounds):
+        rotation = ROTATIONS[r % 8]
+        x0 = (x0 + x1) & MASK
+        x1 = ((x1 << rotation) | (x1 >> (64 - rotation))) & MASK
+        x1 ^= x0
+        if r % 4 == 3:
+            injection = (r + 1) // 4
+            x0 = (x0 + schedule[injection % 3]) & MASK
+            x1 = (x1 + schedule[(injection + 1) % 3] + injection) & MASK
+    return x0, x1
+
+
+def draw(seed, tick, key, purpose):
+    """
+    Returns the 64-bit random number of a key.
+
+    Parameters:
+    seed (int): The seed of the run.
+    tick (int): The tick of the draw (INITIAL_TICK during setup).
+    key (int): The turtle (or, for PLACE, cell) id.
+    purpose (int): One of the purpose constants.
+
+    Returns:
+    int: An integer in [0, 2 ** 64).
+    """
+    return threefry(seed, purpose, tick + 1, key)[0]
+
+
+def uniform(seed, tick, key, purpose):
+    """
+    Returns the uniform float of a key.
+
+    Parameters:
+    seed (int): The seed of the run.
+    tick (int): The tick of the draw (INITIAL_TICK during setup).
+    key (int): The turtle (or, for PLACE, cell) id.
+    purpose (int): One of the purpose constants.
+
+    Returns:
+    float: A float in [0, 1) with 53 random bits.
+    """
+    return (draw(seed, tick, key, purpose) >> 11) * (1.0 / 9007199254740992.0)
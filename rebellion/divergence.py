@@ -0,0 +1,408 @@
+"""
+Finding the first tick at which two model variants diverge.
+
+Whether two implementations simulate the same model (v4.5 against the lc
+version, v4.2 against v4.8, a script against `rebellion.model`) used to be
+judged by eye from the output counts. Here both variants start from the same
+seed, and their full states are compared: every turtle's kind, cell,
+activity, jail status and (adjusted) hardship, and the global parameters.
+Jail terms are compared through the jail status only, since the engines
+store them differently (a countdown or a release calendar), and the cell
+of a jailed agent is not compared.
+
+Replaying a long run once per suspected tick would be slow, so the runs
+advance in strides of `interval` ticks, keeping a checkpoint (a copy of
+both models) of the last stride at which they agreed. Once a stride ends
+with different states, the tick is bisected from that checkpoint: only
+one stride is replayed, about twice, whatever the run length.
+
+A variant is
+- 'object' or 'kernel', the engines of this package, optionally with
+  constructor options: 'object,rules=rep2', 'kernel,rng=counter';
+- a 'module:Class' path;
+- a model file, e.g. 'src/model_v4.5_lwz.py' (its class `Model`, or
+  'file.py:Class');
+- a dict with an 'engine' (one of the above) and constructor options, or a
+  callable seed -> model.
+
+Variants sharing a random number scheme see the same numbers for the same
+seed: the scripts draw from the `random` module, which is seeded before
+each variant is built and has its state kept per variant, so both see the
+stream of a fresh `random.seed(seed)`. An object and a kernel model only
+share their numbers with rng='counter'.
+
+Example:
+    result = find_divergence('src/model_v4.5_lwz.py', 'src/model_v4_lc_new.py', seed=1, ticks=500)
+    print(format_divergence(result))
+"""
+import copy
+import importlib.util
+import inspect
+import json
+import math
+import os
+import random
+
+import numpy as np
+
+from .equivalence import BASE_PARAMETERS, resolve_engine
+
+# Tables that stay the same during a run; checkpoints share them instead of copying
+STATIC_ATTRIBUTES = ('neighborhoods', 'offset_order', 'disc_size', 'neighbors', 'network', 'csr')
+FIELDS = ('kind', 'cell', 'active', 'jailed', 'risk_aversion', 'hardship', 'adjusted_hardship')
+GLOBALS = ('gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage', 'network_influence')
+
+
+def parse_variant(text):
+    """
+    Parses a command-line variant: an engine, file or class path followed by ',name=value' options.
+
+    Parameters:
+    text (str): E.g. 'object,rules=rep2,rng=counter'; option values are read as JSON when possible.
+
+    Returns:
+    dict: The 'engine' and the options.
+    """
+    engine, *options = text.split(',')
+    return dict([('engine', engine)] + [parse_assignment(option) for option in options])
+
+
+def parse_assignment(text):
+    """
+    Parses a 'name=value' option, reading the value as JSON when possible.
+
+    Parameters:
+    text (str): The option.
+
+    Returns:
+    tuple: (name, value).
+    """
+    name, separator, value = text.partition('=')
+    if not separator:
+        raise ValueError(f"Option {text!r} is not name=value")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def _load_class(engine):
+    path, _, name = engine.partition(':')
+    if not path.endswith('.py'):
+        return resolve_engine(engine)
+    module_name = 'rebellion_variant_' + ''.join(c if c.isalnum() else '_' for c in os.path.abspath(path))
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name or 'Model')
+
+
+def build(variant, params, seed):
+    """
+    Builds the model of a variant.
+
+    Parameters:
+    variant (str, dict or callable): See the module documentation.
+    params (dict): Model keyword arguments; those the constructor does not take are left out.
+    seed (int): The seed, passed when the constructor takes one.
+
+    Returns:
+    object: The model.
+    """
+    if callable(variant) and not isinstance(variant, type):
+        return variant(seed)
+    if isinstance(variant, str):
+        variant = parse_variant(variant)
+    elif isinstance(variant, type):
+        variant = {'engine': variant}
+    options = dict(variant)
+    engine = options.pop('engine', 'object')
+    model_class = _load_class(engine) if isinstance(engine, str) else engine
+    arguments = dict(params, seed=seed, **options)
+    parameters = inspect.signature(model_class).parameters
+    if not any(parameter.kind is parameter.VAR_KEYWORD for parameter in parameters.values()):
+        arguments = {name: value for name, value in arguments.items() if name in parameters}
+    return model_class(**arguments)
+
+
+def snapshot(model):
+    """
+    Extracts the state of a model in a form shared by all engines.
+
+    Parameters:
+    model (object): A kernel model (turtle arrays) or an object model (a list of Turtle `entities`).
+
+    Returns:
+    dict: 'turtles' maps each field of FIELDS to an array indexed by turtle id (NaN where it does not
+        apply), plus 'present' (turtles still in the model); 'order' lists the ids in update order;
+        'globals' maps the names of GLOBALS the model has to their values.
+    """
+    if hasattr(model, 'is_cop'):
+        count = len(model.is_cop)
+        present = np.zeros(count, dtype=bool)
+        present[model.order] = True
+        jailed = model.jail_term > 0
+        agents = ~model.is_cop
+        turtles = {
+            'present': present,
+            'kind': model.is_cop.astype(float),
+            'cell': np.where(jailed, -1, model.position).astype(float),
+            'active': model.active.astype(float),
+            'jailed': jailed.astype(float),
+            'risk_aversion': np.where(agents, model.risk_aversion, np.nan),
+            'hardship': np.where(agents, model.hardship, np.nan),
+            'adjusted_hardship': np.where(agents, model.adjusted, np.nan),
+        }
+        order = [int(t) for t in model.order]
+    else:
+        entities = list(model.entities)
+        order = [entity.agent_id for entity in getattr(model, 'free_entities', entities)]
+        listed = set(order)
+        order += [entity.agent_id for entity in entities if entity.agent_id not in listed
+                  and not getattr(entity, 'removed', False)]
+        count = max((entity.agent_id for entity in entities), default=-1) + 1
+        turtles = {field: np.full(count, np.nan) for field in FIELDS}
+        turtles['present'] = np.zeros(count, dtype=bool)
+        height = getattr(model, 'height', 40)
+        for entity in entities:
+            i = entity.agent_id
+            is_cop = entity.type.name == 'COP'
+            jailed = entity.jail_term > 0
+            x, y = entity.position
+            turtles['present'][i] = not getattr(entity, 'removed', False)
+            turtles['kind'][i] = float(is_cop)
+            turtles['cell'][i] = -1 if jailed else x * height + y
+            turtles['active'][i] = float(bool(entity.active))
+            turtles['jailed'][i] = float(jailed)
+            if not is_cop:
+                turtles['risk_aversion'][i] = entity.risk_aversion
+                turtles['hardship'][i] = entity.hardship
+                turtles['adjusted_hardship'][i] = getattr(entity, 'adjusted_hardship', entity.hardship)
+    return {
+        'turtles': turtles,
+        'order': order,
+        'globals': {name: getattr(model, name) for name in GLOBALS if hasattr(model, name)},
+    }
+
+
+def compare(first, second, tolerance=1e-9):
+    """
+    Lists the differences between two snapshots.
+
+    Parameters:
+    first (dict): A snapshot.
+    second (dict): Another snapshot.
+    tolerance (float, optional): The largest difference of two equal floats (summation order may
+        differ between engines). Defaults to 1e-9.
+
+    Returns:
+    dict: 'turtles' lists (turtle id, field, first value, second value), turtles in the first
+        snapshot's update order; 'globals' lists (name, first value, second value).
+    """
+    a, b = first['turtles'], second['turtles']
+    count = max(len(a['present']), len(b['present']))
+
+    def padded(values, fill):
+        return np.concatenate([values, np.full(count - len(values), fill, dtype=values.dtype)])
+
+    present_a, present_b = padded(a['present'], False), padded(b['present'], False)
+    differences = {}
+    for i in np.flatnonzero(present_a != present_b):
+        differences[int(i)] = [('present', bool(present_a[i]), bool(present_b[i]))]
+    both = present_a & present_b
+    for field in FIELDS:
+        x, y = padded(a[field], np.nan), padded(b[field], np.nan)
+        same = (np.abs(x - y) <= tolerance) | (np.isnan(x) & np.isnan(y))
+        for i in np.flatnonzero(both & ~same):
+            differences.setdefault(int(i), []).append((field, float(x[i]), float(y[i])))
+    rank = {turtle: position for position, turtle in enumerate(first['order'])}
+    turtles = [(i, field, x, y) for i in sorted(differences, key=lambda i: (rank.get(i, count), i))
+               for field, x, y in differences[i]]
+    global_differences = []
+    for name in sorted(set(first['globals']) & set(second['globals'])):
+        x, y = first['globals'][name], second['globals'][name]
+        if not math.isclose(x, y, rel_tol=0, abs_tol=tolerance):
+            global_differences.append((name, x, y))
+    return {'turtles': turtles, 'globals': global_differences}
+
+
+class Replay:
+    """A model of one variant with its own `random` module state, advanced and restored at will."""
+    def __init__(self, variant, params, seed):
+        """
+        Initializes a Replay object.
+
+        Parameters:
+        variant (str, dict or callable): See the module documentation.
+        params (dict): Model keyword arguments.
+        seed (int): The seed of the model and of the `random` module.
+        """
+        outside = random.getstate()
+        random.seed(seed)
+        try:
+            self.model = build(variant, params, seed)
+            self.random_state = random.getstate()
+        finally:
+            random.setstate(outside)
+        self.tick = 0
+        self.steps = 0
+
+    def advance(self, ticks):
+        """
+        Runs the model for a number of ticks.
+
+        Parameters:
+        ticks (int): The number of steps.
+        """
+        outside = random.getstate()
+        random.setstate(self.random_state)
+        try:
+            if hasattr(self.model, 'run'):
+                self.model.run(ticks)
+            else:
+                for _ in range(ticks):
+                    self.model.step()
+            self.random_state = random.getstate()
+        finally:
+            random.setstate(outside)
+        self.tick += ticks
+        self.steps += ticks
+
+    def _copy(self, model):
+        memo = {id(getattr(model, name)): getattr(model, name) for name in STATIC_ATTRIBUTES if hasattr(model, name)}
+        return copy.deepcopy(model, memo)
+
+    def save(self):
+        """
+        Returns a checkpoint of the current state.
+
+        Returns:
+        tuple: (tick, model copy, random module state).
+        """
+        return self.tick, self._copy(self.model), self.random_state
+
+    def restore(self, checkpoint):
+        """
+        Returns to a checkpoint (which stays usable).
+
+        Parameters:
+        checkpoint (tuple): A result of save.
+        """
+        self.tick, model, self.random_state = checkpoint
+        self.model = self._copy(model)
+
+
+def find_divergence(first, second, params=None, seed=0, ticks=1000, interval=50, tolerance=1e-9):
+    """
+    Finds the first tick after which the states of two variants differ.
+
+    The states are compared at the end of every stride of `interval` ticks
+    and the tick is bisected within the first stride that ends in different
+    states. States that differ and agree again within one stride go unseen;
+    a smaller interval narrows that window.
+
+    Parameters:
+    first (str, dict or callable): The reference variant (see the module documentation).
+    second (str, dict or callable): The variant compared with it.
+    params (dict, optional): Model keyword arguments. Defaults to the base case of rebellion.equivalence.
+    seed (int, optional): The seed of both variants. Defaults to 0.
+    ticks (int, optional): The length of the run. Defaults to 1000.
+    interval (int, optional): Ticks between checkpoints. Defaults to 50.
+    tolerance (float, optional): See compare. Defaults to 1e-9.
+
+    Returns:
+    dict: 'tick' is the number of steps after which the states first differ (0: the initial states,
+        None: no difference within `ticks`); 'differences' is the compare result at that tick;
+        'order' the update order of the first variant's last step; 'steps' the steps simulated per variant.
+    """
+    if interval < 1:
+        raise ValueError(f"interval must be positive, got {interval}")
+    params = dict(BASE_PARAMETERS if params is None else params)
+    runs = (Replay(first, params, seed), Replay(second, params, seed))
+
+    def differences():
+        return compare(snapshot(runs[0].model), snapshot(runs[1].model), tolerance)
+
+    def result(tick, found):
+        return {'tick': tick, 'differences': found, 'order': snapshot(runs[0].model)['order'],
+                'steps': [run.steps for run in runs]}
+
+    found = differences()
+    if found['turtles'] or found['globals']:
+        return result(0, found)
+    checkpoints = [run.save() for run in runs]
+    agreed = 0
+    while agreed < ticks:
+        stop = min(agreed + interval, ticks)
+        for run in runs:
+            run.advance(stop - agreed)
+        found = differences()
+        if not (found['turtles'] or found['globals']):
+            agreed = stop
+            checkpoints = [run.save() for run in runs]
+            continue
+        # The states agree after `agreed` steps and differ after `stop`
+        while stop - agreed > 1:
+            middle = (agreed + stop) // 2
+            for run, checkpoint in zip(runs, checkpoints):
+                run.restore(checkpoint)
+                run.advance(middle - agreed)
+            found = differences()
+            if found['turtles'] or found['globals']:
+                stop = middle
+            else:
+                agreed = middle
+                checkpoints = [run.save() for run in runs]
+        if runs[0].tick != stop:
+            for run, checkpoint in zip(runs, checkpoints):
+                run.restore(checkpoint)
+                run.advance(1)
+            found = differences()
+        return result(stop, found)
+    return result(None, {'turtles': [], 'globals': []})
+
+
+def format_divergence(result, limit=20):
+    """
+    Formats a divergence result as text.
+
+    Parameters:
+    result (dict): The result of find_divergence.
+    limit (int, optional): The largest number of turtles listed. Defaults to 20.
+
+    Returns:
+    str: The tick, then one line per differing global and turtle.
+    """
+    steps = ' and '.join(str(count) for count in result['steps'])
+    if result['tick'] is None:
+        return f"no divergence ({steps} steps simulated)"
+    if result['tick'] == 0:
+        lines = ["the initial states differ"]
+    else:
+        lines = [f"the states differ after tick {result['tick']} (step {result['tick'] - 1} from 0) "
+                 f"and agree after tick {result['tick'] - 1}"]
+    for name, x, y in result['differences']['globals']:
+        lines.append(f"  {name}: {x} != {y}")
+    rank = {turtle: position for position, turtle in enumerate(result['order'])}
+    by_turtle = {}
+    for turtle, field, x, y in result['differences']['turtles']:
+        by_turtle.setdefault(turtle, []).append(f"{field} {_show(field, x)} != {_show(field, y)}")
+    for turtle, fields in list(by_turtle.items())[:limit]:
+        where = f"#{rank[turtle]} in update order" if turtle in rank else "not in update order"
+        lines.append(f"  turtle {turtle} ({where}): {'; '.join(fields)}")
+    if len(by_turtle) > limit:
+        lines.append(f"  ... and {len(by_turtle) - limit} more turtles")
+    lines.append(f"{len(by_turtle)} turtles differ; {steps} steps simulated")
+    return '\n'.join(lines)
+
+
+def _show(field, value):
+    if isinstance(value, bool) or value != value:
+        return str(value)
+    if field == 'kind':
+        return 'cop' if value else 'agent'
+    if field in ('active', 'jailed'):
+        return str(bool(value))
+    if field == 'cell':
+        return 'jail' if value < 0 else str(int(value))
+    return f"{value:.6g}"
@@ -0,0 +1,428 @@
+"""
+Online statistics of an ensemble of runs.
+
+Comparing runs used to mean keeping every run's `data` series (one CSV per
+seed). An `Ensemble` instead folds every finished run into per-tick running
+statistics of each series and drops it: the count, mean and variance
+(Welford's update, merged with the pairwise formula of Chan et al.),
+minimum, maximum and a quantile sketch. Per-run scalar metrics (e.g. the
+`rebellion.metrics` summary) are folded in the same way. Memory is
+O(ticks) per parameter point, whatever the number of seeds.
+
+The quantile sketch is a DDSketch (Masson et al., 2019): values are counted
+in buckets whose bounds grow geometrically, so every quantile is returned
+within a relative error of `relative_accuracy`, and two sketches merge by
+adding their counts. At the default 1% the quantiles of counts below 50
+round to the exact integer.
+
+Ensembles merge, so `aggregate` lets every worker process fold its share
+of the seeds and returns the merge of the partial ensembles.
+
+Example:
+    ensemble = aggregate(params, seeds=range(10000), ticks=200, engine='kernel', workers=8)
+    low, high = ensemble.band('active', 0.9)
+    render_bands(ensemble, 'active.png', series=['active'])
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+class QuantileSketch:
+    """DDSketches of a vector of values (one per tick), updated and queried together."""
+    def __init__(self, size, relative_accuracy=0.01):
+        """
+        Initializes a QuantileSketch object.
+
+        Parameters:
+        size (int): The number of positions (ticks).
+        relative_accuracy (float, optional): The relative error bound of the quantiles. Defaults to 0.01.
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy must be between 0 and 1, got {relative_accuracy}")
+        self.size = size
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.zeros = np.zeros(size, dtype=np.int64)
+        # Bucket counts of the positive and of the negated negative values; column 0 holds key offset[sign]
+        self.buckets = [np.zeros((size, 0), dtype=np.int64), np.zeros((size, 0), dtype=np.int64)]
+        self.offset = [0, 0]
+
+    def _keys(self, values):
+        return np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+
+    def _reserve(self, sign, low, high):
+        # Widens the bucket columns of one sign to cover the keys low..high
+        counts, offset = self.buckets[sign], self.offset[sign]
+        if counts.shape[1] == 0:
+            self.buckets[sign] = np.zeros((self.size, high - low + 1), dtype=np.int64)
+            self.offset[sign] = low
+            return
+        before = max(0, offset - low)
+        after = max(0, high - (offset + counts.shape[1] - 1))
+        if before or after:
+            self.buckets[sign] = np.pad(counts, ((0, 0), (before, after)))
+            self.offset[sign] = offset - before
+
+    def add(self, values):
+        """
+        Adds one value per position.
+
+        Parameters:
+        values (array): Shape (size,), or (runs, size) to add several at once.
+        """
+        values = np.asarray(values, dtype=float).reshape(-1, self.size)
+        rows = np.broadcast_to(np.arange(self.size), values.shape)
+        finite = np.isfinite(values)
+        self.zeros += ((values == 0) & finite).sum(axis=0)
+        for sign, chosen in ((0, finite & (values > 0)), (1, finite & (values < 0))):
+            if not chosen.any():
+                continue
+            keys = self._keys(np.abs(values[chosen]))
+            self._reserve(sign, int(keys.min()), int(keys.max()))
+            np.add.at(self.buckets[sign], (rows[chosen], keys - self.offset[sign]), 1)
+
+    def merge(self, other):
+        """
+        Adds the counts of another sketch of the same size and accuracy.
+
+        Parameters:
+        other (QuantileSketch): The sketch merged into this one.
+        """
+        if other.size != self.size or other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Only sketches of the same size and accuracy can be merged")
+        self.zeros += other.zeros
+        for sign in (0, 1):
+            counts = other.buckets[sign]
+            if counts.shape[1] == 0:
+                continue
+            low = other.offset[sign]
+            self._reserve(sign, low, low + counts.shape[1] - 1)
+            start = low - self.offset[sign]
+            self.buckets[sign][:, start:start + counts.shape[1]] += counts
+
+    def quantile(self, q):
+        """
+        Returns the q-quantile of every position.
+
+        Parameters:
+        q (float): The quantile, in [0, 1].
+
+        Returns:
+        array: Shape (size,); NaN where no value was added.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError(f"q must be in [0, 1], got {q}")
+        negative, positive = self.buckets[1][:, ::-1], self.buckets[0]
+        counts = np.concatenate([negative, self.zeros[:, None], positive], axis=1)
+        totals = counts.sum(axis=1)
+        cumulative = np.cumsum(counts, axis=1)
+        index = np.argmax(cumulative > np.floor(q * (totals - 1))[:, None], axis=1)
+        # Bucket value: 2 gamma^key / (gamma + 1), within relative_accuracy of every value of the bucket
+        zero = negative.shape[1]
+        keys = np.where(index > zero, index - zero - 1 + self.offset[0], self.offset[1] + zero - 1 - index)
+        values = 2 * np.exp(keys * self.log_gamma) / (self.gamma + 1)
+        values = np.where(index > zero, values, np.where(index < zero, -values, 0.0))
+        return np.where(totals > 0, values, np.nan)
+
+
+class RunningStats:
+    """Count, mean, variance, extremes and quantile sketch of a vector of values (one per tick)."""
+    def __init__(self, size, relative_accuracy=0.01):
+        """
+        Initializes a RunningStats object.
+
+        Parameters:
+        size (int): The number of positions (ticks).
+        relative_accuracy (float, optional): See QuantileSketch. Defaults to 0.01.
+        """
+        self.size = size
+        self.count = 0
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)  # Sum of squared deviations from the mean
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+        self.sketch = QuantileSketch(size, relative_accuracy)
+
+    def add(self, values):
+        """
+        Folds in the values of one run (Welford's update).
+
+        Parameters:
+        values (array): Shape (size,).
+        """
+        values = np.asarray(values, dtype=float)
+        if values.shape != (self.size,):
+            raise ValueError(f"Expected {self.size} values, got {values.shape[0] if values.ndim else 1}")
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+        np.minimum(self.min, values, out=self.min)
+        np.maximum(self.max, values, out=self.max)
+        self.sketch.add(values)
+
+    def merge(self, other):
+        """
+        Folds in the statistics of other runs (Chan et al.'s pairwise update).
+
+        Parameters:
+        other (RunningStats): Statistics of the same size.
+        """
+        if other.size != self.size:
+            raise ValueError(f"Cannot merge statistics of {other.size} values into {self.size}")
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        np.minimum(self.min, other.min, out=self.min)
+        np.maximum(self.max, other.max, out=self.max)
+        self.sketch.merge(other.sketch)
+
+    @property
+    def variance(self):
+        """array: The sample variance (NaN below two runs)."""
+        return self.m2 / (self.count - 1) if self.count > 1 else np.full(self.size, np.nan)
+
+    @property
+    def std(self):
+        """array: The sample standard deviation."""
+        return np.sqrt(self.variance)
+
+
+class Ensemble:
+    """Per-tick statistics of every series and statistics of every per-run metric of a set of runs."""
+    def __init__(self, relative_accuracy=0.01):
+        """
+        Initializes an Ensemble object.
+
+        Parameters:
+        relative_accuracy (float, optional): The relative error of the quantiles. Defaults to 0.01.
+        """
+        self.relative_accuracy = relative_accuracy
+        self.series = {}  # name -> RunningStats over the ticks
+        self.metrics = {}  # name -> RunningStats of size 1
+
+    def __repr__(self):
+        return f"Ensemble({self.runs} runs, series {', '.join(self.series)}, metrics {', '.join(self.metrics)})"
+
+    @property
+    def runs(self):
+        """int: The number of runs folded in."""
+        return max((stats.count for stats in self.series.values()), default=0)
+
+    def add(self, data, metrics=None):
+        """
+        Folds in one run.
+
+        Parameters:
+        data (dict): The run's series (e.g. Model.data); series of every run must have the same length.
+        metrics (dict, optional): Per-run scalars, e.g. rebellion.metrics.summarize(data). Defaults to none.
+        """
+        for name, values in data.items():
+            if name not in self.series:
+                self.series[name] = RunningStats(len(values), self.relative_accuracy)
+            self.series[name].add(values)
+        for name, value in (metrics or {}).items():
+            if name not in self.metrics:
+                self.metrics[name] = RunningStats(1, self.relative_accuracy)
+            self.metrics[name].add([value])
+
+    def merge(self, other):
+        """
+        Folds in the runs of another ensemble (e.g. one built by another process).
+
+        Parameters:
+        other (Ensemble): The ensemble merged into this one.
+
+        Returns:
+        Ensemble: This ensemble.
+        """
+        for mine, theirs in ((self.series, other.series), (self.metrics, other.metrics)):
+            for name, stats in theirs.items():
+                if name in mine:
+                    mine[name].merge(stats)
+                else:
+                    mine[name] = RunningStats(stats.size, self.relative_accuracy)
+                    mine[name].merge(stats)
+        return self
+
+    def _stats(self, name):
+        if name in self.series:
+            return self.series[name]
+        if name in self.metrics:
+            return self.metrics[name]
+        raise ValueError(f"Unknown series or metric {name!r}")
+
+    def mean(self, name):
+        """
+        Returns the per-tick mean of a series (or the mean of a metric).
+
+        Parameters:
+        name (str): The series or metric.
+
+        Returns:
+        array: Shape (ticks,), or (1,) for a metric.
+        """
+        return self._stats(name).mean.copy()
+
+    def std(self, name):
+        """
+        Returns the per-tick standard deviation of a series (or of a metric).
+
+        Parameters:
+        name (str): The series or metric.
+
+        Returns:
+        array: Shape (ticks,), or (1,) for a metric.
+        """
+        return self._stats(name).std
+
+    def quantile(self, name, q):
+        """
+        Returns the per-tick q-quantile of a series (or the quantile of a metric).
+
+        Parameters:
+        name (str): The series or metric.
+        q (float): The quantile, in [0, 1].
+
+        Returns:
+        array: Shape (ticks,), or (1,) for a metric.
+        """
+        return self._stats(name).sketch.quantile(q)
+
+    def band(self, name, level=0.9, kind='quantile'):
+        """
+        Returns a per-tick band of a series.
+
+        Parameters:
+        name (str): The series.
+        level (float, optional): The share of runs (quantile) or the confidence (mean) covered. Defaults to 0.9.
+        kind (str, optional): 'quantile' for the central `level` share of the runs, 'mean' for a
+            normal confidence interval of the mean. Defaults to 'quantile'.
+
+        Returns:
+        tuple: (low, high) arrays.
+        """
+        if kind == 'quantile':
+            return self.quantile(name, (1 - level) / 2), self.quantile(name, (1 + level) / 2)
+        if kind == 'mean':
+            from statistics import NormalDist
+            stats = self._stats(name)
+            half = NormalDist().inv_cdf((1 + level) / 2) * stats.std / math.sqrt(max(stats.count, 1))
+            return stats.mean - half, stats.mean + half
+        raise ValueError(f"Unknown band kind {kind!r}; expected 'quantile' or 'mean'")
+
+    def summary(self, quantiles=QUANTILES):
+        """
+        Returns the statistics of the metrics.
+
+        Parameters:
+        quantiles (iterable, optional): The quantiles reported. Defaults to QUANTILES.
+
+        Returns:
+        dict: Maps every metric to {'count', 'mean', 'std', 'min', 'max', 'q<quantile>'...}.
+        """
+        result = {}
+        for name, stats in self.metrics.items():
+            entry = {'count': stats.count, 'mean': float(stats.mean[0]), 'std': float(stats.std[0]),
+                     'min': float(stats.min[0]), 'max': float(stats.max[0])}
+            for q in quantiles:
+                entry[f'q{q:g}'] = float(stats.sketch.quantile(q)[0])
+            result[name] = entry
+        return result
+
+    def table(self, name, quantiles=QUANTILES):
+        """
+        Returns the per-tick statistics of a series as columns (e.g. for a CSV).
+
+        Parameters:
+        name (str): The series.
+        quantiles (iterable, optional): The quantiles included. Defaults to QUANTILES.
+
+        Returns:
+        dict: Maps 'tick', 'mean', 'std', 'min', 'max' and 'q<quantile>' to arrays.
+        """
+        stats = self._stats(name)
+        columns = {'tick': np.arange(stats.size), 'mean': stats.mean.copy(), 'std': stats.std,
+                   'min': stats.min.copy(), 'max': stats.max.copy()}
+        for q in quantiles:
+            columns[f'q{q:g}'] = stats.sketch.quantile(q)
+        return columns
+
+
+def _fold(batch, params, ticks, engine, rules, metrics, relative_accuracy):
+    """Runs a batch of seeds in a worker and folds them into one ensemble."""
+    from .experiment import simulate
+    from .metrics import summarize
+
+    ensemble = Ensemble(relative_accuracy)
+    for seed in batch:
+        data = simulate(params, seed, ticks, engine=engine, rules=rules)
+        ensemble.add(data, summarize(data) if metrics else None)
+    return ensemble
+
+
+def aggregate(params, seeds, ticks=200, engine='object', rules='origin', metrics=True, workers=None,
+              batch_size=None, relative_accuracy=0.01):
+    """
+    Runs many seeds of one parameter point and returns their ensemble, without keeping any run.
+
+    Parameters:
+    params (dict): Keyword arguments of the model constructor (without the seed).
+    seeds (iterable): The seeds.
+    ticks (int, optional): The length of every run. Defaults to 200.
+    engine (str, optional): 'object' or 'kernel'. Defaults to 'object'.
+    rules (str, optional): The variant. Defaults to 'origin'.
+    metrics (bool, optional): Also fold in the rebellion.metrics summary of every run. Defaults to True.
+    workers (int, optional): The number of processes; 1 runs in-process. Defaults to os.cpu_count().
+    batch_size (int, optional): Seeds per job. Defaults to an even split in four jobs per worker.
+    relative_accuracy (float, optional): See QuantileSketch. Defaults to 0.01.
+
+    Returns:
+    Ensemble: The merged ensemble.
+    """
+    seeds = list(seeds)
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or max(1, -(-len(seeds) // (4 * workers)))
+    batches = [seeds[i:i + batch_size] for i in range(0, len(seeds), batch_size)]
+    arguments = (params, ticks, engine, rules, metrics, relative_accuracy)
+    ensemble = Ensemble(relative_accuracy)
+    if workers == 1 or len(batches) <= 1:
+        for batch in batches:
+            ensemble.merge(_fold(batch, *arguments))
+        return ensemble
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        for partial in pool.map(_fold, batches, *([argument] * len(batches) for argument in arguments)):
+            ensemble.merge(partial)
+    return ensemble
+
+
+def render_bands(ensemble, path, series=('quiet', 'jail', 'active'), level=0.9, kind='quantile', **options):
+    """
+    Writes a chart of the mean of every series with its band as a PNG file.
+
+    Parameters:
+    ensemble (Ensemble): The ensemble.
+    path (str): The output file.
+    series (iterable, optional): The series drawn. Defaults to quiet, jail and active.
+    level (float, optional): See Ensemble.band. Defaults to 0.9.
+    kind (str, optional): See Ensemble.band. Defaults to 'quantile'.
+    **options: Passed to rebellion.render.chart_image.
+
+    Returns:
+    str: The output path.
+    """
+    from .render import chart_image, write_png
+
+    write_png(path, chart_image({name: ensemble.mean(name) for name in series},
+                                bands={name: ensemble.band(name, level, kind) for name in series}, **options))
+    return path
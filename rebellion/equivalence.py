@@ -0,0 +1,356 @@
+"""
+Equivalence checks between simulation engines.
+
+A faster engine is only useful if it still simulates the rules of
+`scripts/replication/origin.py`. This module runs a reference engine (the
+object `Model`, which mirrors origin.py) and a candidate engine over a
+matrix of cases (variants and parameter points chosen to exercise every
+rule) and reports where they differ, in two modes:
+
+- exact: both engines draw from the counter-based generator
+  (`rng='counter'`, see `rebellion.counter`), so the same seed must give the
+  same run. The two models are stepped side by side; after the setup and
+  after every tick their series and the state of every turtle (kind, cell,
+  active, jailed and attributes, see `divergence.snapshot`) are compared,
+  and the first difference is reported.
+- statistical: each engine uses its own generator, so only the ensembles
+  can be compared. For every summary metric and for the mean of every
+  series over `windows` equal stretches of the run, the two ensemble means
+  are compared with a Welch z score, and the distributions of the summary
+  metrics with a two-sample Kolmogorov-Smirnov test. The thresholds are
+  Bonferroni-corrected for the number of tests of a case, so `alpha` is the
+  chance that a correct engine fails a case.
+
+Runs are spread over a process pool, one (case, seed) per job, so the whole
+matrix fits in a CI job. `python -m rebellion equivalence` runs it and exits
+with status 1 when a case fails.
+
+Example:
+    report = check('kernel', mode='both', ticks=100, seeds=20, workers=4)
+    print(format_report(report))
+"""
+import importlib
+import inspect
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+
+from .counter import INITIAL_TICK
+from .metrics import summarize
+
+ENGINES = {'object': 'rebellion.model:Model', 'kernel': 'rebellion.kernel:KernelModel'}
+MODES = ('exact', 'statistical', 'both')
+BASE_PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+# One case per rule of the model: (name, variant, parameters changed from BASE_PARAMETERS)
+CASES = (
+    ('origin', 'origin', {}),
+    ('low-legitimacy', 'origin', {'gov_legitimacy': 0.6, 'cop_density': 2.5}),
+    ('short-vision', 'origin', {'vision': 2, 'max_jail_term': 5}),
+    ('extension1', 'extension1', {'neighbor_influence_percentage': 0.5}),
+    ('rep1', 'rep1', {}),
+    ('rep2', 'rep2', {'gov_legitimacy': 0.9, 'cop_density': 7.4}),
+    ('extension2', 'extension2', {}),
+    ('jail-term-decay', 'extension3_origin', {}),
+    ('vision-range', 'origin', {'agent_vision': {'low': 3, 'high': 9}, 'cop_vision': 5}),
+    ('network', 'origin', {'network': {'kind': 'small_world', 'degree': 6, 'rewire': 0.1},
+                           'network_influence': 0.3}),
+)
+
+
+def resolve_engine(engine):
+    """
+    Returns the model class of an engine.
+
+    Parameters:
+    engine (str or type): A name from ENGINES, a 'module:Class' path, or a class.
+
+    Returns:
+    type: The class; it is constructed with the Model keyword arguments plus seed and rules.
+    """
+    if isinstance(engine, type):
+        return engine
+    path = ENGINES.get(engine, engine)
+    if ':' not in path:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {', '.join(ENGINES)} or 'module:Class'")
+    module, name = path.split(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def cases(names=None):
+    """
+    Lists the cases of the matrix as (name, variant, params) triples.
+
+    Parameters:
+    names (iterable, optional): The case names to keep. Defaults to all of CASES.
+
+    Returns:
+    list: The cases, with full Model keyword arguments.
+    """
+    known = {name: (variant, changes) for name, variant, changes in CASES}
+    names = list(known) if names is None else list(names)
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown cases {', '.join(unknown)}; expected some of {', '.join(known)}")
+    return [(name, known[name][0], dict(BASE_PARAMETERS, **known[name][1])) for name in names]
+
+
+def _simulate(engine, params, seed, ticks, rules, rng=None):
+    options = {} if rng is None else {'rng': rng}
+    return resolve_engine(engine)(**params, seed=seed, rules=rules, **options).run(ticks)
+
+
+def first_difference(reference, candidate):
+    """
+    Finds the first tick at which two runs differ.
+
+    Parameters:
+    reference (dict): The series of one run.
+    candidate (dict): The series of the other.
+
+    Returns:
+    tuple: (tick, series, reference value, candidate value), or None if the runs are identical.
+    """
+    found = None
+    for name, values in reference.items():
+        other = candidate.get(name, [])
+        for tick in range(max(len(values), len(other))):
+            a = values[tick] if tick < len(values) else None
+            b = other[tick] if tick < len(other) else None
+            if a != b:
+                if found is None or tick < found[0]:
+                    found = (tick, name, a, b)
+                break
+    return found
+
+
+def lockstep_difference(expected, actual, ticks):
+    """
+    Steps two models side by side and finds the first tick at which their states differ.
+
+    Parameters:
+    expected (object): The reference model.
+    actual (object): The candidate model, set up like the reference.
+    ticks (int): The number of steps.
+
+    Returns:
+    tuple: (tick, what, reference value, candidate value), where what is a series, a global parameter
+        or 'turtle <id> <field>' and tick -1 is the setup; None if the runs are identical.
+    """
+    from .divergence import compare, snapshot
+    for tick in range(INITIAL_TICK, ticks):
+        if tick >= 0:
+            expected.step()
+            actual.step()
+            found = first_difference({name: values[tick:] for name, values in expected.data.items()},
+                                     {name: values[tick:] for name, values in actual.data.items()})
+            if found is not None:
+                return (tick,) + found[1:]
+        differences = compare(snapshot(expected), snapshot(actual))
+        if differences['turtles']:
+            turtle, field, a, b = differences['turtles'][0]
+            return tick, f'turtle {turtle} {field}', a, b
+        if differences['globals']:
+            return (tick,) + differences['globals'][0]
+    return None
+
+
+def _exact_job(job):
+    """Runs one seed of a case on both engines with the counter generator and compares them."""
+    reference, candidate, (name, variant, params), seed, ticks = job
+    expected, actual = (resolve_engine(engine)(**params, seed=seed, rules=variant, rng='counter')
+                        for engine in (reference, candidate))
+    return name, seed, lockstep_difference(expected, actual, ticks)
+
+
+def _profile(data, windows):
+    """The summary metrics and the window means of every series of a run."""
+    profile = dict(summarize(data))
+    for series, values in data.items():
+        size = len(values) / windows
+        for window in range(windows):
+            chunk = values[round(window * size):round((window + 1) * size)]
+            if chunk:
+                profile[f'{series}[{window}]'] = sum(chunk) / len(chunk)
+    return profile
+
+
+def _ensemble_job(job):
+    """Runs one seed of a case on one engine with its own generator and profiles the run."""
+    engine, role, (name, variant, params), seed, ticks, windows = job
+    return name, role, _profile(_simulate(engine, params, seed, ticks, variant), windows)
+
+
+def z_score(a, b):
+    """
+    Returns the Welch z score of the difference of two sample means.
+
+    Parameters:
+    a (sequence): The first sample.
+    b (sequence): The second sample.
+
+    Returns:
+    float: (mean a - mean b) / standard error; 0 for two identical constants, inf for two different ones.
+    """
+    def moments(sample):
+        mean = sum(sample) / len(sample)
+        variance = sum((x - mean) ** 2 for x in sample) / (len(sample) - 1) if len(sample) > 1 else 0.0
+        return mean, variance / len(sample)
+    mean_a, error_a = moments(a)
+    mean_b, error_b = moments(b)
+    difference = mean_a - mean_b
+    if error_a + error_b == 0:
+        return 0.0 if difference == 0 else math.copysign(math.inf, difference)
+    return difference / math.sqrt(error_a + error_b)
+
+
+def ks_test(a, b):
+    """
+    Two-sample Kolmogorov-Smirnov test.
+
+    Parameters:
+    a (sequence): The first sample.
+    b (sequence): The second sample.
+
+    Returns:
+    tuple: (D statistic, asymptotic p-value).
+    """
+    a, b = sorted(a), sorted(b)
+    i = j = 0
+    statistic = 0.0
+    while i < len(a) and j < len(b):
+        value = min(a[i], b[j])
+        while i < len(a) and a[i] == value:
+            i += 1
+        while j < len(b) and b[j] == value:
+            j += 1
+        statistic = max(statistic, abs(i / len(a) - j / len(b)))
+    effective = math.sqrt(len(a) * len(b) / (len(a) + len(b)))
+    x = (effective + 0.12 + 0.11 / effective) * statistic
+    if x < 0.2:
+        return statistic, 1.0
+    p_value = 2 * sum((-1) ** (k - 1) * math.exp(-2 * (k * x) ** 2) for k in range(1, 101))
+    return statistic, min(max(p_value, 0.0), 1.0)
+
+
+def compare_ensembles(reference, candidate, alpha=0.001):
+    """
+    Compares the profiles of two ensembles of runs of one case.
+
+    Parameters:
+    reference (list): The profiles (metric -> value) of the reference runs.
+    candidate (list): The profiles of the candidate runs.
+    alpha (float, optional): The chance of failing a correct engine, split over all tests. Defaults to 0.001.
+
+    Returns:
+    dict: 'metrics' maps each profile entry to (reference mean, candidate mean, z, KS p-value or None);
+        'failures' lists the entries beyond the thresholds.
+    """
+    names = [name for name in reference[0] if all(name in profile for profile in reference + candidate)]
+    metrics = [name for name in names if '[' not in name]
+    tests = len(names) + len(metrics)
+    threshold = NormalDist().inv_cdf(1 - alpha / (2 * tests))
+    result = {'metrics': {}, 'failures': []}
+    for name in names:
+        a = [profile[name] for profile in reference]
+        b = [profile[name] for profile in candidate]
+        z = z_score(a, b)
+        p_value = ks_test(a, b)[1] if name in metrics else None
+        result['metrics'][name] = (sum(a) / len(a), sum(b) / len(b), z, p_value)
+        if abs(z) > threshold or (p_value is not None and p_value < alpha / tests):
+            result['failures'].append(name)
+    return result
+
+
+def _map(function, jobs, workers):
+    if workers == 1 or len(jobs) <= 1:
+        return [function(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        return list(pool.map(function, jobs, chunksize=max(1, len(jobs) // (4 * workers))))
+
+
+def check(candidate, reference='object', mode='both', names=None, ticks=100, seeds=20, exact_seeds=2,
+          windows=10, alpha=0.001, workers=None):
+    """
+    Runs the case matrix on a candidate and a reference engine.
+
+    Parameters:
+    candidate (str or type): The engine checked (see resolve_engine).
+    reference (str or type, optional): The engine trusted. Defaults to 'object'.
+    mode (str, optional): 'exact', 'statistical' or 'both'. Defaults to 'both'.
+    names (iterable, optional): The cases run (see CASES). Defaults to all.
+    ticks (int, optional): The length of every run. Defaults to 100.
+    seeds (int, optional): The runs per engine and case in statistical mode. Defaults to 20.
+    exact_seeds (int, optional): The seeds compared per case in exact mode. Defaults to 2.
+    windows (int, optional): The stretches whose series means are compared. Defaults to 10.
+    alpha (float, optional): The chance that a correct engine fails a statistical case. Defaults to 0.001.
+    workers (int, optional): The number of processes; 1 runs in-process. Defaults to os.cpu_count().
+
+    Returns:
+    dict: 'cases' maps every case to {'exact': list of (seed, first difference or None),
+        'statistical': compare_ensembles result, 'passed': bool}; 'passed' and 'seconds' cover the run.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+    if mode != 'statistical':
+        for engine in (reference, candidate):
+            parameters = inspect.signature(resolve_engine(engine)).parameters
+            if 'rng' not in parameters and not any(p.kind is p.VAR_KEYWORD for p in parameters.values()):
+                raise ValueError(f"Exact mode needs engines with an rng parameter; {engine!r} has none")
+    workers = workers or os.cpu_count() or 1
+    selected = cases(names)
+    started = time.monotonic()
+    report = {'cases': {name: {'exact': [], 'statistical': None, 'passed': True} for name, _, _ in selected}}
+    if mode != 'statistical':
+        jobs = [(reference, candidate, case, seed, ticks) for case in selected for seed in range(exact_seeds)]
+        for name, seed, difference in _map(_exact_job, jobs, workers):
+            report['cases'][name]['exact'].append((seed, difference))
+            report['cases'][name]['passed'] &= difference is None
+    if mode != 'exact':
+        jobs = [(engine, role, case, seed, ticks, windows) for case in selected for seed in range(seeds)
+                for engine, role in ((reference, 'reference'), (candidate, 'candidate'))]
+        profiles = {(name, role): [] for name, _, _ in selected for role in ('reference', 'candidate')}
+        for name, role, profile in _map(_ensemble_job, jobs, workers):
+            profiles[name, role].append(profile)
+        for name, _, _ in selected:
+            result = compare_ensembles(profiles[name, 'reference'], profiles[name, 'candidate'], alpha)
+            report['cases'][name]['statistical'] = result
+            report['cases'][name]['passed'] &= not result['failures']
+    report['passed'] = all(entry['passed'] for entry in report['cases'].values())
+    report['seconds'] = time.monotonic() - started
+    return report
+
+
+def format_report(report):
+    """
+    Formats an equivalence report as text.
+
+    Parameters:
+    report (dict): The result of check.
+
+    Returns:
+    str: One line per case, followed by the details of every failure.
+    """
+    lines = []
+    for name, entry in report['cases'].items():
+        parts = []
+        if entry['exact']:
+            same = sum(difference is None for _, difference in entry['exact'])
+            parts.append(f"exact {same}/{len(entry['exact'])} seeds identical")
+        if entry['statistical'] is not None:
+            result = entry['statistical']
+            parts.append(f"statistical {len(result['metrics']) - len(result['failures'])}/"
+                         f"{len(result['metrics'])} tests passed")
+        lines.append(f"{name:<16}{'ok' if entry['passed'] else 'FAILED':<8}{'; '.join(parts)}")
+        for seed, difference in entry['exact']:
+            if difference is not None:
+                tick, series, expected, actual = difference
+                lines.append(f"  seed {seed}: '{series}' differs first at tick {tick}: {expected} != {actual}")
+        if entry['statistical'] is not None:
+            for metric in entry['statistical']['failures']:
+                expected, actual, z, p_value = entry['statistical']['metrics'][metric]
+                ks = '' if p_value is None else f', KS p={p_value:.2g}'
+                lines.append(f"  {metric}: reference {expected:.2f}, candidate {actual:.2f} (z={z:.1f}{ks})")
+    lines.append(f"{'passed' if report['passed'] else 'FAILED'} in {report['seconds']:.0f}s")
+    return '\n'.join(lines)
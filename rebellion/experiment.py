@@ -0,0 +1,552 @@
+"""
+Declarative experiments: a TOML/YAML/JSON file describing a sweep.
+
+The scripts in `scripts/` hard-code their parameters as module constants and
+their output file names; an experiment file holds the same information as
+data, so a sweep can be run unattended, resumed and bounded in resources
+from the command line (`python -m rebellion sweep FILE`).
+
+An experiment file looks like this (TOML)::
+
+    name = "extension1"
+    variant = "extension1"           # a model variant of rebellion.rules.VARIANTS
+    ticks = 200
+    seeds = 10                       # or a list, or {start = 100, count = 10}
+    metrics = ["peak_active", "mean_active"]
+    output = "extension1.summary.csv"
+
+    [parameters]                     # lists are swept (cartesian product)
+    agent_density = 70
+    cop_density = 4
+    vision = 7
+    k = 2.3
+    gov_legitimacy = 0.82
+    max_jail_term = 30
+    neighbor_influence_percentage = [0, 0.25, 0.5, 0.75, 1]
+    cop_vision = {low = 3, high = 9}  # optional: a radius per turtle (tables are not swept)
+    network = {kind = "small_world", degree = 6, rewire = 0.1}  # optional, see rebellion.network
+    network_influence = 0.2
+
+    [[schedule]]                     # optional changes between steps
+    tick = 82
+    set = {gov_legitimacy = 0.5}
+
+A schedule entry applies before the (0-based) step `tick`, or before every
+`every`-th step from `start` on; `set` assigns values, `add` increments them,
+and `min`/`max` clamp the result. Only gov_legitimacy, k, max_jail_term,
+neighbor_influence_percentage and network_influence can change during a run.
+
+Every finished run is stored in a `cache.RunCache`, so an interrupted sweep
+picks up where it stopped when started again. With `ledger = "FILE.db"` the
+jobs are also tracked in a `ledger.JobLedger`: several invocations (e.g. one
+per node of a cluster sharing the directory) can then work through the same
+sweep without duplicating runs, and failed or abandoned jobs are retried
+(jobs that failed for good are retried with `sweep --retry-failed`).
+With `store = "DIR"` the runs (parameters, seed, metrics and, when cached,
+series) are added to a queryable `store.ResultStore`.
+"""
+import contextlib
+import csv
+import functools
+import itertools
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .cache import RunCache, describe_run, run_key
+from .metrics import METRICS, summarize
+from .rules import VARIANTS
+
+BACKENDS = ('serial', 'process', 'array')
+DEFAULT_CACHE = '.rebellion-cache'
+MODEL_PARAMETERS = ('agent_density', 'cop_density', 'vision', 'k', 'gov_legitimacy', 'max_jail_term',
+                    'neighbor_influence_percentage', 'agent_vision', 'cop_vision', 'network', 'network_influence',
+                    'rng')
+
+
+def load_spec(path):
+    """
+    Reads an experiment file (.toml, .yaml/.yml or .json).
+
+    Parameters:
+    path (str): The path of the file.
+
+    Returns:
+    dict: The raw specification.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            return tomllib.load(f)
+    if extension in ('.yaml', '.yml'):
+        import yaml
+        with open(path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f)
+    if extension == '.json':
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    raise ValueError(f"Unsupported experiment file type {extension!r}; use .toml, .yaml or .json")
+
+
+def parse_memory(text):
+    """
+    Parses a memory size such as '512M' or '2G'.
+
+    Parameters:
+    text (str): The size, optionally suffixed with K, M or G.
+
+    Returns:
+    int: The size in bytes.
+    """
+    text = str(text).strip().upper()
+    units = {'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+class Experiment:
+    """A validated experiment specification."""
+    def __init__(self, spec, base_dir='.'):
+        """
+        Initializes an Experiment object.
+
+        Parameters:
+        spec (dict): The raw specification (see the module documentation).
+        base_dir (str, optional): Directory relative paths in the spec are resolved against. Defaults to '.'.
+        """
+        unknown = set(spec) - {'name', 'variant', 'ticks', 'seeds', 'parameters', 'schedule', 'metrics',
+                               'output', 'cache', 'ledger', 'store'}
+        if unknown:
+            raise ValueError(f"Unknown experiment keys: {', '.join(sorted(unknown))}")
+        self.name = spec.get('name', 'experiment')
+        self.variant = spec.get('variant', 'origin')
+        if self.variant not in VARIANTS:
+            raise ValueError(f"Unknown variant {self.variant!r}; expected one of {', '.join(VARIANTS)}")
+        self.ticks = int(spec.get('ticks', 200))
+        self.seeds = self._parse_seeds(spec.get('seeds', 1))
+        self.parameters = dict(spec.get('parameters', {}))
+        for name in self.parameters:
+            if name not in MODEL_PARAMETERS:
+                raise ValueError(f"Unknown model parameter {name!r}")
+        missing = [name for name in MODEL_PARAMETERS[:6] if name not in self.parameters]
+        if missing:
+            raise ValueError(f"Missing model parameters: {', '.join(missing)}")
+        self.schedule = list(spec.get('schedule', []))
+        for event in self.schedule:
+            if 'tick' not in event and 'every' not in event:
+                raise ValueError(f"Schedule entry {event} needs 'tick' or 'every'")
+        self.metrics = list(spec.get('metrics', METRICS))
+        for name in self.metrics:
+            if name not in METRICS:
+                raise ValueError(f"Unknown metric {name!r}")
+        self.output = os.path.join(base_dir, spec.get('output', f'{self.name}.summary.csv'))
+        cache = spec.get('cache', DEFAULT_CACHE)
+        self.cache = os.path.join(base_dir, cache) if cache else None
+        ledger = spec.get('ledger')
+        self.ledger = os.path.join(base_dir, ledger) if ledger else None
+        store = spec.get('store')
+        self.store = os.path.join(base_dir, store) if store else None
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Loads and validates an experiment file.
+
+        Parameters:
+        path (str): The path of the file; relative paths inside it are relative to its directory.
+
+        Returns:
+        Experiment: The experiment.
+        """
+        return cls(load_spec(path), os.path.dirname(os.path.abspath(path)))
+
+    @staticmethod
+    def _parse_seeds(seeds):
+        if isinstance(seeds, int):
+            return list(range(seeds))
+        if isinstance(seeds, dict):
+            start = int(seeds.get('start', 0))
+            return list(range(start, start + int(seeds['count'])))
+        return [int(seed) for seed in seeds]
+
+    @property
+    def swept(self):
+        """list: The names of the parameters given as lists."""
+        return [name for name, value in self.parameters.items() if isinstance(value, list)]
+
+    def points(self):
+        """
+        Expands the parameter grid.
+
+        Returns:
+        list: One complete parameter dict per grid point.
+        """
+        swept = self.swept
+        grid = itertools.product(*(self.parameters[name] for name in swept))
+        fixed = {name: value for name, value in self.parameters.items() if name not in swept}
+        return [dict(fixed, **dict(zip(swept, values))) for values in grid]
+
+    def jobs(self):
+        """
+        Lists every (params, seed) run of the experiment.
+
+        Returns:
+        list: (params, seed) pairs, grid point major.
+        """
+        return [(params, seed) for params in self.points() for seed in self.seeds]
+
+
+def apply_schedule(model, schedule, tick):
+    """
+    Applies the schedule entries due before a step.
+
+    Parameters:
+    model (Model): The model (object or kernel engine).
+    schedule (list): The schedule entries.
+    tick (int): The 0-based index of the step about to run.
+    """
+    for event in schedule:
+        if 'tick' in event:
+            due = tick == event['tick']
+        else:
+            start = event.get('start', 0)
+            due = tick >= start and (tick - start) % event['every'] == 0
+        if not due:
+            continue
+        for name, value in event.get('set', {}).items():
+            model.set_parameter(name, value)
+        for name, delta in event.get('add', {}).items():
+            value = getattr(model, name) + delta
+            if name in event.get('min', {}):
+                value = max(value, event['min'][name])
+            if name in event.get('max', {}):
+                value = min(value, event['max'][name])
+            model.set_parameter(name, value)
+
+
+def simulate(params, seed, ticks, schedule=(), engine='object', rules='origin'):
+    """
+    Runs one job and returns its series.
+
+    Parameters:
+    params (dict): Keyword arguments of the model constructor (without the seed).
+    seed (int): The seed of the run.
+    ticks (int): The number of steps.
+    schedule (list, optional): Schedule entries applied between steps. Defaults to none.
+    engine (str, optional): 'object' (rebellion.model) or 'kernel' (rebellion.kernel). Defaults to 'object'.
+    rules (str, optional): The model variant (see rebellion.rules.VARIANTS). Defaults to 'origin'.
+
+    Returns:
+    dict: The 'quiet', 'jail' and 'active' series (plus the variant's extra series).
+    """
+    if engine == 'kernel':
+        from .kernel import KernelModel as engine_class
+    else:
+        from .model import Model as engine_class
+    model = engine_class(**params, seed=seed, rules=rules)
+    if not schedule:
+        return model.run(ticks)
+    for tick in range(ticks):
+        apply_schedule(model, schedule, tick)
+        model.step()
+    return model.data
+
+
+def _limit_memory(limit):
+    """Caps the address space of this process (soft limit); returns the previous limits, or None."""
+    if not limit:
+        return None
+    import resource
+    previous = resource.getrlimit(resource.RLIMIT_AS)
+    hard = previous[1]
+    resource.setrlimit(resource.RLIMIT_AS, (limit if hard == resource.RLIM_INFINITY else min(limit, hard), hard))
+    return previous
+
+
+@contextlib.contextmanager
+def _memory_limit(limit):
+    """Caps the address space of this process for the duration of a block (in-process runs)."""
+    previous = _limit_memory(limit)
+    try:
+        yield
+    finally:
+        if previous is not None:
+            import resource
+            resource.setrlimit(resource.RLIMIT_AS, previous)
+
+
+def _run_batch(batch, ticks, schedule, variant, engine, cache_dir, rules='origin'):
+    """Runs a batch of jobs in a worker, serving and storing them through the cache."""
+    cache = RunCache(cache_dir) if cache_dir else None
+    run = functools.partial(simulate, schedule=schedule, engine=engine, rules=rules)
+    results = []
+    for index, params, seed in batch:
+        if cache is not None:
+            summary = cache.get_or_run(params, seed, ticks, variant, schedule or None, run).summary
+        else:
+            summary = summarize(run(params, seed, ticks))
+        results.append((index, summary))
+    return results
+
+
+def _drain_ledger(ledger_path, experiment, ticks, schedule, variant, engine, cache_dir, batch_size, rules='origin'):
+    """Claims and runs ledger jobs in a worker until none is left; returns the number of jobs run."""
+    from .ledger import Heartbeat, JobLedger, worker_name
+    ledger = JobLedger(ledger_path)
+    cache = RunCache(cache_dir)
+    run = functools.partial(simulate, schedule=schedule, engine=engine, rules=rules)
+    worker = worker_name()
+    count = 0
+    try:
+        with Heartbeat(ledger_path, worker, ledger.stale_after / 4) as heartbeat:
+            while True:
+                claimed = ledger.claim(worker, batch_size, experiment)
+                if not claimed:
+                    return count
+                for position, job in enumerate(claimed):
+                    heartbeat.hold(claimed[position:])
+                    started = time.time()
+                    try:
+                        cache.get_or_run(job.params, job.seed, ticks, variant, schedule or None, run)
+                    except Exception:
+                        ledger.fail(job, traceback.format_exc())
+                    else:
+                        ledger.complete(job, cache.path(job.key), started)
+                    count += 1
+    finally:
+        ledger.close()
+
+
+class Progress:
+    """Prints a one-line progress report to a stream."""
+    def __init__(self, total, stream=sys.stderr, interval=1.0):
+        """
+        Initializes a Progress object.
+
+        Parameters:
+        total (int): The number of jobs.
+        stream (file, optional): Where reports are written. Defaults to sys.stderr.
+        interval (float, optional): Minimum seconds between reports. Defaults to 1.0.
+        """
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self.last = 0.0
+        self.finished = False
+
+    def update(self, count=1, force=False):
+        """
+        Records finished jobs and reports if the interval has passed.
+
+        Parameters:
+        count (int, optional): The number of newly finished jobs. Defaults to 1.
+        force (bool, optional): Report regardless of the interval. Defaults to False.
+        """
+        self.done += count
+        now = time.monotonic()
+        if self.stream is None or self.finished:
+            return
+        if not force and now - self.last < self.interval and self.done < self.total:
+            return
+        self.last = now
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        eta = f"{(self.total - self.done) / rate:.0f}s" if rate > 0 else '?'
+        self.stream.write(f"\r[{self.done}/{self.total}] {elapsed:.0f}s elapsed, eta {eta} ")
+        if self.done >= self.total:
+            self.finished = True  # The final line is written once
+            self.stream.write("\n")
+        self.stream.flush()
+
+
+def execute(experiment, backend='serial', workers=None, memory_limit=None, batch_size=4, progress=sys.stderr,
+            retry_failed=False):
+    """
+    Runs every job of an experiment that is not already cached.
+
+    If the experiment has a ledger, the jobs are registered in it and claimed from it by the
+    workers, so concurrent invocations share the work; jobs held by another invocation are
+    waited for. Done jobs whose output is no longer in the cache are run again.
+
+    Parameters:
+    experiment (Experiment): The experiment.
+    backend (str, optional): 'serial', 'process' (object engine on a process pool) or 'array'
+        (the compiled kernel of rebellion.kernel, one run per job, on a process pool when
+        workers > 1). Defaults to 'serial'.
+    workers (int, optional): The number of worker processes. Defaults to os.cpu_count().
+    memory_limit (int, optional): Address-space limit in bytes for every worker; in-process runs
+        apply it only while they run. Defaults to none.
+    batch_size (int, optional): The number of jobs sent to a worker at once. Defaults to 4.
+    progress (file, optional): Where progress is reported; None for silence. Defaults to sys.stderr.
+    retry_failed (bool, optional): Give ledger jobs that failed max_attempts times another max_attempts
+        attempts. Defaults to False.
+
+    Returns:
+    list: (params, seed, summary) per job, in job order.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    engine = 'kernel' if backend == 'array' else 'object'
+    # The kernel draws from its own generator, so its runs are cached separately
+    variant = experiment.variant if engine == 'object' else f'{experiment.variant}@kernel'
+    if experiment.ledger:
+        return _execute_ledger(experiment, variant, engine, workers, memory_limit, batch_size, progress,
+                               retry_failed)
+    jobs = experiment.jobs()
+    summaries = [None] * len(jobs)
+    pending = []
+    cache = RunCache(experiment.cache) if experiment.cache else None
+    for index, (params, seed) in enumerate(jobs):
+        key = run_key(params, seed, experiment.ticks, variant, experiment.schedule or None)
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None:
+            summaries[index] = cached.summary
+        else:
+            pending.append((index, params, seed))
+    report = Progress(len(jobs), progress)
+    report.update(len(jobs) - len(pending), force=True)
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    run = functools.partial(_run_batch, ticks=experiment.ticks, schedule=experiment.schedule, variant=variant,
+                            engine=engine, cache_dir=experiment.cache, rules=experiment.variant)
+    workers = workers or os.cpu_count() or 1
+    if backend == 'serial' or workers == 1:
+        with _memory_limit(memory_limit):
+            for batch in batches:
+                for index, summary in run(batch):
+                    summaries[index] = summary
+                report.update(len(batch))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_limit_memory,
+                                 initargs=(memory_limit,)) as pool:
+            queue = iter(batches)
+            running = {pool.submit(run, batch) for batch in itertools.islice(queue, 2 * workers)}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results = future.result()
+                    for index, summary in results:
+                        summaries[index] = summary
+                    report.update(len(results))
+                    batch = next(queue, None)
+                    if batch is not None:
+                        running.add(pool.submit(run, batch))
+    return [(params, seed, summaries[index]) for index, (params, seed) in enumerate(jobs)]
+
+
+def _execute_ledger(experiment, variant, engine, workers, memory_limit, batch_size, progress, retry_failed,
+                    poll=1.0):
+    """Runs an experiment through its job ledger (see execute)."""
+    from .ledger import DONE, JobLedger
+    if not experiment.cache:
+        raise ValueError("A ledger stores its results in the run cache; the experiment needs a cache")
+    schedule = experiment.schedule or None
+    jobs = experiment.jobs()
+    keys = [run_key(params, seed, experiment.ticks, variant, schedule) for params, seed in jobs]
+    cache = RunCache(experiment.cache)
+    ledger = JobLedger(experiment.ledger)
+    try:
+        ledger.add_jobs(experiment.name, [(key, params, seed) for key, (params, seed) in zip(keys, jobs)])
+        if retry_failed:
+            ledger.reset(experiment.name)
+        drain = functools.partial(_drain_ledger, experiment.ledger, experiment.name, experiment.ticks,
+                                  experiment.schedule, variant, engine, experiment.cache, batch_size,
+                                  experiment.variant)
+        rerun = False
+        while True:
+            _run_ledger(ledger, experiment.name, drain, len(jobs), workers, memory_limit, progress, poll)
+            failures = ledger.failures(experiment.name)
+            if failures:
+                break
+            runs = [cache.get(key) for key in keys]
+            missing = [key for key, run in zip(keys, runs) if run is None]
+            if not missing:
+                break
+            if rerun:
+                raise RuntimeError(f"{len(missing)} runs were run again but are still missing from the cache; "
+                                   f"is {experiment.cache} too small to hold the whole experiment?")
+            # The output of a done job was deleted, evicted or stored in another cache: run it again
+            ledger.reset(experiment.name, DONE, missing)
+            rerun = True
+    finally:
+        ledger.close()
+    if failures:
+        raise RuntimeError(f"{len(failures)} jobs failed {ledger.max_attempts} times; first error:\n"
+                           f"{failures[0][3]}\n(run the sweep with --retry-failed to try them again)")
+    return [(params, seed, run.summary) for (params, seed), run in zip(jobs, runs)]
+
+
+def _run_ledger(ledger, experiment, drain, total, workers, memory_limit, progress, poll):
+    """Drains the ledger of an experiment until no job is claimable or running."""
+    report = Progress(total, progress)
+    report.update(ledger.counts(experiment)['done'], force=True)
+    workers = workers or os.cpu_count() or 1
+    while True:
+        if workers == 1:
+            with _memory_limit(memory_limit):
+                drain()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_limit_memory,
+                                     initargs=(memory_limit,)) as pool:
+                futures = [pool.submit(drain) for _ in range(workers)]
+                running = set(futures)
+                while running:
+                    _, running = wait(running, timeout=poll)
+                    report.update(ledger.counts(experiment)['done'] - report.done)
+                for future in futures:
+                    future.result()
+        # Jobs still running belong to other invocations (or a killed one); wait without workers
+        # until they finish or one of them goes stale and can be reclaimed
+        while True:
+            report.update(ledger.counts(experiment)['done'] - report.done)
+            wait_time = ledger.wait_time(experiment)
+            if not wait_time:
+                break
+            time.sleep(min(wait_time, poll))
+        if wait_time is None:
+            return
+
+
+def write_summary(experiment, results, path=None):
+    """
+    Writes one CSV row per run: swept parameters, seed and the requested metrics.
+
+    Parameters:
+    experiment (Experiment): The experiment.
+    results (list): The value returned by execute.
+    path (str, optional): The output file. Defaults to experiment.output.
+    """
+    path = path or experiment.output
+    columns = experiment.swept + ['seed'] + experiment.metrics
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=columns)
+        writer.writeheader()
+        for params, seed, summary in results:
+            row = {name: params[name] for name in experiment.swept}
+            row['seed'] = seed
+            row.update({name: summary[name] for name in experiment.metrics})
+            writer.writerow(row)
+
+
+def describe(experiment):
+    """
+    Returns the canonical description of every job (useful for dry runs).
+
+    Parameters:
+    experiment (Experiment): The experiment.
+
+    Returns:
+    list: describe_run dicts, in job order.
+    """
+    return [describe_run(params, seed, experiment.ticks, experiment.variant, experiment.schedule or None)
+            for params, seed in experiment.jobs()]
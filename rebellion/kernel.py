@@ -0,0 +1,568 @@
+"""
+Compiled kernel of the Rebellion update loop on flat integer arrays.
+
+`Model.step` updates turtles one at a time in a shuffled order, each one
+seeing the moves and arrests of the turtles before it. That asynchronous
+order is what the NetLogo model does and what vectorised (synchronous)
+updates cannot reproduce, so this kernel keeps the exact loop of
+`scripts/replication/origin.py` (including the per-tick jail countdown) and
+only changes the representation:
+
+- the grid is an int32 array of turtle ids (-1 for an empty cell),
+- turtle state lives in parallel arrays (position, type, active, jail term),
+- neighbourhoods are a (cells, offsets) table of cell indices in the same
+  order as `Model.compute_neighborhoods`, and each turtle scans the first
+  `reach[t]` columns (its vision disc when visions differ, see `Model`),
+- randomness comes from a xorshift64 generator held in a one-element array,
+- arrest probabilities are read from the (cops, actives) table of
+  `arrest_table` rather than computed with exp,
+- a social network (see `rebellion.network`) is passed as its CSR arrays.
+
+With numba installed the loop is compiled with `numba.njit`; otherwise the
+very same functions run as plain Python, which is slow but produces
+bit-identical results, so the fallback is a reference rather than a
+different model. The kernel does not share the object model's random
+stream, so the two engines agree in distribution, not run for run; use
+`validate` to compare them over many seeds. With `rng='counter'` both
+engines draw the keyed numbers of `rebellion.counter` instead, and the same
+seed gives the same run in both.
+
+Example:
+    model = KernelModel(70, 4, 7, 2.3, 0.65, 30, seed=1)
+    data = model.run(200)
+"""
+import math
+
+import numpy as np
+
+from . import counter
+from .model import disc_offsets, vision_bounds
+from .network import build_network
+from .rules import get_rules
+
+try:
+    from numba import njit
+    JIT_AVAILABLE = True
+except ImportError:
+    JIT_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda function: function
+
+EMPTY = -1
+ROTATIONS = np.array(counter.ROTATIONS, dtype=np.uint64)
+SHUFFLE, MOVE, ARREST, JAIL = counter.SHUFFLE, counter.MOVE, counter.ARREST, counter.JAIL
+RISK_AVERSION, HARDSHIP, PLACE, VISION = counter.RISK_AVERSION, counter.HARDSHIP, counter.PLACE, counter.VISION
+INITIAL_TICK = counter.INITIAL_TICK
+
+
+@njit(cache=True)
+def _next_uniform(state):
+    """Advances the xorshift64 state and returns a float in [0, 1)."""
+    x = state[0]
+    x ^= x << np.uint64(13)
+    x ^= x >> np.uint64(7)
+    x ^= x << np.uint64(17)
+    state[0] = x
+    return (x >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@njit(cache=True)
+def _randint(state, low, high):
+    """Returns an integer in [low, high], both ends included."""
+    return low + int(_next_uniform(state) * (high - low + 1))
+
+
+@njit(cache=True)
+def _threefry(key0, key1, counter0, counter1):
+    """The first output word of Threefry-2x64-13 (see rebellion.counter.threefry)."""
+    schedule = (key0, key1, np.uint64(counter.PARITY) ^ key0 ^ key1)
+    x0 = counter0 + key0
+    x1 = counter1 + key1
+    for r in range(counter.ROUNDS):
+        rotation = ROTATIONS[r % 8]
+        x0 = x0 + x1
+        x1 = (x1 << rotation) | (x1 >> (np.uint64(64) - rotation))
+        x1 ^= x0
+        if r % 4 == 3:
+            injection = (r + 1) // 4
+            x0 = x0 + schedule[injection % 3]
+            x1 = x1 + schedule[(injection + 1) % 3] + np.uint64(injection)
+    return x0
+
+
+@njit(cache=True)
+def _keyed(stream, tick, key, purpose):
+    """The 64-bit number of rebellion.counter.draw."""
+    return _threefry(stream, np.uint64(purpose), np.uint64(tick + 1), np.uint64(key))
+
+
+@njit(cache=True)
+def _keyed_uniform(stream, tick, key, purpose):
+    """The float of rebellion.counter.uniform."""
+    return (_keyed(stream, tick, key, purpose) >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+
+@njit(cache=True)
+def _keyed_order(stream, tick, items, purpose):
+    """Sorts items in place by their keys, ties by value (the SHUFFLE and PLACE orders)."""
+    items.sort()
+    keys = np.empty(len(items), dtype=np.uint64)
+    for i in range(len(items)):
+        keys[i] = _keyed(stream, tick, items[i], purpose)
+    items[:] = items[np.argsort(keys, kind='mergesort')]
+
+
+@njit(cache=True)
+def _uniforms(state, out):
+    """Fills out with floats in [0, 1)."""
+    for i in range(len(out)):
+        out[i] = _next_uniform(state)
+
+
+@njit(cache=True)
+def _randints(state, out, low, high):
+    """Fills out with integers in [low, high], both ends included."""
+    for i in range(len(out)):
+        out[i] = _randint(state, low, high)
+
+
+@njit(cache=True)
+def _place_all(state, grid, position, count, cells):
+    """Places turtles 0..count-1 on the first `count` cells of a random permutation (partial Fisher-Yates)."""
+    ids = np.arange(cells)
+    for t in range(count):
+        j = _randint(state, t, cells - 1)
+        ids[t], ids[j] = ids[j], ids[t]
+        grid[ids[t]] = t
+        position[t] = ids[t]
+
+
+@njit(cache=True)
+def _keyed_setup(stream, risk_aversion, hardship, grid, position, num_agents):
+    """Draws the attributes and cells of all turtles like Model.create_entities does with rng='counter'."""
+    for t in range(num_agents):
+        risk_aversion[t] = _keyed_uniform(stream, INITIAL_TICK, t, RISK_AVERSION)
+        hardship[t] = _keyed_uniform(stream, INITIAL_TICK, t, HARDSHIP)
+    cells = np.arange(len(grid))
+    _keyed_order(stream, INITIAL_TICK, cells, PLACE)
+    for t in range(len(position)):
+        grid[cells[t]] = t
+        position[t] = cells[t]
+
+
+@njit(cache=True)
+def _keyed_randints(stream, out, start, stop, low, high):
+    """Draws the VISION radii of turtles start..stop-1 like Model.assign_visions does with rng='counter'."""
+    for t in range(start, stop):
+        out[t] = low + int(_keyed_uniform(stream, INITIAL_TICK, t, VISION) * (high - low + 1))
+
+
+@njit(cache=True)
+def _adjust_hardship(grid, position, is_cop, hardship, adjusted, neighbors, reach, num_agents, influence,
+                     jail_term, indptr, indices, weights, network_influence):
+    for t in range(num_agents):
+        total = 0.0
+        count = 0
+        if influence != 0:
+            for n in range(reach[t]):
+                other = grid[neighbors[position[t], n]]
+                if other != EMPTY and not is_cop[other]:
+                    total += hardship[other]
+                    count += 1
+        if network_influence == 0:
+            if count > 0:
+                adjusted[t] = (total / count) * influence + hardship[t] * (1 - influence)
+            continue
+        # The network term: one row of the CSR matrix-vector product, over contacts outside jail
+        spatial = total / count if count > 0 else hardship[t]
+        total = 0.0
+        weight = 0.0
+        for e in range(indptr[t], indptr[t + 1]):
+            other = indices[e]
+            if jail_term[other] == 0:
+                total += weights[e] * hardship[other]
+                weight += weights[e]
+        contacts = total / weight if weight > 0 else hardship[t]
+        adjusted[t] = (spatial * influence + contacts * network_influence
+                       + hardship[t] * (1 - influence - network_influence))
+
+
+def arrest_table(k, size):
+    """
+    Tabulates the arrest probability for every count of cops and active agents up to size.
+
+    The values are computed exactly as Model.build_arrest_table does, so both
+    engines use bit-identical probabilities.
+
+    Parameters:
+    k (float): The arrest probability constant.
+    size (int): The largest count tabulated.
+
+    Returns:
+    array: Shape (size + 1, size + 1), indexed by [cops, actives].
+    """
+    return np.array([[1 - math.exp(-k * math.floor(cops / (actives + 1))) for actives in range(size + 1)]
+                     for cops in range(size + 1)])
+
+
+@njit(cache=True)
+def _run(ticks, state, grid, position, is_cop, active, jail_term, risk_aversion, hardship, adjusted,
+         order, neighbors, reach, scratch, table, gov_legitimacy, max_jail_term, fixed_jail_term, influence, num_agents,
+         indptr, indices, weights, network_influence, stream, keyed, start_tick, out):
+    """
+    Runs `ticks` steps, writing (quiet, jail, active) counts into out[tick].
+
+    `order` holds the turtles still in the model; arrested agents get a term drawn
+    from 0..max_jail_term, or `fixed_jail_term` when it is not negative. With `keyed`
+    the draws are those of rebellion.counter for `stream`, the first tick being `start_tick`.
+    """
+    for tick in range(ticks):
+        if influence != 0 or network_influence != 0:
+            _adjust_hardship(grid, position, is_cop, hardship, adjusted, neighbors, reach, num_agents, influence,
+                             jail_term, indptr, indices, weights, network_influence)
+        now = start_tick + tick
+        if keyed:
+            _keyed_order(stream, now, order, SHUFFLE)
+        else:
+            # Fisher-Yates shuffle of the persistent order, like random.shuffle(self.entities)
+            for i in range(len(order) - 1, 0, -1):
+                j = _randint(state, 0, i)
+                order[i], order[j] = order[j], order[i]
+
+        for t in order:
+            if jail_term[t] > 0:
+                jail_term[t] -= 1
+                continue
+
+            # move_agent: leave the cell, pick among empty or jailed-occupied cells in vision
+            size = reach[t]
+            here = position[t]
+            grid[here] = EMPTY
+            candidates = 0
+            for n in range(size):
+                cell = neighbors[here, n]
+                other = grid[cell]
+                if other == EMPTY or jail_term[other] > 0:
+                    scratch[candidates] = cell
+                    candidates += 1
+            if candidates > 0:
+                u = _keyed_uniform(stream, now, t, MOVE) if keyed else _next_uniform(state)
+                here = scratch[int(u * candidates)]
+                grid[here] = t
+                position[t] = here
+
+            if not is_cop[t]:
+                # determine_behavior
+                cops = 0
+                actives = 0
+                for n in range(size):
+                    other = grid[neighbors[here, n]]
+                    if other != EMPTY:
+                        if is_cop[other]:
+                            cops += 1
+                        elif active[other]:
+                            actives += 1
+                arrest_probability = table[cops, actives]
+                grievance = adjusted[t] * (1 - gov_legitimacy)
+                active[t] = grievance - risk_aversion[t] * arrest_probability > 0.1
+            else:
+                # enforce: arrest a random active agent in vision and take its cell
+                candidates = 0
+                for n in range(size):
+                    cell = neighbors[here, n]
+                    other = grid[cell]
+                    if other != EMPTY and active[other]:
+                        scratch[candidates] = cell
+                        candidates += 1
+                if candidates > 0:
+                    u = _keyed_uniform(stream, now, t, ARREST) if keyed else _next_uniform(state)
+                    cell = scratch[int(u * candidates)]
+                    suspect = grid[cell]
+                    active[suspect] = False
+                    if fixed_jail_term < 0 and keyed:
+                        jail_term[suspect] = int(_keyed_uniform(stream, now, suspect, JAIL) * (max_jail_term + 1))
+                    elif fixed_jail_term < 0:
+                        jail_term[suspect] = _randint(state, 0, max_jail_term)
+                    else:
+                        jail_term[suspect] = fixed_jail_term
+                    grid[here] = EMPTY
+                    grid[cell] = t
+                    position[t] = cell
+
+        quiet = jailed = rebels = 0
+        for t in order:
+            if jail_term[t] > 0:
+                jailed += 1
+            elif not is_cop[t]:
+                if active[t]:
+                    rebels += 1
+                else:
+                    quiet += 1
+        out[tick, 0] = quiet
+        out[tick, 1] = jailed
+        out[tick, 2] = rebels
+
+
+def neighborhood_table(width, height, vision, nested=False):
+    """
+    Builds the neighbourhood table in the order used by Model.compute_neighborhoods.
+
+    Parameters:
+    width (int): The grid width.
+    height (int): The grid height.
+    vision (int): The vision radius.
+    nested (bool, optional): Sort the columns by distance, so every smaller disc is a prefix
+        (see rebellion.model.disc_offsets). Defaults to False.
+
+    Returns:
+    array: Shape (width * height, offsets); row x * height + y lists the cells in vision.
+    """
+    offsets = disc_offsets(vision, nested)
+    dx, dy = np.array(offsets, dtype=np.int32).T
+    x, y = np.divmod(np.arange(width * height, dtype=np.int32), height)
+    return ((x[:, None] + dx) % width * height + (y[:, None] + dy) % height).astype(np.int32)
+
+
+class KernelModel:
+    """The Rebellion model on flat arrays, stepped by the compiled kernel."""
+    def __init__(self, agent_density, cop_density, vision, k, gov_legitimacy, max_jail_term,
+                 neighbor_influence_percentage=0, seed=None, rules=None, agent_vision=None, cop_vision=None,
+                 network=None, network_influence=0, rng=None):
+        """
+        Initializes a KernelModel object; the parameters mirror rebellion.model.Model.
+
+        Parameters:
+        agent_density (float): Percentage of cells initially holding an agent.
+        cop_density (float): Percentage of cells initially holding a cop.
+        vision (int): The vision range of every turtle.
+        k (float): The arrest probability constant.
+        gov_legitimacy (float): The government legitimacy in [0, 1].
+        max_jail_term (int): The maximum number of ticks an arrested agent stays in jail.
+        neighbor_influence_percentage (float, optional): Weight of the neighbours' mean hardship. Defaults to 0.
+        seed (int, optional): Seed of the kernel's generator. Defaults to None (random).
+        rules (str or Rules, optional): The variant; its turtle rules must be data, not callables
+            (see Rules.compiled). Defaults to 'origin'.
+        agent_vision (int or dict, optional): The agents' vision: a radius, or {'low': int, 'high': int}
+            drawn per agent. Defaults to vision.
+        cop_vision (int or dict, optional): The cops' vision, like agent_vision. Defaults to vision.
+        network (Network or dict, optional): The agents' social network (see rebellion.network). Defaults to None.
+        network_influence (float, optional): Weight of the contacts' mean hardship. Defaults to 0.
+        rng (str, optional): None draws from the kernel's xorshift64 sequence; 'counter' draws the numbers
+            of rebellion.counter keyed by seed, like Model(..., rng='counter'). Defaults to None.
+        """
+        if agent_density + cop_density > 100:
+            raise ValueError("The sum of agent_density and cop_density should not exceed 100%")
+        if network_influence and network is None:
+            raise ValueError("network_influence needs a network")
+        if rng not in (None, 'counter'):
+            raise ValueError(f"Unknown rng {rng!r}; expected None or 'counter'")
+        self.rules = get_rules(rules)
+        if not self.rules.compiled:
+            raise ValueError(f"The kernel cannot run {self.rules!r}: its rules include Python callables")
+        self.fixed_jail_term = -1 if self.rules.jail_term is None else int(self.rules.jail_term)
+        self.tick = 0
+        self.width = 40
+        self.height = 40
+        self.vision = vision
+        self.agent_vision = vision if agent_vision is None else agent_vision
+        self.cop_vision = vision if cop_vision is None else cop_vision
+        self.radius = max(vision_bounds(self.agent_vision)[1], vision_bounds(self.cop_vision)[1])
+        self.k = k
+        self.gov_legitimacy = gov_legitimacy
+        self.max_jail_term = max_jail_term
+        self.neighbor_influence_percentage = neighbor_influence_percentage
+        self.network_influence = network_influence
+        self.total_cells = self.width * self.height
+        self.num_agents = int((agent_density / 100) * self.total_cells)
+        self.num_cops = int((cop_density / 100) * self.total_cells)
+        count = self.num_agents + self.num_cops
+        if seed is None:
+            seed = int(np.random.SeedSequence().generate_state(1, dtype=np.uint64)[0])
+        # Spread the seed with splitmix64 so small seeds give unrelated, non-zero states
+        mixed = (int(seed) + 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF
+        mixed = ((mixed ^ (mixed >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        mixed = ((mixed ^ (mixed >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        self.state = np.array([(mixed ^ (mixed >> 31)) or 1], dtype=np.uint64)
+        self.rng = rng
+        self.stream = np.uint64(int(seed) & counter.MASK)
+
+        nested = (self.agent_vision, self.cop_vision) != (vision, vision)
+        self.neighbors = neighborhood_table(self.width, self.height, self.radius, nested)
+        offsets = disc_offsets(self.radius, nested)
+        self.disc_size = np.array([sum(1 for dx, dy in offsets if dx ** 2 + dy ** 2 <= r ** 2)
+                                   for r in range(self.radius + 1)], dtype=np.int32)
+        self.scratch = np.empty(self.neighbors.shape[1], dtype=np.int32)
+        self.arrest_table = arrest_table(k, self.neighbors.shape[1])
+        self.grid = np.full(self.total_cells, EMPTY, dtype=np.int32)
+        self.position = np.empty(count, dtype=np.int32)
+        self.is_cop = np.zeros(count, dtype=np.bool_)
+        self.is_cop[self.num_agents:] = True
+        self.active = np.zeros(count, dtype=np.bool_)
+        self.jail_term = np.zeros(count, dtype=np.int64)
+        self.risk_aversion = np.zeros(count)
+        self.hardship = np.zeros(count)
+        self.visions = np.empty(count, dtype=np.int32)
+        with np.errstate(over='ignore'):  # Threefry wraps around in uint64 (NumPy warns without numba)
+            if rng is None:
+                _uniforms(self.state, self.risk_aversion[:self.num_agents])
+                _uniforms(self.state, self.hardship[:self.num_agents])
+                _place_all(self.state, self.grid, self.position, count, self.total_cells)
+            else:
+                _keyed_setup(self.stream, self.risk_aversion, self.hardship, self.grid, self.position,
+                             self.num_agents)
+            for start, stop, spec in ((0, self.num_agents, self.agent_vision),
+                                      (self.num_agents, count, self.cop_vision)):
+                low, high = vision_bounds(spec)
+                if low == high:
+                    self.visions[start:stop] = low
+                elif rng is None:
+                    _randints(self.state, self.visions[start:stop], low, high)
+                else:
+                    _keyed_randints(self.stream, self.visions, start, stop, low, high)
+        self.adjusted = self.hardship.copy()
+        self.reach = self.disc_size[self.visions]
+        self.order = np.arange(count, dtype=np.int32)
+        self.network = None if network is None else build_network(network, self.num_agents, seed)
+        if self.network is None:  # The kernel takes the CSR arrays of an empty graph
+            self.csr = (np.zeros(self.num_agents + 1, dtype=np.int64), np.empty(0, dtype=np.int32), np.empty(0))
+        else:
+            self.csr = (self.network.indptr, self.network.indices, self.network.weights)
+        self.data = {'quiet': [], 'jail': [], 'active': []}
+        for name in self.rules.series:
+            self.data[name] = []
+
+    def run(self, ticks):
+        """
+        Runs the model for a number of steps.
+
+        Parameters:
+        ticks (int): The number of steps to perform.
+
+        Returns:
+        dict: The recorded 'quiet', 'jail' and 'active' counts per step.
+        """
+        if not self.rules.policies:
+            self._advance(ticks)
+            return self.data
+        # Policies run between steps, so the kernel is entered once per tick
+        for _ in range(ticks):
+            self._advance(1, policies=self.rules.policies)
+        return self.data
+
+    def _advance(self, ticks, policies=()):
+        out = np.zeros((ticks, 3), dtype=np.int64)
+        with np.errstate(over='ignore'):  # Threefry wraps around in uint64 (NumPy warns without numba)
+            _run(ticks, self.state, self.grid, self.position, self.is_cop, self.active, self.jail_term,
+                 self.risk_aversion, self.hardship, self.adjusted, self.order, self.neighbors, self.reach,
+                 self.scratch, self.arrest_table, float(self.gov_legitimacy), int(self.max_jail_term),
+                 self.fixed_jail_term, float(self.neighbor_influence_percentage), self.num_agents, *self.csr,
+                 float(self.network_influence), self.stream, self.rng is not None, self.tick, out)
+        self.data['quiet'].extend(out[:, 0].tolist())
+        self.data['jail'].extend(out[:, 1].tolist())
+        self.data['active'].extend(out[:, 2].tolist())
+        for policy in policies:
+            policy(self)
+        self.tick += ticks
+
+    def step(self):
+        """
+        Performs one step of the simulation.
+        """
+        self.run(1)
+
+    def set_parameter(self, name, value):
+        """
+        Changes a global parameter between steps (used by experiment schedules).
+
+        Parameters:
+        name (str): One of 'gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage' or
+            'network_influence'.
+        value (float): The new value.
+        """
+        if name not in ('gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage', 'network_influence'):
+            raise ValueError(f"Parameter {name!r} cannot be changed during a run")
+        if name == 'network_influence' and value and self.network is None:
+            raise ValueError("network_influence needs a network")
+        setattr(self, name, value)
+        if name == 'k':
+            self.arrest_table = arrest_table(value, self.neighbors.shape[1])
+
+    def count_cops(self):
+        """
+        Counts the cops still in the model.
+
+        Returns:
+        int: The number of cops.
+        """
+        return int(self.is_cop[self.order].sum())
+
+    def remove_cop(self):
+        """
+        Removes the first cop of the current update order from the model.
+
+        Returns:
+        int: The removed cop's index, or None if there is none left.
+        """
+        cops = np.flatnonzero(self.is_cop[self.order])
+        if not len(cops):
+            return None
+        cop = int(self.order[cops[0]])
+        self.order = np.delete(self.order, cops[0])
+        if self.grid[self.position[cop]] == cop:
+            self.grid[self.position[cop]] = EMPTY
+        return cop
+
+
+def validate(params, ticks=200, seeds=range(30), tolerance=4.0):
+    """
+    Compares the kernel with the object engine over many seeds.
+
+    For every summary metric and for the per-tick mean of each series, the
+    difference of the two ensemble means is divided by its standard error.
+    Differences beyond `tolerance` standard errors are reported as failures.
+
+    Parameters:
+    params (dict): Keyword arguments of the Model constructor (without the seed).
+    ticks (int, optional): The number of steps per run. Defaults to 200.
+    seeds (iterable, optional): The seeds run by each engine. Defaults to range(30).
+    tolerance (float, optional): The largest accepted |z| score. Defaults to 4.0.
+
+    Returns:
+    dict: 'metrics' maps each metric to (object mean, kernel mean, z); 'failures' lists the
+        metrics (or 'series:tick') beyond tolerance.
+    """
+    from .metrics import summarize
+    from .model import Model
+
+    seeds = list(seeds)
+    reference = [Model(**params, seed=seed).run(ticks) for seed in seeds]
+    candidate = [KernelModel(**params, seed=seed).run(ticks) for seed in seeds]
+
+    def z_score(a, b):
+        a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+        error = np.sqrt(a.var(ddof=1) / len(a) + b.var(ddof=1) / len(b))
+        difference = a.mean() - b.mean()
+        if error == 0:
+            return 0.0 if difference == 0 else math.inf
+        return float(difference / error)
+
+    report = {'metrics': {}, 'failures': []}
+    reference_summaries = [summarize(data) for data in reference]
+    candidate_summaries = [summarize(data) for data in candidate]
+    for name in reference_summaries[0]:
+        a = [summary[name] for summary in reference_summaries]
+        b = [summary[name] for summary in candidate_summaries]
+        z = z_score(a, b)
+        report['metrics'][name] = (float(np.mean(a)), float(np.mean(b)), z)
+        if abs(z) > tolerance:
+            report['failures'].append(name)
+    for series in ('quiet', 'jail', 'active'):
+        a = np.array([data[series] for data in reference])
+        b = np.array([data[series] for data in candidate])
+        for tick in range(ticks):
+            if abs(z_score(a[:, tick], b[:, tick])) > tolerance:
+                report['failures'].append(f'{series}:{tick}')
+    return report
@@ -0,0 +1,378 @@
+"""
+Persistent job ledger for resumable, multi-worker sweeps.
+
+The ledger is an SQLite database in WAL mode with one row per (experiment,
+run key) job, recording its parameters, seed, status, attempts, timing, the
+worker holding it and where its output was stored. Workers claim jobs inside
+an IMMEDIATE transaction, so any number of processes (on one machine, or on
+several sharing a local disk) can pull from the same ledger without running a
+job twice.
+
+A job is claimable when it is pending, when it failed fewer than
+`max_attempts` times, or when it is marked running but its worker has not
+sent a heartbeat for `stale_after` seconds (the worker was killed, e.g. by
+preemption). Restarting a sweep therefore skips every completed job and
+reschedules the failed and stale ones; jobs that failed `max_attempts` times
+stay failed until they are `reset` (e.g. with `sweep --retry-failed`). A worker keeps its jobs alive with a
+`Heartbeat`, a background thread, so a job may run longer than
+`stale_after`; only the worker holding a job can record its result, so a
+worker whose job was reclaimed cannot overwrite the new holder's.
+
+Example:
+    ledger = JobLedger('extension1.ledger.db')
+    ledger.add_jobs('extension1', [(key, params, seed), ...])
+    for job in ledger.claim(worker_name(), limit=4):
+        started = time.time()
+        ...
+        ledger.complete(job, output_path, started)
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    experiment TEXT NOT NULL,
+    key TEXT NOT NULL,
+    params TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    claimed_at REAL,
+    heartbeat REAL,
+    finished_at REAL,
+    duration REAL,
+    output TEXT,
+    error TEXT,
+    PRIMARY KEY (experiment, key)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (experiment, status);
+"""
+
+
+def worker_name():
+    """
+    Returns an identifier of the current process, unique across hosts.
+
+    Returns:
+    str: 'hostname:pid'.
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Job:
+    """One claimed job."""
+    def __init__(self, experiment, key, params, seed, attempts, worker=None):
+        """
+        Initializes a Job object.
+
+        Parameters:
+        experiment (str): The experiment name.
+        key (str): The run key of the job.
+        params (dict): The model parameters.
+        seed (int): The seed of the run.
+        attempts (int): The number of times the job has been claimed, including this one.
+        worker (str, optional): The worker that claimed the job. Defaults to None.
+        """
+        self.experiment = experiment
+        self.key = key
+        self.params = params
+        self.seed = seed
+        self.attempts = attempts
+        self.worker = worker
+
+    def __repr__(self):
+        return f"Job({self.experiment}, {self.key[:12]}, seed={self.seed}, attempt={self.attempts})"
+
+
+class JobLedger:
+    """An SQLite-backed table of sweep jobs and their status."""
+    def __init__(self, path, stale_after=600.0, max_attempts=3, timeout=60.0):
+        """
+        Initializes a JobLedger object, creating the database if needed.
+
+        Parameters:
+        path (str): The database file.
+        stale_after (float, optional): Seconds without heartbeat after which a running job
+            is reclaimed. Defaults to 600.
+        max_attempts (int, optional): Failed jobs are retried until claimed this often. Defaults to 3.
+        timeout (float, optional): Seconds to wait for a lock held by another process. Defaults to 60.
+        """
+        self.path = path
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+        # Autocommit mode: transactions are opened explicitly where they are needed
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self.connection.close()
+
+    def add_jobs(self, experiment, jobs):
+        """
+        Registers jobs; jobs already in the ledger keep their status.
+
+        Parameters:
+        experiment (str): The experiment name.
+        jobs (iterable): (key, params dict, seed) triples.
+
+        Returns:
+        int: The number of newly added jobs.
+        """
+        rows = [(experiment, key, json.dumps(params, sort_keys=True), int(seed)) for key, params, seed in jobs]
+        before = self.connection.total_changes
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO jobs (experiment, key, params, seed) VALUES (?, ?, ?, ?)', rows)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.connection.total_changes - before
+
+    def claim(self, worker, limit=1, experiment=None):
+        """
+        Atomically claims up to `limit` claimable jobs for a worker.
+
+        Parameters:
+        worker (str): The claiming worker's name (see worker_name).
+        limit (int, optional): The maximum number of jobs. Defaults to 1.
+        experiment (str, optional): Only claim jobs of this experiment. Defaults to any.
+
+        Returns:
+        list: The claimed Job objects (empty when nothing is left to do).
+        """
+        now = time.time()
+        condition, arguments = self._claimable(now, experiment)
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = self.connection.execute(
+                f'SELECT experiment, key, params, seed, attempts FROM jobs WHERE {condition} '
+                'ORDER BY attempts, rowid LIMIT ?', arguments + [limit]).fetchall()
+            self.connection.executemany(
+                "UPDATE jobs SET status = 'running', worker = ?, claimed_at = ?, heartbeat = ?, "
+                'attempts = attempts + 1, error = NULL WHERE experiment = ? AND key = ?',
+                [(worker, now, now, row[0], row[1]) for row in rows])
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return [Job(row[0], row[1], json.loads(row[2]), row[3], row[4] + 1, worker) for row in rows]
+
+    def _claimable(self, now, experiment):
+        """Returns the WHERE condition (and its arguments) of the jobs claimable at time now."""
+        condition = ("(status = 'pending' OR (status = 'failed' AND attempts < ?) "
+                     "OR (status = 'running' AND heartbeat < ?))")
+        arguments = [self.max_attempts, now - self.stale_after]
+        if experiment is not None:
+            condition += ' AND experiment = ?'
+            arguments.append(experiment)
+        return condition, arguments
+
+    def wait_time(self, experiment=None):
+        """
+        Returns how long it is until a job can be claimed.
+
+        Parameters:
+        experiment (str, optional): Only consider jobs of this experiment. Defaults to any.
+
+        Returns:
+        float: 0 if a job is claimable now, else the seconds until the earliest running job goes
+            stale; None if no job is claimable or running.
+        """
+        now = time.time()
+        condition, arguments = self._claimable(now, experiment)
+        if self.connection.execute(f'SELECT 1 FROM jobs WHERE {condition} LIMIT 1', arguments).fetchone():
+            return 0.0
+        query = "SELECT MIN(heartbeat) FROM jobs WHERE status = 'running'"
+        if experiment is not None:
+            query += ' AND experiment = ?'
+        (heartbeat,) = self.connection.execute(query, () if experiment is None else (experiment,)).fetchone()
+        if heartbeat is None:
+            return None
+        return max(heartbeat + self.stale_after - now, 0.0)
+
+    def heartbeat(self, jobs, worker):
+        """
+        Marks a worker's running jobs as still alive.
+
+        Parameters:
+        jobs (list): The Job objects the worker still holds.
+        worker (str): The worker's name.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "UPDATE jobs SET heartbeat = ? WHERE experiment = ? AND key = ? AND worker = ? AND status = 'running'",
+            [(now, job.experiment, job.key, worker) for job in jobs])
+
+    def complete(self, job, output, started):
+        """
+        Records a finished job, unless it was reclaimed by another worker in the meantime.
+
+        Parameters:
+        job (Job): The job.
+        output (str): Where the job's output is stored.
+        started (float): The time.time() at which the job started.
+
+        Returns:
+        bool: Whether the job was still held by its worker and is now recorded as done.
+        """
+        now = time.time()
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = 'done', finished_at = ?, duration = ?, output = ?, heartbeat = ? "
+            "WHERE experiment = ? AND key = ? AND worker = ? AND status = 'running'",
+            (now, now - started, output, now, job.experiment, job.key, job.worker))
+        return cursor.rowcount > 0
+
+    def fail(self, job, error):
+        """
+        Records a failed job, unless it was reclaimed by another worker; it is retried until
+        max_attempts is reached.
+
+        Parameters:
+        job (Job): The job.
+        error (str): A description of the failure (e.g. the traceback).
+
+        Returns:
+        bool: Whether the job was still held by its worker and is now recorded as failed.
+        """
+        cursor = self.connection.execute(
+            "UPDATE jobs SET status = 'failed', finished_at = ?, error = ? "
+            "WHERE experiment = ? AND key = ? AND worker = ? AND status = 'running'",
+            (time.time(), error, job.experiment, job.key, job.worker))
+        return cursor.rowcount > 0
+
+    def reset(self, experiment=None, status=FAILED, keys=None):
+        """
+        Makes jobs pending again, with no attempts recorded.
+
+        Used to retry jobs that failed max_attempts times, and to rerun done jobs whose output is gone.
+
+        Parameters:
+        experiment (str, optional): Only reset jobs of this experiment. Defaults to all.
+        status (str, optional): Only reset jobs with this status. Defaults to 'failed'.
+        keys (iterable, optional): Only reset jobs with these run keys. Defaults to all.
+
+        Returns:
+        int: The number of jobs reset.
+        """
+        query = ("UPDATE jobs SET status = 'pending', attempts = 0, worker = NULL, claimed_at = NULL, "
+                 'heartbeat = NULL, finished_at = NULL, duration = NULL, output = NULL, error = NULL '
+                 'WHERE status = ?')
+        arguments = [status]
+        if experiment is not None:
+            query += ' AND experiment = ?'
+            arguments.append(experiment)
+        if keys is None:
+            return self.connection.execute(query, arguments).rowcount
+        before = self.connection.total_changes
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.connection.executemany(query + ' AND key = ?', [arguments + [key] for key in keys])
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.connection.total_changes - before
+
+    def counts(self, experiment=None):
+        """
+        Counts jobs by status.
+
+        Parameters:
+        experiment (str, optional): Only count jobs of this experiment. Defaults to all.
+
+        Returns:
+        dict: Maps 'pending', 'running', 'done' and 'failed' to job counts.
+        """
+        query = 'SELECT status, COUNT(*) FROM jobs'
+        arguments = ()
+        if experiment is not None:
+            query += ' WHERE experiment = ?'
+            arguments = (experiment,)
+        counts = {PENDING: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update(dict(self.connection.execute(query + ' GROUP BY status', arguments).fetchall()))
+        return counts
+
+    def failures(self, experiment=None):
+        """
+        Lists jobs that failed for good (max_attempts reached).
+
+        Parameters:
+        experiment (str, optional): Only list jobs of this experiment. Defaults to all.
+
+        Returns:
+        list: (key, params dict, seed, error) tuples.
+        """
+        query = "SELECT key, params, seed, error FROM jobs WHERE status = 'failed' AND attempts >= ?"
+        arguments = [self.max_attempts]
+        if experiment is not None:
+            query += ' AND experiment = ?'
+            arguments.append(experiment)
+        return [(key, json.loads(params), seed, error)
+                for key, params, seed, error in self.connection.execute(query, arguments)]
+
+
+class Heartbeat:
+    """Keeps a worker's jobs alive from a background thread while it runs them."""
+    def __init__(self, path, worker, interval):
+        """
+        Initializes a Heartbeat object; use it as a context manager.
+
+        Parameters:
+        path (str): The ledger database file.
+        worker (str): The worker's name.
+        interval (float): Seconds between heartbeats; well below the ledger's stale_after.
+        """
+        self.path = path
+        self.worker = worker
+        self.interval = interval
+        self.jobs = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._beat, name='ledger-heartbeat', daemon=True)
+
+    def hold(self, jobs):
+        """
+        Sets the jobs the worker holds (the one it runs and those it will run).
+
+        Parameters:
+        jobs (list): The Job objects.
+        """
+        with self.lock:
+            self.jobs = list(jobs)
+
+    def _beat(self):
+        # sqlite3 connections belong to their thread, so the heartbeat has its own
+        ledger = JobLedger(self.path)
+        try:
+            while not self.stopped.wait(self.interval):
+                with self.lock:
+                    jobs = self.jobs
+                if jobs:
+                    ledger.heartbeat(jobs, self.worker)
+        finally:
+            ledger.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,467 @@
+"""
+Mean-field companion model for cheap screening of parameter regions.
+
+A full run follows every turtle; this model only follows how many agents of
+each kind there are. Agents are binned by (hardship, risk aversion) and the
+state is the quiet, active and jailed mass of every bin, either globally or
+per coarse tile of the grid. One tick applies the rules of `Model.step` to
+these masses as difference equations:
+
+- the numbers of cops and active agents in a vision disc are Poisson with
+  the expected counts of the disc, and the decision rule of
+  `determine_behavior` (grievance - risk_aversion * P > 0.1, with P read
+  from the same arrest table) gives the share of each bin turning active;
+- every cop arrests one active agent in its vision unless the disc holds
+  none, so arrests remove active mass in proportion to each bin's share;
+- arrested mass waits in a jail calendar of the variant's term distribution
+  (uniform on 0..max_jail_term or fixed) and returns quiet when released.
+
+With tiles, each tick also spreads the free mass over the tiles a vision
+disc reaches (the random moves) and counts turtles in vision through the
+same overlap matrix. A 1000-tick run takes milliseconds, so whole grids can
+be screened (`screen`) before spending full runs; `calibrate` measures how
+far the mean field is from the full model at chosen points.
+
+Limitation: the mean field follows expected masses, so it lacks the local
+fluctuations that set off the chain reactions behind outbursts. It agrees
+with the full model where nothing happens (high legitimacy), but in the
+outburst regime it settles at a quiet fixed point or a single wave. At the
+canonical point (70, 4, 7, 2.3, 0.82, 30) it peaks at about 6 active agents
+with no outburst in 200 ticks, where full runs peak at about 360 with about
+7 outbursts. Its values only count where `calibrate` agrees; given a
+calibration report, `screen` marks the grid points outside that region.
+
+Example:
+    data = MeanFieldModel(70, 4, 7, 2.3, 0.82, 30).run(1000)
+    report = calibrate([dict(agent_density=70, cop_density=4, vision=7, k=2.3,
+                             gov_legitimacy=0.82, max_jail_term=30)])
+    print(format_report(report))
+"""
+import itertools
+import math
+
+import numpy as np
+
+from .kernel import njit
+from .metrics import summarize
+from .model import disc_offsets
+from .rules import get_rules
+
+# Poisson tails beyond this many standard deviations are folded into the last count
+TAIL = 10
+
+
+@njit(cache=True)
+def _poisson(rate, size):
+    """Returns the Poisson pmf over 0..size, the tail folded into size."""
+    pmf = np.empty(size + 1)
+    pmf[0] = math.exp(-rate)
+    for n in range(1, size + 1):
+        pmf[n] = pmf[n - 1] * rate / n
+    pmf[size] = max(0.0, 1.0 - pmf[:size].sum())
+    return pmf
+
+
+@njit(cache=True)
+def _decide(cop_rate, active_rate, disc, k, threshold, share, seen):
+    """
+    Applies the decision rule to every bin of every tile.
+
+    With Poisson cop and active counts in vision, an agent of bin b turns
+    active iff floor(cops / (actives + 1)) is at most the largest m whose
+    arrest probability is below threshold[b]. share[0] is the probability of
+    that for a quiet agent and share[1] for an active one (which counts
+    itself); seen holds the expected number of cops in vision given the
+    agent turned active.
+    """
+    for t in range(len(cop_rate)):
+        size_c = min(disc, int(cop_rate[t] + TAIL * math.sqrt(cop_rate[t]) + TAIL))
+        size_a = min(disc, int(active_rate[t] + TAIL * math.sqrt(active_rate[t]) + TAIL))
+        cops = _poisson(cop_rate[t], size_c)
+        actives = _poisson(active_rate[t], size_a)
+        cdf = np.cumsum(cops)
+        weighted = np.cumsum(cops * np.arange(size_c + 1))
+        # sums[s, 0, m + 1] = P(floor(cops / (actives + s + 1)) <= m), sums[s, 1, m + 1] the same sum of cops
+        sums = np.zeros((2, 2, size_c + 2))
+        for m in range(size_c + 1):
+            for a in range(size_a + 1):
+                for s in range(2):
+                    last = min((m + 1) * (a + s + 1) - 1, size_c)
+                    sums[s, 0, m + 1] += actives[a] * cdf[last]
+                    sums[s, 1, m + 1] += actives[a] * weighted[last]
+        probability = 1 - np.exp(-k * np.arange(size_c + 1))
+        # Active iff the arrest probability is below the threshold; the table rises with m
+        below = np.searchsorted(probability, threshold)
+        for s in range(2):
+            for b in range(len(threshold)):
+                share[s, t, b] = sums[s, 0, below[b]]
+                seen[s, t, b] = sums[s, 1, below[b]] / share[s, t, b] if share[s, t, b] > 0 else 0.0
+
+
+def tile_of(cells, width, height, tiles):
+    """
+    Maps cell ids (x * height + y) to coarse tile ids.
+
+    Parameters:
+    cells (array): The cell ids.
+    width (int): The grid width.
+    height (int): The grid height.
+    tiles (int): Tiles per side of the grid.
+
+    Returns:
+    array: Tile ids in 0..tiles ** 2 - 1.
+    """
+    x, y = np.divmod(cells, height)
+    return (x * tiles // width) * tiles + y * tiles // height
+
+
+def overlap_matrix(width, height, vision, tiles):
+    """
+    Computes the share of a vision disc lying in each tile, averaged over the cells of a tile.
+
+    Parameters:
+    width (int): The grid width.
+    height (int): The grid height.
+    vision (int): The vision radius.
+    tiles (int): Tiles per side of the grid.
+
+    Returns:
+    array: Shape (tiles ** 2, tiles ** 2); row i is the mean disc of a cell in tile i.
+    """
+    offsets = np.array(disc_offsets(vision))
+    x, y = np.divmod(np.arange(width * height), height)
+    tile = tile_of(np.arange(width * height), width, height, tiles)
+    target = tile_of((x[:, None] + offsets[:, 0]) % width * height + (y[:, None] + offsets[:, 1]) % height,
+                     width, height, tiles)
+    count = tiles * tiles
+    matrix = np.zeros((count, count))
+    np.add.at(matrix, (np.repeat(tile, len(offsets)), target.ravel()), 1.0)
+    return matrix / matrix.sum(axis=1, keepdims=True)
+
+
+class MeanFieldModel:
+    """Quiet, active and jailed agent masses per (hardship, risk aversion) bin, stepped as difference equations."""
+    def __init__(self, agent_density, cop_density, vision, k, gov_legitimacy, max_jail_term,
+                 neighbor_influence_percentage=0, seed=None, rules=None, bins=16, tiles=1):
+        """
+        Initializes a MeanFieldModel object; the parameters mirror rebellion.model.Model.
+
+        Parameters:
+        agent_density (float): Percentage of cells initially holding an agent.
+        cop_density (float): Percentage of cells initially holding a cop.
+        vision (int): The vision range of every turtle.
+        k (float): The arrest probability constant.
+        gov_legitimacy (float): The government legitimacy in [0, 1].
+        max_jail_term (int): The maximum number of ticks an arrested agent stays in jail.
+        neighbor_influence_percentage (float, optional): Weight of the neighbours' mean hardship; the
+            mean field uses the population mean. Defaults to 0.
+        seed (int, optional): Draw the initial placement and attributes like a full run would; None
+            starts from the expected (uniform) masses. Defaults to None.
+        rules (str or Rules, optional): The variant; like the kernel, only rules without Python
+            callables (see Rules.compiled). Defaults to 'origin'.
+        bins (int, optional): Bins per attribute (hardship and risk aversion). Defaults to 16.
+        tiles (int, optional): Tiles per side of the grid; 1 is a global mean field. Tiles only differ
+            from it when `seed` makes the initial placement uneven. Defaults to 1.
+        """
+        if agent_density + cop_density > 100:
+            raise ValueError("The sum of agent_density and cop_density should not exceed 100%")
+        self.rules = get_rules(rules)
+        if not self.rules.compiled:
+            raise ValueError(f"The mean field cannot run {self.rules!r}: its rules include Python callables")
+        if bins < 1 or tiles < 1:
+            raise ValueError(f"bins and tiles must be positive, got {bins} and {tiles}")
+        self.tick = 0
+        self.width = 40
+        self.height = 40
+        self.vision = vision
+        self.k = k
+        self.gov_legitimacy = gov_legitimacy
+        self.max_jail_term = max_jail_term
+        self.neighbor_influence_percentage = neighbor_influence_percentage
+        self.total_cells = self.width * self.height
+        self.num_agents = int((agent_density / 100) * self.total_cells)
+        self.num_cops = int((cop_density / 100) * self.total_cells)
+        self.disc = len(disc_offsets(vision))
+        self.overlap = overlap_matrix(self.width, self.height, vision, tiles)
+        self.tile_cells = np.bincount(tile_of(np.arange(self.total_cells), self.width, self.height, tiles),
+                                      minlength=tiles * tiles).astype(float)
+        centers = (np.arange(bins) + 0.5) / bins
+        self.hardship, self.risk_aversion = (values.ravel() for values in np.meshgrid(centers, centers, indexing='ij'))
+        self.quiet, self.cops = self._initial_masses(bins, tiles, seed)
+        self.active = np.zeros_like(self.quiet)
+        self.mean_hardship = float((self.quiet.sum(axis=0) @ self.hardship) / max(self.quiet.sum(), 1e-12))
+        self.fixed_jail_term = None if self.rules.jail_term is None else int(self.rules.jail_term)
+        # Jail calendar: jail[(cursor + r) % len] is released at the end of the r-th next tick
+        length = (self.fixed_jail_term if self.fixed_jail_term is not None else max_jail_term) + 1
+        self.jail = np.zeros((max(length, 1),) + self.quiet.shape)
+        self.cursor = 0
+        self.jailed = 0.0  # The jail calendar's total mass
+        self.data = {'quiet': [], 'jail': [], 'active': []}
+        for name in self.rules.series:
+            self.data[name] = []
+
+    def _initial_masses(self, bins, tiles, seed):
+        count = tiles * tiles
+        if seed is None:
+            share = self.tile_cells / self.total_cells
+            quiet = np.outer(share * self.num_agents, np.full(bins * bins, 1.0 / (bins * bins)))
+            return quiet, share * self.num_cops
+        rng = np.random.default_rng(seed)
+        cells = rng.permutation(self.total_cells)[:self.num_agents + self.num_cops]
+        tile = tile_of(cells, self.width, self.height, tiles)
+        hardship, risk_aversion = rng.random(self.num_agents), rng.random(self.num_agents)
+        bin_of = np.minimum((hardship * bins).astype(int), bins - 1) * bins + np.minimum(
+            (risk_aversion * bins).astype(int), bins - 1)
+        quiet = np.zeros((count, bins * bins))
+        np.add.at(quiet, (tile[:self.num_agents], bin_of), 1.0)
+        return quiet, np.bincount(tile[self.num_agents:], minlength=count).astype(float)
+
+    def _in_vision(self, mass):
+        """Expected count in a vision disc of turtles with per-tile mass `mass`."""
+        return self.disc * (self.overlap @ (mass / self.tile_cells))
+
+    def _decisions(self, cop_rate, active_rate):
+        """
+        Applies determine_behavior to the bins (see _decide).
+
+        Returns:
+        tuple: (share, seen), each of shape (2, tiles, bins); index 0 is for quiet agents, 1 for active ones.
+        """
+        adjusted = (self.hardship * (1 - self.neighbor_influence_percentage)
+                    + self.mean_hardship * self.neighbor_influence_percentage)
+        threshold = (adjusted * (1 - self.gov_legitimacy) - 0.1) / self.risk_aversion
+        share = np.empty((2,) + self.quiet.shape)
+        seen = np.empty_like(share)
+        _decide(cop_rate, active_rate, self.disc, float(self.k), threshold, share, seen)
+        return share, seen
+
+    def step(self):
+        """
+        Performs one step of the simulation.
+        """
+        overlap = self.overlap
+        if len(overlap) > 1:  # Free turtles move within their vision disc
+            self.quiet = overlap.T @ self.quiet
+            self.active = overlap.T @ self.active
+            self.cops = overlap.T @ self.cops
+        cop_rate = self._in_vision(self.cops)
+        active_rate = self._in_vision(self.active.sum(axis=1))
+        (from_quiet, from_active), (seen_quiet, seen_active) = self._decisions(cop_rate, active_rate)
+        turned = self.quiet * from_quiet
+        stayed = self.active * from_active
+        # The cops in vision of an active agent see it too (vision is symmetric); each arrests one of the
+        # active agents it sees, i.e. this one with probability E[1 / (1 + others)] for Poisson others.
+        # Agents that just turned active are only exposed to the cops acting after them: half, on average.
+        active_rate = self._in_vision((turned + stayed).sum(axis=1))
+        pick = np.divide(-np.expm1(-active_rate), active_rate, out=np.ones_like(active_rate), where=active_rate > 0)
+        arrested = (turned * -np.expm1(-0.5 * seen_quiet * pick[:, None])
+                    + stayed * -np.expm1(-seen_active * pick[:, None]))
+        self.quiet += self.active - turned - stayed
+        self.active = turned + stayed - arrested
+        # File the arrested mass under the ticks it will be released at (a term of t ticks is served
+        # in this tick and the t - 1 next ones; a term of 0 releases at once)
+        length = len(self.jail)
+        if self.fixed_jail_term is not None:
+            terms, share = np.array([min(self.fixed_jail_term, length - 1)]), 1.0
+        else:
+            terms, share = np.arange(min(self.max_jail_term, length - 1) + 1), 1.0 / (self.max_jail_term + 1)
+        if terms[0] == 0:
+            self.quiet += arrested * share
+            terms = terms[1:]
+        self.jail[(self.cursor + terms - 1) % length] += arrested * share
+        self.jailed += arrested.sum() * share * len(terms)
+        # Releases at the end of the tick
+        self.quiet += self.jail[self.cursor]
+        self.jailed -= self.jail[self.cursor].sum()
+        self.jail[self.cursor] = 0
+        self.cursor = (self.cursor + 1) % length
+        self.data['quiet'].append(float(self.quiet.sum()))
+        self.data['jail'].append(float(self.jailed))
+        self.data['active'].append(float(self.active.sum()))
+        for policy in self.rules.policies:
+            policy(self)
+        self.tick += 1
+
+    def run(self, ticks):
+        """
+        Runs the model for a number of steps.
+
+        Parameters:
+        ticks (int): The number of steps to perform.
+
+        Returns:
+        dict: The 'quiet', 'jail' and 'active' masses per step (floats).
+        """
+        for _ in range(ticks):
+            self.step()
+        return self.data
+
+    def set_parameter(self, name, value):
+        """
+        Changes a global parameter between steps (used by experiment schedules).
+
+        Parameters:
+        name (str): One of 'gov_legitimacy', 'k', 'max_jail_term' or 'neighbor_influence_percentage'.
+        value (float): The new value.
+        """
+        if name not in ('gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage'):
+            raise ValueError(f"Parameter {name!r} cannot be changed during a run")
+        if name == 'max_jail_term':  # The calendar keeps the length it was built with
+            value = min(int(value), len(self.jail) - 1)
+        setattr(self, name, value)
+
+    def count_cops(self):
+        """
+        Counts the cops still in the model.
+
+        Returns:
+        float: The number of cops.
+        """
+        return float(self.cops.sum())
+
+    def remove_cop(self):
+        """
+        Removes one cop, taken from the tiles in proportion to their cops.
+
+        Returns:
+        float: The mass removed (1, or less when fewer cops are left).
+        """
+        total = self.cops.sum()
+        removed = min(1.0, total)
+        if removed > 0:
+            self.cops *= 1 - removed / total
+        return removed
+
+
+def calibrate(points, seeds=range(5), ticks=200, engine='kernel', rules=None, tolerance=2.0, **options):
+    """
+    Compares the mean field with full runs at a few parameter points.
+
+    The error of every metric is measured in seed-to-seed standard deviations
+    of the full model (at least 1 agent), so a point agrees when the mean
+    field falls within the scatter of the full runs.
+
+    Parameters:
+    points (iterable): Dicts of Model keyword arguments (without the seed).
+    seeds (iterable, optional): The seeds of the full runs per point. Defaults to range(5).
+    ticks (int, optional): The length of every run. Defaults to 200.
+    engine (str, optional): The full engine, 'object' or 'kernel'. Defaults to 'kernel'.
+    rules (str or Rules, optional): The variant. Defaults to 'origin'.
+    tolerance (float, optional): The largest error (in standard deviations) counted as agreement.
+        Defaults to 2.0.
+    **options: Passed on to MeanFieldModel (bins, tiles).
+
+    Returns:
+    list: One dict per point with 'params', 'metrics' (metric -> (mean field, full mean, full std,
+        error)), 'active_rmse' (of the mean active series) and 'agrees'.
+    """
+    from .experiment import simulate
+
+    seeds = list(seeds)
+    report = []
+    for params in points:
+        full = [simulate(params, seed, ticks, engine=engine, rules=rules) for seed in seeds]
+        field = MeanFieldModel(**params, rules=rules, **options).run(ticks)
+        summaries = [summarize(data) for data in full]
+        expected = summarize(field)
+        metrics = {}
+        for name, value in expected.items():
+            values = np.array([summary[name] for summary in summaries], dtype=float)
+            std = float(values.std(ddof=1)) if len(values) > 1 else 0.0
+            metrics[name] = (float(value), float(values.mean()), std, abs(value - values.mean()) / max(std, 1.0))
+        mean_series = np.mean([data['active'] for data in full], axis=0)
+        report.append({
+            'params': dict(params),
+            'metrics': metrics,
+            'active_rmse': float(np.sqrt(np.mean((np.asarray(field['active']) - mean_series) ** 2))),
+            'agrees': all(error <= tolerance for _, _, _, error in metrics.values()),
+        })
+    return report
+
+
+def format_report(report):
+    """
+    Formats a calibration report as a text table.
+
+    Parameters:
+    report (list): The result of calibrate.
+
+    Returns:
+    str: One block per point, one line per metric.
+    """
+    lines = []
+    for entry in report:
+        point = ', '.join(f'{name}={value}' for name, value in entry['params'].items())
+        verdict = 'agrees' if entry['agrees'] else 'DISAGREES'
+        lines.append(f"{point}: {verdict} (active rmse {entry['active_rmse']:.1f})")
+        lines.append(f"  {'metric':<24}{'mean field':>12}{'full mean':>12}{'full std':>10}{'error':>8}")
+        for name, (field, mean, std, error) in entry['metrics'].items():
+            lines.append(f"  {name:<24}{field:>12.1f}{mean:>12.1f}{std:>10.1f}{error:>8.2f}")
+    return '\n'.join(lines)
+
+
+def screen(base_params, grid, ticks=1000, metric='mean_active', sensitivity=0.1, rules=None, calibration=None,
+           **options):
+    """
+    Evaluates the mean field over a parameter grid and flags where full runs are worthwhile.
+
+    A point is flagged when the metric changes by more than `sensitivity`
+    times its range over the grid between the point and a grid neighbour:
+    there the model changes regime, which is where the mean field is least
+    reliable and where full runs (and seeds) are best spent.
+
+    With a calibration report, every point is also matched with the nearest
+    calibrated point (in the screened parameters, scaled by their ranges in
+    the grid). A point whose nearest calibrated point disagrees lies outside
+    the calibrated agreement region and is flagged as well.
+
+    Parameters:
+    base_params (dict): Model keyword arguments held fixed.
+    grid (dict): Maps parameter names to the list of values screened.
+    ticks (int, optional): The length of every mean-field run. Defaults to 1000.
+    metric (str, optional): The summary metric compared (see rebellion.metrics). Defaults to 'mean_active'.
+    sensitivity (float, optional): The flagging threshold as a share of the metric's range. Defaults to 0.1.
+    rules (str or Rules, optional): The variant. Defaults to 'origin'.
+    calibration (list, optional): A report of calibrate at points of the same variant. Defaults to None.
+    **options: Passed on to MeanFieldModel (bins, tiles).
+
+    Returns:
+    list: Dicts with 'params', 'value', 'change' (largest difference to a neighbour), 'calibrated'
+        (whether the nearest calibrated point agrees; None without a calibration) and 'simulate'.
+    """
+    names = list(grid)
+    shape = tuple(len(grid[name]) for name in names)
+    values = np.zeros(shape)
+    for index in itertools.product(*(range(size) for size in shape)):
+        params = dict(base_params, **{name: grid[name][i] for name, i in zip(names, index)})
+        values[index] = summarize(MeanFieldModel(**params, rules=rules, **options).run(ticks))[metric]
+    change = np.zeros(shape)
+    for axis in range(len(shape)):
+        step = np.abs(np.diff(values, axis=axis))
+        before = [slice(None)] * len(shape)
+        after = [slice(None)] * len(shape)
+        before[axis] = slice(0, -1)
+        after[axis] = slice(1, None)
+        change[tuple(before)] = np.maximum(change[tuple(before)], step)
+        change[tuple(after)] = np.maximum(change[tuple(after)], step)
+    scale = values.max() - values.min()
+    if calibration:
+        spans = np.array([(max(grid[name]) - min(grid[name])) or 1.0 for name in names], dtype=float)
+        calibrated = np.array([[entry['params'].get(name, base_params.get(name, np.nan)) for name in names]
+                               for entry in calibration], dtype=float) / spans
+        agrees = np.array([entry['agrees'] for entry in calibration])
+    results = []
+    for index in itertools.product(*(range(size) for size in shape)):
+        point = [grid[name][i] for name, i in zip(names, index)]
+        inside = None
+        if calibration:
+            distances = np.nansum((calibrated - np.array(point, dtype=float) / spans) ** 2, axis=1)
+            inside = bool(agrees[np.argmin(distances)])
+        results.append({
+            'params': dict(base_params, **dict(zip(names, point))),
+            'value': float(values[index]),
+            'change': float(change[index]),
+            'calibrated': inside,
+            'simulate': bool(scale > 0 and change[index] > sensitivity * scale) or inside is False,
+        })
+    return results
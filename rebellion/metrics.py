@@ -0,0 +1,100 @@
+"""
+Summary measures of a run's `data` series ('quiet', 'jail', 'active' counts per tick).
+"""
+
+# Active count from which a tick is considered part of an outburst
+OUTBURST_THRESHOLD = 50
+
+
+def peak_active(data):
+    """
+    Returns the highest active count of a run.
+
+    Parameters:
+    data (dict): The model's recorded series.
+
+    Returns:
+    int: The peak number of active agents.
+    """
+    return max(data['active'], default=0)
+
+
+def time_to_first_outburst(data, threshold=OUTBURST_THRESHOLD):
+    """
+    Returns the first tick at which the active count reaches a threshold.
+
+    Runs without an outburst are censored at the run length, so the value
+    stays comparable across a sweep.
+
+    Parameters:
+    data (dict): The model's recorded series.
+    threshold (int, optional): The active count defining an outburst. Defaults to OUTBURST_THRESHOLD.
+
+    Returns:
+    int: The tick of the first outburst, or the number of ticks if there was none.
+    """
+    for tick, active in enumerate(data['active']):
+        if active >= threshold:
+            return tick
+    return len(data['active'])
+
+
+def outburst_count(data, threshold=OUTBURST_THRESHOLD):
+    """
+    Counts the separate outbursts (maximal runs of ticks at or above the threshold).
+
+    Parameters:
+    data (dict): The model's recorded series.
+    threshold (int, optional): The active count defining an outburst. Defaults to OUTBURST_THRESHOLD.
+
+    Returns:
+    int: The number of outbursts.
+    """
+    count = 0
+    inside = False
+    for active in data['active']:
+        if active >= threshold and not inside:
+            count += 1
+        inside = active >= threshold
+    return count
+
+
+def mean_active(data):
+    """
+    Returns the mean active count of a run.
+
+    Parameters:
+    data (dict): The model's recorded series.
+
+    Returns:
+    float: The mean number of active agents per tick.
+    """
+    active = data['active']
+    return sum(active) / len(active) if active else 0.0
+
+
+METRICS = {
+    'peak_active': peak_active,
+    'time_to_first_outburst': time_to_first_outburst,
+    'outburst_count': outburst_count,
+    'mean_active': mean_active,
+}
+
+
+def summarize(data, threshold=OUTBURST_THRESHOLD):
+    """
+    Computes every measure in METRICS for one run.
+
+    Parameters:
+    data (dict): The model's recorded series.
+    threshold (int, optional): The active count defining an outburst. Defaults to OUTBURST_THRESHOLD.
+
+    Returns:
+    dict: Maps each metric name to its value.
+    """
+    return {
+        'peak_active': peak_active(data),
+        'time_to_first_outburst': time_to_first_outburst(data, threshold),
+        'outburst_count': outburst_count(data, threshold),
+        'mean_active': mean_active(data),
+    }
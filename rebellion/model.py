@@ -0,0 +1,745 @@
+"""
+The Rebellion model from `scripts/replication/origin.py` as an importable module.
+
+Compared with the script, the model draws from its own `random.Random`
+instance (so a run is reproducible from `seed`) and accepts the neighbour
+hardship influence of `scripts/extension1/extension1.py` as an optional
+parameter (0 reproduces the original model).
+
+Active agents are additionally indexed by coarse tile (see `enforce`), so a
+cop in a quiet area finds out that there is nobody to arrest without
+scanning its whole vision disc. The index only changes how the candidates
+are found; runs are identical to the plain scan for the same seed.
+
+Jail terms are not counted down turtle by turtle. An arrest files the agent
+under the tick at which it will be released (`releases`, a calendar of
+buckets keyed by tick) and removes it from the list of free turtles, so a
+step only visits free turtles plus the releases that are due; `jail_term`
+stays positive for the whole stay and is reset to 0 on release.
+
+The arrest probability only depends on the (cops, active agents) counts in a
+vision disc, so it is read from `arrest_table` instead of being recomputed
+with math.exp for every agent and tick.
+
+Variants (permanent jail, legitimacy decay, cop removal, ...) are passed as
+`rules` (see `rebellion.rules`); the step function is assembled from them
+once at construction, so the default rules run exactly the loop above.
+
+Agents and cops may see different distances (`agent_vision`, `cop_vision`:
+a fixed radius or a {'low', 'high'} range drawn per turtle). There is still
+one neighborhood table, built for the largest radius with the offsets
+sorted by distance, so the disc of any smaller radius is a prefix of it:
+a turtle keeps the length of its prefix (`reach`, from `disc_size`) and
+scans `neighborhood[:reach]`. With the default (everyone sees `vision`) the
+table keeps the original scan order and runs are unchanged.
+
+Besides the agents in vision, an agent's hardship can be blended with that
+of its contacts in a social network (`network`, `network_influence`; see
+`rebellion.network`, which is only imported when a network is given).
+
+With `rng='counter'` the model draws its random numbers from
+`rebellion.counter`, keyed by (seed, tick, turtle, purpose) instead of
+taken in sequence from `random`, so `KernelModel` with the same seed and
+`rng='counter'` reproduces the run exactly.
+"""
+import functools
+import math
+import random
+from enum import Enum
+
+from . import counter
+from .rules import get_rules
+
+# Side length of the tiles used to index active agents
+TILE_SIZE = 8
+
+
+def vision_bounds(spec):
+    """
+    Returns the smallest and largest radius a vision spec can produce.
+
+    Parameters:
+    spec (int or dict): A fixed radius, or {'low': int, 'high': int} drawn uniformly per turtle.
+
+    Returns:
+    tuple: (low, high).
+    """
+    if isinstance(spec, dict):
+        low, high = int(spec['low']), int(spec['high'])
+    else:
+        low = high = int(spec)
+    if low < 0 or high < low:
+        raise ValueError(f"Invalid vision {spec!r}; expected a radius >= 0 or 0 <= low <= high")
+    return low, high
+
+
+def disc_offsets(radius, nested=False):
+    """
+    Lists the offsets within a radius of a cell.
+
+    Parameters:
+    radius (int): The vision radius.
+    nested (bool, optional): Sort the offsets by distance (stably), so the offsets within any
+        smaller radius are a prefix of the list. Defaults to False, the lexicographic
+        (dx, dy) order of the original model.
+
+    Returns:
+    list: (dx, dy) tuples.
+    """
+    offsets = [(dx, dy) for dx in range(-radius, radius + 1) for dy in range(-radius, radius + 1)
+               if dx ** 2 + dy ** 2 <= radius ** 2]
+    if nested:
+        offsets.sort(key=lambda offset: offset[0] ** 2 + offset[1] ** 2)
+    return offsets
+
+
+class EntityType(Enum):
+    """An enumeration to represent types of entities."""
+    AGENT = 'Agent'
+    COP = 'Cop'
+
+
+class Turtle:
+    """A class to represent a turtle entity in the simulation."""
+    def __init__(self, agent_id, type, vision, risk_aversion=None, hardship=None):
+        """
+        Initializes a Turtle object.
+
+        Parameters:
+        agent_id (int): The unique identifier of the turtle.
+        type (EntityType): The type of the turtle (Agent or Cop).
+        vision (int): The vision range of the turtle.
+        risk_aversion (float, optional): The risk aversion factor of the turtle. Defaults to None.
+        hardship (float, optional): The hardship factor of the turtle. Defaults to None.
+        """
+        self.agent_id = agent_id
+        self.type = type
+        self.vision = vision
+        self.risk_aversion = risk_aversion
+        self.hardship = hardship
+        self.adjusted_hardship = hardship
+        self.active = False
+        self.jail_term = 0
+        self.last_turn = -1  # The last tick in which the turtle took its turn
+        self.removed = False  # Removed from the model (extension2 cops); it keeps its place in entities
+        self.reach = None  # Length of the turtle's prefix of the neighborhood lists (set by the model)
+        self.position = (None, None)
+
+    def __repr__(self):
+        """Returns a string representation of the Turtle object."""
+        return f"{self.type}{self.agent_id}"
+
+
+class Model:
+    def __init__(self, agent_density, cop_density, vision, k, gov_legitimacy, max_jail_term,
+                 neighbor_influence_percentage=0, seed=None, rules=None, agent_vision=None, cop_vision=None,
+                 network=None, network_influence=0, rng=None):
+        """
+        Initializes a Model object.
+
+        Parameters:
+        agent_density (float): Percentage of cells initially holding an agent.
+        cop_density (float): Percentage of cells initially holding a cop.
+        vision (int): The vision range of every turtle (unless agent_vision/cop_vision say otherwise).
+        k (float): The arrest probability constant.
+        gov_legitimacy (float): The government legitimacy in [0, 1].
+        max_jail_term (int): The maximum number of ticks an arrested agent stays in jail.
+        neighbor_influence_percentage (float, optional): Weight of the neighbours' mean hardship
+            in an agent's grievance (extension1). Defaults to 0.
+        seed (int, optional): Seed of the model's random number generator. Defaults to None.
+        rules (str or Rules, optional): The variant, by name (see rebellion.rules.VARIANTS) or as
+            a Rules object. Defaults to 'origin'.
+        agent_vision (int or dict, optional): The agents' vision: a radius, or {'low': int, 'high': int}
+            for a radius drawn uniformly per agent. Defaults to vision.
+        cop_vision (int or dict, optional): The cops' vision, like agent_vision. Defaults to vision.
+        network (Network or dict, optional): The agents' social network, or its description for
+            rebellion.network.build_network (generated from seed). Defaults to None.
+        network_influence (float, optional): Weight of the contacts' mean hardship in an agent's
+            grievance. Defaults to 0.
+        rng (str, optional): None draws from the sequence of a random.Random(seed); 'counter' draws
+            the numbers of rebellion.counter keyed by seed (an int). Defaults to None.
+        """
+        if agent_density + cop_density > 100:
+            raise ValueError("The sum of agent_density and cop_density should not exceed 100%")
+        if network_influence and network is None:
+            raise ValueError("network_influence needs a network")
+        if rng not in (None, 'counter'):
+            raise ValueError(f"Unknown rng {rng!r}; expected None or 'counter'")
+        self.rules = get_rules(rules)
+        self.random = random.Random(seed)
+        self.rng = rng
+        # The key of the counter-based draws
+        self.stream = None if rng is None else (self.random.getrandbits(64) if seed is None else int(seed))
+        self.width = 40
+        self.height = 40
+        self.grid = [[None for _ in range(self.height)] for _ in range(self.width)]
+        self.vision = vision
+        self.agent_vision = vision if agent_vision is None else agent_vision
+        self.cop_vision = vision if cop_vision is None else cop_vision
+        # The radius of the shared neighborhood table; nested when turtles see different distances
+        self.radius = max(vision_bounds(self.agent_vision)[1], vision_bounds(self.cop_vision)[1])
+        self.nested_vision = (self.agent_vision, self.cop_vision) != (vision, vision)
+        self.k = k
+        self.gov_legitimacy = gov_legitimacy
+        self.max_jail_term = max_jail_term
+        self.neighbor_influence_percentage = neighbor_influence_percentage
+        self.network_influence = network_influence
+        self.entities = []  # Store all entities
+        self.free_entities = []  # Entities not in jail, in update order
+        self.releases = {}  # tick -> agents whose jail term ends after that tick
+        self.jail_count = 0
+        self.tick = 0
+        self.total_cells = self.width * self.height
+        self.neighborhoods = [[[] for _ in range(self.height)] for _ in range(self.width)]
+        self.compute_neighborhoods()
+        self.build_active_index()
+        self.build_arrest_table(len(self.neighborhoods[0][0]))
+        self.create_entities(int((agent_density / 100) * self.total_cells), int((cop_density / 100) * self.total_cells))
+        self.network = None
+        if network is not None:
+            from .network import build_network
+            self.agents = [entity for entity in self.entities if entity.type == EntityType.AGENT]
+            self.network = build_network(network, len(self.agents), seed)
+        self.free_entities = list(self.entities)
+        self.data = {'quiet': [], 'jail': [], 'active': []}
+        for name in self.rules.series:
+            self.data[name] = []
+        self._step = self.assemble_step()
+
+    def compute_neighborhoods(self):
+        """
+        Computes neighborhoods for all cells in the grid.
+        """
+        offsets = disc_offsets(self.radius, self.nested_vision)
+        # disc_size[r] is the length of the prefix holding the disc of radius r
+        self.disc_size = [sum(1 for dx, dy in offsets if dx ** 2 + dy ** 2 <= r ** 2)
+                          for r in range(self.radius + 1)]
+        for x in range(self.width):
+            for y in range(self.height):
+                # Apply periodic boundary conditions
+                self.neighborhoods[x][y] = [((x + dx) % self.width, (y + dy) % self.height) for dx, dy in offsets]
+
+    def build_active_index(self):
+        """
+        Prepares the tile index of cells whose occupant is an active agent.
+
+        Each tile keeps the set of its active cells, and every cell knows the
+        tiles its vision disc overlaps, so "any active agent in vision?" is a
+        check of a few sets. The index is only used when the vision disc does
+        not wrap onto itself (2 * radius < grid size); otherwise a neighborhood
+        lists some cells twice and enforce falls back to the full scan. The
+        tiles cover the largest disc; smaller ones filter by offset order.
+        """
+        self.use_active_index = 2 * self.radius < min(self.width, self.height)
+        tiles_x = -(-self.width // TILE_SIZE)
+        tiles_y = -(-self.height // TILE_SIZE)
+        self.active_tiles = [[set() for _ in range(tiles_y)] for _ in range(tiles_x)]
+        self.tile_of = [[self.active_tiles[x // TILE_SIZE][y // TILE_SIZE] for y in range(self.height)]
+                        for x in range(self.width)]
+        self.covering_tiles = [[None for _ in range(self.height)] for _ in range(self.width)]
+        for x in range(self.width):
+            columns = {((x + dx) % self.width) // TILE_SIZE for dx in range(-self.radius, self.radius + 1)}
+            for y in range(self.height):
+                rows = {((y + dy) % self.height) // TILE_SIZE for dy in range(-self.radius, self.radius + 1)}
+                self.covering_tiles[x][y] = [self.active_tiles[tx][ty] for tx in columns for ty in rows]
+        # Position of each offset in a neighborhood list, to restore the scan order of candidates
+        self.offset_order = {offset: order for order, offset in
+                             enumerate(disc_offsets(self.radius, self.nested_vision))}
+
+    def build_arrest_table(self, size):
+        """
+        Tabulates the arrest probability for every count of cops and active agents up to size.
+
+        arrest_table[cops][actives] holds exactly the value estimate_arrest_probability
+        used to compute with math.exp, for this model's k.
+
+        Parameters:
+        size (int): The largest count tabulated (a vision disc holds at most its cell count).
+        """
+        self.arrest_table = [[1 - math.exp(-self.k * math.floor(cops / (actives + 1)))
+                              for actives in range(size + 1)] for cops in range(size + 1)]
+
+    def set_cell(self, x, y, entity):
+        """
+        Puts an entity (or None) into a grid cell, keeping the active index in step.
+
+        Parameters:
+        x (int): The column of the cell.
+        y (int): The row of the cell.
+        entity (Turtle): The new occupant, or None to empty the cell.
+        """
+        previous = self.grid[x][y]
+        if previous is not None and previous.active:
+            self.tile_of[x][y].discard((x, y))
+        self.grid[x][y] = entity
+        if entity is not None and entity.active:
+            self.tile_of[x][y].add((x, y))
+
+    def set_active(self, agent, active):
+        """
+        Changes an agent's active flag, keeping the active index in step.
+
+        Parameters:
+        agent (Turtle): The agent.
+        active (bool): The new value of the flag.
+        """
+        if agent.active == active:
+            return
+        agent.active = active
+        x, y = agent.position
+        # An agent whose cell was taken over (e.g. while jailed) is not on the grid
+        if self.grid[x][y] is agent:
+            if active:
+                self.tile_of[x][y].add((x, y))
+            else:
+                self.tile_of[x][y].discard((x, y))
+
+    def compute_adjusted_hardship(self):
+        """
+        Blends every agent's hardship with the mean hardship of the agents in its vision.
+
+        With a network, the mean hardship of the agent's contacts outside jail
+        is blended in too, weighted by network_influence; an agent without
+        such contacts (or without agents in vision) uses its own hardship for
+        that term.
+        """
+        if self.network_influence:
+            self.compute_network_hardship()
+            return
+        for agent in self.entities:
+            if agent.type == EntityType.AGENT:
+                x, y = agent.position
+                total_hardship = 0
+                count = 0
+                for nx, ny in self.neighborhoods[x][y][:agent.reach]:
+                    neighbor = self.grid[nx][ny]
+                    if isinstance(neighbor, Turtle) and neighbor.type == EntityType.AGENT:
+                        total_hardship += neighbor.hardship
+                        count += 1
+                if count > 0:
+                    average_hardship = total_hardship / count
+                    agent.adjusted_hardship = (
+                            average_hardship * self.neighbor_influence_percentage +
+                            agent.hardship * (1 - self.neighbor_influence_percentage)
+                    )
+
+    def compute_network_hardship(self):
+        """
+        Computes the adjusted hardship with the network term (see compute_adjusted_hardship).
+        """
+        agents = self.agents
+        hardship = [agent.hardship for agent in agents]
+        free = [agent.jail_term == 0 for agent in agents]
+        contacts = self.network.mean(hardship, free).tolist()
+        spatial_weight = self.neighbor_influence_percentage
+        network_weight = self.network_influence
+        own_weight = 1 - spatial_weight - network_weight
+        for agent, network_hardship in zip(agents, contacts):
+            spatial_hardship = agent.hardship
+            if spatial_weight:
+                x, y = agent.position
+                total_hardship = 0
+                count = 0
+                for nx, ny in self.neighborhoods[x][y][:agent.reach]:
+                    neighbor = self.grid[nx][ny]
+                    if neighbor is not None and neighbor.type is EntityType.AGENT:
+                        total_hardship += neighbor.hardship
+                        count += 1
+                if count > 0:
+                    spatial_hardship = total_hardship / count
+            agent.adjusted_hardship = (spatial_hardship * spatial_weight + network_hardship * network_weight
+                                       + agent.hardship * own_weight)
+
+    def create_entities(self, num_agents, num_cops):
+        """
+        Creates agents and cops and places them randomly on the grid.
+
+        The attributes are drawn in bulk and the cells are the first entries of
+        one random permutation of the cell ids, so placement takes the same time
+        at any density (retrying occupied cells slows down as the grid fills).
+
+        Parameters:
+        num_agents (int): The number of agents to create.
+        num_cops (int): The number of cops to create.
+        """
+        if self.stream is None:
+            random_ = self.random.random
+            risk_aversion = [random_() for _ in range(num_agents)]
+            hardship = [random_() for _ in range(num_agents)]
+            cells = self.random.sample(range(self.total_cells), num_agents + num_cops)
+        else:
+            risk_aversion = [self.keyed_uniform(i, counter.RISK_AVERSION) for i in range(num_agents)]
+            hardship = [self.keyed_uniform(i, counter.HARDSHIP) for i in range(num_agents)]
+            keys = [counter.draw(self.stream, counter.INITIAL_TICK, cell, counter.PLACE)
+                    for cell in range(self.total_cells)]
+            cells = sorted(range(self.total_cells), key=lambda cell: (keys[cell], cell))[:num_agents + num_cops]
+        for i, cell in enumerate(cells):
+            if i < num_agents:
+                entity = Turtle(i, EntityType.AGENT, self.vision, risk_aversion[i], hardship[i])
+            else:
+                entity = Turtle(i, EntityType.COP, self.vision)
+            x, y = divmod(cell, self.height)
+            self.set_cell(x, y, entity)
+            entity.position = (x, y)
+            self.entities.append(entity)
+        self.assign_visions()
+
+    def assign_visions(self):
+        """
+        Sets every turtle's vision and reach, drawing the radii of ranged vision specs.
+
+        Fixed radii draw nothing, so the default model consumes no random numbers here.
+        """
+        for entity in self.entities:
+            spec = self.agent_vision if entity.type == EntityType.AGENT else self.cop_vision
+            low, high = vision_bounds(spec)
+            if low == high:
+                entity.vision = low
+            elif self.stream is None:
+                entity.vision = self.random.randint(low, high)
+            else:
+                entity.vision = low + int(self.keyed_uniform(entity.agent_id, counter.VISION) * (high - low + 1))
+            entity.reach = self.disc_size[entity.vision]
+
+    def keyed_uniform(self, key, purpose, tick=counter.INITIAL_TICK):
+        """
+        Returns the counter-based uniform of a key (rng='counter' only).
+
+        Parameters:
+        key (int): The turtle (or cell) id.
+        purpose (int): One of the purpose constants of rebellion.counter.
+        tick (int, optional): The tick of the draw. Defaults to counter.INITIAL_TICK.
+
+        Returns:
+        float: A float in [0, 1).
+        """
+        return counter.uniform(self.stream, tick, key, purpose)
+
+    def place_entity_randomly(self, entity):
+        """
+        Places an entity randomly on the grid.
+
+        Parameters:
+        entity (Turtle): The entity to be placed.
+        """
+        x, y = self.random.randint(0, self.width - 1), self.random.randint(0, self.height - 1)
+        while self.grid[x][y] is not None:
+            x, y = self.random.randint(0, self.width - 1), self.random.randint(0, self.height - 1)
+        self.set_cell(x, y, entity)
+        entity.position = (x, y)
+
+    def assemble_step(self):
+        """
+        Builds the step function from the model's rules.
+
+        The per-turtle rules are resolved here, once, and bound to local names
+        of the returned closure, so a step pays no lookup per turtle for them.
+
+        Returns:
+        callable: A function without arguments performing one step.
+        """
+        rules = self.rules
+        move = self.move_agent if rules.move is None else functools.partial(rules.move, self)
+        decide = self.determine_behavior if rules.decide is None else functools.partial(rules.decide, self)
+        enforce = self.enforce if rules.enforce is None else functools.partial(rules.enforce, self)
+        if self.stream is None:
+            choice = self.random.choice
+            self.choose = lambda items, turtle, purpose: choice(items)
+        else:
+            self.choose = lambda items, turtle, purpose: items[
+                int(self.keyed_uniform(turtle.agent_id, purpose, self.tick) * len(items))]
+        keyed = self.stream is not None
+        if rules.jail_term is None and self.stream is None:
+            self.draw_jail_term = lambda agent: self.random.randint(0, self.max_jail_term)
+        elif rules.jail_term is None:
+            self.draw_jail_term = lambda agent: int(
+                self.keyed_uniform(agent.agent_id, counter.JAIL, self.tick) * (self.max_jail_term + 1))
+        elif callable(rules.jail_term):
+            self.draw_jail_term = functools.partial(rules.jail_term, self)
+        else:
+            self.draw_jail_term = lambda agent, term=int(rules.jail_term): term
+        policies = rules.policies
+        agent_type = EntityType.AGENT
+        data = self.data
+
+        def step():
+            if self.neighbor_influence_percentage or self.network_influence:
+                self.compute_adjusted_hardship()
+            if keyed:
+                self.sort_by_keys()
+            else:
+                self.random.shuffle(self.free_entities)
+            quiet_count = active_count = 0
+            tick = self.tick
+
+            for entity in self.free_entities:
+                if entity.jail_term > 0:
+                    continue  # Arrested earlier in this step
+
+                entity.last_turn = tick
+                move(entity)
+                if entity.type is agent_type:
+                    decide(entity)
+                else:
+                    enforce(entity)
+            released = self.releases.pop(tick, [])
+            # Filter before resetting: an agent arrested this tick may already be released (a term of 1
+            # served in the arrest tick) and is still in free_entities
+            self.free_entities = [entity for entity in self.free_entities if entity.jail_term == 0] + released
+            for agent in released:
+                agent.jail_term = 0
+            self.jail_count -= len(released)
+            # After all entities have taken their actions, count the number of each agent type
+            for entity in self.free_entities:
+                if entity.type is agent_type:
+                    if entity.active:
+                        active_count += 1
+                    else:
+                        quiet_count += 1
+            data['quiet'].append(quiet_count)
+            data['jail'].append(self.jail_count)
+            data['active'].append(active_count)
+            for policy in policies:
+                policy(self)
+            self.tick += 1
+
+        return step
+
+    def sort_by_keys(self):
+        """
+        Puts the free turtles in the update order of the tick under rng='counter' (sorted by their keys).
+        """
+        stream, tick = self.stream, self.tick
+        self.free_entities.sort(key=lambda entity: (counter.draw(stream, tick, entity.agent_id, counter.SHUFFLE),
+                                                    entity.agent_id))
+
+    def __getstate__(self):
+        # The assembled closures refer to this instance; copies assemble their own
+        state = dict(self.__dict__)
+        del state['_step'], state['draw_jail_term'], state['choose']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._step = self.assemble_step()
+
+    def step(self):
+        """
+        Performs one step of the simulation.
+        """
+        self._step()
+
+    def run(self, ticks):
+        """
+        Runs the model for a number of steps.
+
+        Parameters:
+        ticks (int): The number of steps to perform.
+
+        Returns:
+        dict: The recorded 'quiet', 'jail' and 'active' counts per step.
+        """
+        for _ in range(ticks):
+            self.step()
+        return self.data
+
+    def set_parameter(self, name, value):
+        """
+        Changes a global parameter between steps (used by experiment schedules).
+
+        Parameters:
+        name (str): One of 'gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage' or
+            'network_influence'.
+        value (float): The new value.
+        """
+        if name not in ('gov_legitimacy', 'k', 'max_jail_term', 'neighbor_influence_percentage', 'network_influence'):
+            raise ValueError(f"Parameter {name!r} cannot be changed during a run")
+        if name == 'network_influence' and value and self.network is None:
+            raise ValueError("network_influence needs a network")
+        setattr(self, name, value)
+        if name == 'k':
+            self.build_arrest_table(len(self.arrest_table) - 1)
+
+    def move_agent(self, agent):
+        """
+        Moves an agent to a neighboring cell.
+
+        Parameters:
+        agent (Turtle): The agent to move.
+        """
+        if agent.jail_term > 0:
+            return  # Jailed agents do not move
+        x, y = agent.position
+        self.set_cell(x, y, None)  # Remove agent from current position
+        potential_positions = []
+        # Use precomputed neighborhood
+        neighborhood = self.neighborhoods[x][y][:agent.reach]
+        for nx, ny in neighborhood:
+            target = self.grid[nx][ny]
+            if target is None:
+                potential_positions.append((nx, ny))
+            elif isinstance(target, Turtle) and target.jail_term > 0:
+                # Include positions with only jailed agents
+                potential_positions.append((nx, ny))
+        if potential_positions:
+            new_position = self.choose(potential_positions, agent, counter.MOVE)
+            self.set_cell(new_position[0], new_position[1], agent)
+            agent.position = new_position
+
+    def determine_behavior(self, agent):
+        """
+        Determines the behavior of an agent based on its grievances and arrest probability.
+
+        Parameters:
+        agent (Turtle): The agent to determine behavior for.
+        """
+        x, y = agent.position
+        grid = self.grid
+        cops_count = 0
+        active_agents_count = 0
+        # Same count as estimate_arrest_probability, inlined: this runs for every agent every tick
+        for nx, ny in self.neighborhoods[x][y][:agent.reach]:
+            cell = grid[nx][ny]
+            if cell is not None:
+                if cell.type is EntityType.COP:
+                    cops_count += 1
+                elif cell.active:
+                    active_agents_count += 1
+        arrest_probability = self.arrest_table[cops_count][active_agents_count]
+        grievance = agent.adjusted_hardship * (1 - self.gov_legitimacy)
+        self.set_active(agent, grievance - (agent.risk_aversion * arrest_probability) > 0.1)
+
+    def estimate_arrest_probability(self, position, reach=None):
+        """
+        Estimates the arrest probability at a given position.
+
+        Parameters:
+        position (tuple): The position to estimate arrest probability for.
+        reach (int, optional): The length of the neighborhood prefix counted (see disc_size).
+            Defaults to the whole neighborhood.
+
+        Returns:
+        float: The estimated arrest probability.
+        """
+        x, y = position
+        cops_count = 0
+        active_agents_count = 0
+        neighborhood = self.neighborhoods[x][y][:reach]
+        for nx, ny in neighborhood:
+            cell = self.grid[nx][ny]
+            if isinstance(cell, Turtle):
+                if cell.type == EntityType.COP:
+                    cops_count += 1
+                elif cell.type == EntityType.AGENT and cell.active:
+                    active_agents_count += 1
+        return self.arrest_table[cops_count][active_agents_count]
+
+    def enforce(self, cop):
+        """
+        Enforces the law by arresting an active agent.
+
+        Parameters:
+        cop (Turtle): The cop to perform enforcement
+        """
+        x, y = cop.position
+        if self.use_active_index:
+            active_agents = self.active_agents_near(x, y, cop.reach)
+        else:
+            active_agents = []
+            # Collect all active agents in the neighborhood
+            for nx, ny in self.neighborhoods[x][y][:cop.reach]:
+                agent = self.grid[nx][ny]
+                if isinstance(agent, Turtle) and agent.active:
+                    active_agents.append((agent, nx, ny))
+        # Randomly select one active agent to arrest
+        if active_agents:
+            selected_agent, nx, ny = self.choose(active_agents, cop, counter.ARREST)
+            self.set_active(selected_agent, False)
+            self.jail(selected_agent, self.draw_jail_term(selected_agent))
+            # Move cop to the position of the arrested agent
+            self.set_cell(x, y, None)  # Remove cop from current position
+            self.set_cell(nx, ny, cop)  # Move cop to new position
+            cop.position = (nx, ny)
+
+    def count_cops(self):
+        """
+        Counts the cops still in the model.
+
+        Returns:
+        int: The number of cops.
+        """
+        return sum(1 for entity in self.free_entities if entity.type is EntityType.COP)
+
+    def remove_cop(self):
+        """
+        Removes the first cop of the current update order from the model.
+
+        Like KernelModel.remove_cop, the cop stays in `entities` at its index (marked `removed`) so
+        turtle ids keep indexing it, and its cell is only cleared if it still holds the cop.
+
+        Returns:
+        Turtle: The removed cop, or None if there is none left.
+        """
+        for index, entity in enumerate(self.free_entities):
+            if entity.type is EntityType.COP:
+                del self.free_entities[index]
+                entity.removed = True
+                x, y = entity.position
+                if self.grid[x][y] is entity:
+                    self.set_cell(x, y, None)
+                return entity
+        return None
+
+    def jail(self, agent, term):
+        """
+        Sends an agent to jail for a number of ticks by filing its release.
+
+        With per-tick countdowns an agent arrested before its own turn would
+        already serve the first tick of its term in the arrest step; the
+        release tick reproduces that, so the time spent in jail is unchanged.
+
+        Parameters:
+        agent (Turtle): The arrested agent.
+        term (int): The jail term in ticks; 0 leaves the agent free.
+        """
+        agent.jail_term = term
+        if term <= 0:
+            return
+        served_this_tick = agent.last_turn != self.tick
+        release = self.tick + term - (1 if served_this_tick else 0)
+        self.releases.setdefault(release, []).append(agent)
+        self.jail_count += 1
+
+    def active_agents_near(self, x, y, reach=None):
+        """
+        Lists the active agents in vision of a cell using the tile index.
+
+        Returns the same list, in the same order, as scanning the cell's
+        neighborhood, but touches only the tiles overlapping the vision disc
+        and returns immediately when they hold no active agent.
+
+        Parameters:
+        x (int): The column of the cell.
+        y (int): The row of the cell.
+        reach (int, optional): The length of the neighborhood prefix searched (see disc_size).
+            Defaults to the whole neighborhood.
+
+        Returns:
+        list: (agent, x, y) tuples in neighborhood order.
+        """
+        tiles = [tile for tile in self.covering_tiles[x][y] if tile]
+        if not tiles:
+            return []
+        if reach is None:
+            reach = len(self.offset_order)
+        half_width, half_height = self.width // 2, self.height // 2
+        found = []
+        for tile in tiles:
+            for nx, ny in tile:
+                dx = (nx - x + half_width) % self.width - half_width
+                dy = (ny - y + half_height) % self.height - half_height
+                order = self.offset_order.get((dx, dy))
+                if order is not None and order < reach:
+                    found.append((order, self.grid[nx][ny], nx, ny))
+        found.sort(key=lambda item: item[0])
+        return [(agent, nx, ny) for _, agent, nx, ny in found]
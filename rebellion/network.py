@@ -0,0 +1,254 @@
+"""
+Social networks for the neighbour hardship influence.
+
+`scripts/extension1/extension1.py` blends an agent's hardship with the mean
+hardship of the agents in its vision, so influence is purely spatial. Here
+the agents can also have contacts: a graph over the agent ids, stored as
+CSR arrays (`indptr`, `indices`, `weights`), either generated (a
+Watts-Strogatz small world or a Barabasi-Albert scale-free graph) or read
+from an edge list. The mean hardship of every agent's contacts is one
+sparse matrix-vector product, vectorised over all edges with
+`np.bincount`, so it stays cheap for tens of thousands of agents and
+millions of edges.
+
+Contacts in jail are out of touch: `Network.mean` takes a mask of the
+agents that count, so the network term changes as agents are arrested and
+released. The model blends both terms (see `Model.compute_adjusted_hardship`):
+
+    adjusted = spatial * neighbor_influence_percentage + network * network_influence
+               + hardship * (1 - neighbor_influence_percentage - network_influence)
+
+Example:
+    model = Model(70, 4, 7, 2.3, 0.82, 30, seed=1, network_influence=0.5,
+                  network={'kind': 'small_world', 'degree': 6, 'rewire': 0.1})
+"""
+import numpy as np
+
+KINDS = ('small_world', 'scale_free', 'edges')
+
+
+class Network:
+    """A graph over agent ids in compressed sparse row form."""
+    def __init__(self, indptr, indices, weights=None):
+        """
+        Initializes a Network object.
+
+        Parameters:
+        indptr (array): Row pointers; the contacts of node i are indices[indptr[i]:indptr[i + 1]].
+        indices (array): The contact of every edge.
+        weights (array, optional): The weight of every edge. Defaults to 1 for every edge.
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = (np.ones(len(self.indices)) if weights is None
+                        else np.asarray(weights, dtype=np.float64))
+        if len(self.weights) != len(self.indices) or self.indptr[-1] != len(self.indices):
+            raise ValueError("indptr, indices and weights do not describe the same edges")
+        # The row of every edge, for the bincount matrix-vector products
+        self.rows = np.repeat(np.arange(self.num_nodes, dtype=np.int32), np.diff(self.indptr))
+
+    def __repr__(self):
+        return f"Network({self.num_nodes} nodes, {self.num_edges} edges)"
+
+    @property
+    def num_nodes(self):
+        """int: The number of nodes."""
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self):
+        """int: The number of stored (directed) edges; an undirected edge counts twice."""
+        return len(self.indices)
+
+    @classmethod
+    def from_edges(cls, edges, num_nodes, weights=None, directed=False):
+        """
+        Builds a network from an edge list, dropping self-loops and repeated edges.
+
+        Parameters:
+        edges (array): Shape (edges, 2) of (source, target) node ids.
+        num_nodes (int): The number of nodes; ids must be below it.
+        weights (array, optional): The weight of every edge. Defaults to 1.
+        directed (bool, optional): Only store source -> target; otherwise both directions. Defaults to False.
+
+        Returns:
+        Network: The network.
+        """
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        weights = np.ones(len(edges)) if weights is None else np.asarray(weights, dtype=np.float64)
+        if len(edges) and (edges.min() < 0 or edges.max() >= num_nodes):
+            raise ValueError(f"Edge list refers to nodes outside 0..{num_nodes - 1}")
+        source, target = edges[:, 0], edges[:, 1]
+        if not directed:
+            source, target = np.concatenate([source, target]), np.concatenate([target, source])
+            weights = np.concatenate([weights, weights])
+        keep = source != target
+        keys, first = np.unique(source[keep] * num_nodes + target[keep], return_index=True)
+        source, target = np.divmod(keys, num_nodes)
+        indptr = np.zeros(num_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(source, minlength=num_nodes), out=indptr[1:])
+        return cls(indptr, target, weights[keep][first])
+
+    def contacts(self, node):
+        """
+        Lists the contacts of a node.
+
+        Parameters:
+        node (int): The node id.
+
+        Returns:
+        array: The contact ids.
+        """
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def degree(self):
+        """
+        Returns the number of contacts of every node.
+
+        Returns:
+        array: Shape (nodes,).
+        """
+        return np.diff(self.indptr)
+
+    def mean(self, values, present=None, default=None):
+        """
+        Computes the weighted mean of `values` over every node's contacts (a sparse matrix-vector product).
+
+        Parameters:
+        values (array): One value per node.
+        present (array, optional): Boolean mask of the nodes that count as contacts. Defaults to all.
+        default (array, optional): The result for nodes without a counted contact. Defaults to `values`.
+
+        Returns:
+        array: Shape (nodes,).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        weights = self.weights if present is None else self.weights * np.asarray(present)[self.indices]
+        totals = np.bincount(self.rows, weights=weights, minlength=self.num_nodes)
+        sums = np.bincount(self.rows, weights=weights * values[self.indices], minlength=self.num_nodes)
+        default = values if default is None else default
+        return np.where(totals > 0, sums / np.where(totals > 0, totals, 1), default)
+
+
+def small_world(num_nodes, degree=4, rewire=0.1, seed=None):
+    """
+    Generates a Watts-Strogatz small-world network.
+
+    Every node is linked to its `degree` nearest nodes on a ring, then each
+    link is rewired to a uniformly random node with probability `rewire`.
+
+    Parameters:
+    num_nodes (int): The number of nodes.
+    degree (int, optional): The (even) ring degree before rewiring. Defaults to 4.
+    rewire (float, optional): The rewiring probability. Defaults to 0.1.
+    seed (int, optional): Seed of the generator. Defaults to None.
+
+    Returns:
+    Network: The network.
+    """
+    if degree % 2 or not 0 < degree < num_nodes:
+        raise ValueError(f"degree must be even and between 2 and {num_nodes - 1}, got {degree}")
+    if not 0 <= rewire <= 1:
+        raise ValueError(f"rewire must be a probability, got {rewire}")
+    rng = np.random.default_rng(seed)
+    half = degree // 2
+    source = np.repeat(np.arange(num_nodes), half)
+    target = (source + np.tile(np.arange(1, half + 1), num_nodes)) % num_nodes
+    rewired = rng.random(len(source)) < rewire
+    target[rewired] = rng.integers(0, num_nodes, int(rewired.sum()))
+    return Network.from_edges(np.stack([source, target], axis=1), num_nodes)
+
+
+def scale_free(num_nodes, links=2, seed=None):
+    """
+    Generates a Barabasi-Albert scale-free network by preferential attachment.
+
+    Nodes arrive one at a time and link to `links` distinct earlier nodes,
+    chosen with probability proportional to their degree (by sampling the
+    endpoint list of the edges so far).
+
+    Parameters:
+    num_nodes (int): The number of nodes.
+    links (int, optional): Links of every arriving node. Defaults to 2.
+    seed (int, optional): Seed of the generator. Defaults to None.
+
+    Returns:
+    Network: The network.
+    """
+    if not 0 < links < num_nodes:
+        raise ValueError(f"links must be between 1 and {num_nodes - 1}, got {links}")
+    rng = np.random.default_rng(seed)
+    edges = np.empty(((num_nodes - links) * links, 2), dtype=np.int64)
+    ends = np.empty(2 * len(edges), dtype=np.int64)
+    chosen = list(range(links))  # The first arrival links to all initial nodes
+    for i, node in enumerate(range(links, num_nodes)):
+        if node > links:
+            count = 2 * i * links
+            chosen = []
+            while len(chosen) < links:
+                for candidate in ends[rng.integers(0, count, 2 * links)]:
+                    if candidate not in chosen:
+                        chosen.append(candidate)
+                        if len(chosen) == links:
+                            break
+        rows = slice(i * links, (i + 1) * links)
+        edges[rows, 0] = node
+        edges[rows, 1] = chosen
+        ends[2 * i * links:2 * (i + 1) * links] = edges[rows].ravel()
+    return Network.from_edges(edges, num_nodes)
+
+
+def read_edge_list(path, num_nodes=None, directed=False):
+    """
+    Reads an edge list: one 'source target [weight]' line per edge, '#' comments, comma or blank separated.
+
+    Parameters:
+    path (str): The file.
+    num_nodes (int, optional): The number of nodes. Defaults to the largest id plus one.
+    directed (bool, optional): See Network.from_edges. Defaults to False.
+
+    Returns:
+    Network: The network.
+    """
+    delimiter = ',' if str(path).endswith('.csv') else None
+    table = np.loadtxt(path, comments='#', delimiter=delimiter, ndmin=2)
+    if table.size and table.shape[1] not in (2, 3):
+        raise ValueError(f"{path}: expected 2 or 3 columns, got {table.shape[1]}")
+    edges = table[:, :2].astype(np.int64) if table.size else np.empty((0, 2), dtype=np.int64)
+    if num_nodes is None:
+        num_nodes = int(edges.max()) + 1 if len(edges) else 0
+    weights = table[:, 2] if table.size and table.shape[1] == 3 else None
+    return Network.from_edges(edges, num_nodes, weights, directed)
+
+
+def build_network(spec, num_nodes, seed=None):
+    """
+    Builds the network described by a model parameter.
+
+    Parameters:
+    spec (Network or dict): A network, or a dict with 'kind' in KINDS and the keyword arguments of
+        small_world ('degree', 'rewire'), scale_free ('links') or read_edge_list ('path', 'directed');
+        a 'seed' entry overrides the seed.
+    num_nodes (int): The number of agents.
+    seed (int, optional): Seed of generated networks. Defaults to None.
+
+    Returns:
+    Network: The network, with num_nodes nodes.
+    """
+    if isinstance(spec, Network):
+        network = spec
+    else:
+        options = dict(spec)
+        kind = options.pop('kind', None)
+        seed = options.pop('seed', seed)
+        if kind == 'small_world':
+            network = small_world(num_nodes, seed=seed, **options)
+        elif kind == 'scale_free':
+            network = scale_free(num_nodes, seed=seed, **options)
+        elif kind == 'edges':
+            network = read_edge_list(options.pop('path'), num_nodes, **options)
+        else:
+            raise ValueError(f"Unknown network kind {kind!r}; expected one of {', '.join(KINDS)}")
+    if network.num_nodes != num_nodes:
+        raise ValueError(f"The network has {network.num_nodes} nodes but the model has {num_nodes} agents")
+    return network
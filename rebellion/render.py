@@ -0,0 +1,434 @@
+"""
+Headless rendering of runs straight from NumPy arrays.
+
+The model scripts draw every run with matplotlib, which costs a heavy import
+and a figure per run even when only the CSVs are wanted. This module draws
+grid snapshots and time-series charts into RGB arrays itself and encodes
+them as PNG (zlib) or animated GIF (LZW) without any plotting library; MP4
+is written by piping the frames to `ffmpeg` when it is installed. Only NumPy
+is needed, so simulation-only runs pay for nothing, and batches of runs are
+rendered on a process pool.
+
+Colors follow the NetLogo model: grey patches, green quiet agents, red
+active agents, dark grey jailed agents and cyan cops.
+
+Example:
+    write_png('tick100.png', grid_image(trace.status_grid(trace.frame(100))))
+    write_png('run.png', chart_image(model.data))
+    render_traces(glob.glob('traces/*.trace'), 'movies', format='gif', workers=8)
+"""
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .trace import TraceReader
+
+# Palette indexed by trace status code + 1 (EMPTY, QUIET, ACTIVE, JAILED, COP); padded to 8 for GIF
+PALETTE = np.array([
+    (115, 115, 115),  # empty patch (gray - 1)
+    (89, 176, 60),  # quiet agent (green)
+    (215, 50, 41),  # active agent (red)
+    (60, 60, 60),  # jailed agent (black + 3)
+    (84, 196, 196),  # cop (cyan)
+    (255, 255, 255),
+    (0, 0, 0),
+    (0, 0, 0),
+], dtype=np.uint8)
+# Line colors of the series of Model.data, as in the NetLogo plot
+SERIES_COLORS = {'quiet': (89, 176, 60), 'jail': (0, 0, 0), 'active': (215, 50, 41)}
+DEFAULT_COLORS = [(31, 119, 180), (255, 127, 14), (44, 160, 44), (148, 103, 189), (140, 86, 75)]
+FORMATS = ('png', 'gif', 'mp4')
+
+# 3x5 digit glyphs for the axis labels, one string of rows per character
+_GLYPHS = {
+    '0': '111101101101111', '1': '010110010010111', '2': '111001111100111', '3': '111001111001111',
+    '4': '101101111001001', '5': '111100111001111', '6': '111100111101111', '7': '111001010010010',
+    '8': '111101111101111', '9': '111101111001111', '.': '000000000000010', '-': '000000111000000',
+}
+
+
+def grid_indices(codes, scale=8):
+    """
+    Turns a status grid into palette indices of an image.
+
+    Parameters:
+    codes (array): Status codes of shape (width, height), as returned by TraceReader.status_grid.
+    scale (int, optional): Pixels per cell. Defaults to 8.
+
+    Returns:
+    array: uint8 palette indices of shape (height * scale, width * scale), y pointing up.
+    """
+    indices = (np.asarray(codes) + 1).astype(np.uint8).T[::-1]
+    return np.repeat(np.repeat(indices, scale, axis=0), scale, axis=1)
+
+
+def grid_image(codes, scale=8):
+    """
+    Draws a status grid.
+
+    Parameters:
+    codes (array): Status codes of shape (width, height).
+    scale (int, optional): Pixels per cell. Defaults to 8.
+
+    Returns:
+    array: uint8 RGB image of shape (height * scale, width * scale, 3).
+    """
+    return PALETTE[grid_indices(codes, scale)]
+
+
+def _text(image, text, x, y, color, size=2):
+    for character in text:
+        glyph = _GLYPHS.get(character)
+        if glyph is not None:
+            mask = np.array([int(bit) for bit in glyph], dtype=bool).reshape(5, 3)
+            mask = np.repeat(np.repeat(mask, size, axis=0), size, axis=1)
+            region = image[y:y + mask.shape[0], x:x + mask.shape[1]]
+            region[mask[:region.shape[0], :region.shape[1]]] = color
+        x += 4 * size
+
+
+def _label(value):
+    return f'{value:.0f}' if float(value).is_integer() or abs(value) >= 100 else f'{value:.2g}'
+
+
+def _line(image, xs, ys, color, thickness):
+    # Sample every segment densely enough to leave no gaps, then stamp the points
+    steps = np.maximum(np.abs(np.diff(xs)), np.abs(np.diff(ys))).astype(int) + 1
+    fractions = np.concatenate([np.arange(n) / n for n in steps])
+    starts = np.repeat(np.arange(len(steps)), steps)
+    px = np.rint(xs[starts] + fractions * (xs[starts + 1] - xs[starts])).astype(int)
+    py = np.rint(ys[starts] + fractions * (ys[starts + 1] - ys[starts])).astype(int)
+    height, width = image.shape[:2]
+    for dx in range(thickness):
+        for dy in range(thickness):
+            image[np.clip(py + dy - thickness // 2, 0, height - 1), np.clip(px + dx - thickness // 2, 0, width - 1)] \
+                = color
+
+
+def chart_image(series, width=640, height=360, colors=None, ymin=None, ymax=None, thickness=2, bands=None):
+    """
+    Draws a line chart of one or more series against their index (the tick).
+
+    Parameters:
+    series (dict): Maps each name to a sequence of values, e.g. Model.data.
+    width (int, optional): The image width in pixels. Defaults to 640.
+    height (int, optional): The image height in pixels. Defaults to 360.
+    colors (dict, optional): Maps names to RGB tuples. Defaults to the NetLogo plot colors.
+    ymin (float, optional): The bottom of the y axis. Defaults to min(0, smallest value).
+    ymax (float, optional): The top of the y axis. Defaults to the largest value.
+    thickness (int, optional): The line width in pixels. Defaults to 2.
+    bands (dict, optional): Maps names to (low, high) sequences, shaded in a light tint of the
+        series color under the lines (e.g. rebellion.ensemble.Ensemble.band). Defaults to none.
+
+    Returns:
+    array: uint8 RGB image of shape (height, width, 3).
+    """
+    arrays = {name: np.asarray(values, dtype=float) for name, values in series.items()}
+    bands = {name: (np.asarray(low, dtype=float), np.asarray(high, dtype=float))
+             for name, (low, high) in (bands or {}).items()}
+    image = np.full((height, width, 3), 255, dtype=np.uint8)
+    left, right, top, bottom = 48, width - 12, 12, height - 24
+    length = max((len(values) for values in arrays.values()), default=0)
+    finite = [values[np.isfinite(values)] for values in list(arrays.values()) + [v for band in bands.values()
+                                                                                 for v in band]]
+    low = ymin if ymin is not None else min([0.0] + [values.min() for values in finite if len(values)])
+    high = ymax if ymax is not None else max([1.0] + [values.max() for values in finite if len(values)])
+    if high <= low:
+        high = low + 1
+    # Grid lines at quarters of both axes, then the frame and the axis labels
+    for fraction in (0.25, 0.5, 0.75):
+        image[int(round(bottom - fraction * (bottom - top))), left:right] = 225
+        image[top:bottom, int(round(left + fraction * (right - left)))] = 225
+    image[top:bottom + 1, [left, right]] = 0
+    image[[top, bottom], left:right + 1] = 0
+    _text(image, _label(high), 4, top, 0)
+    _text(image, _label(low), 4, bottom - 10, 0)
+    _text(image, '0', left, bottom + 6, 0)
+    last = _label(max(length - 1, 0))
+    _text(image, last, right - 8 * len(last), bottom + 6, 0)
+    colors = dict(colors or {})
+    palette = {name: colors.get(name) or SERIES_COLORS.get(name) or DEFAULT_COLORS[number % len(DEFAULT_COLORS)]
+               for number, name in enumerate(arrays)}
+    columns = np.arange(left + 1, right)
+    for name, (low_values, high_values) in bands.items():
+        # Interpolate the band at every pixel column and blend the color 80% towards white
+        ticks = (columns - left) * max(len(low_values) - 1, 1) / (right - left)
+        positions = np.arange(len(low_values))
+        tops = np.interp(ticks, positions, np.clip(high_values, low, high))
+        bottoms = np.interp(ticks, positions, np.clip(low_values, low, high))
+        rows = np.arange(height)[:, None]
+        mask = ((rows >= bottom - (tops - low) * (bottom - top) / (high - low))
+                & (rows <= bottom - (bottoms - low) * (bottom - top) / (high - low)))
+        tint = 255 - 0.2 * (255 - np.array(palette.get(name, DEFAULT_COLORS[0]), dtype=float))
+        region = image[:, left + 1:right]
+        region[mask] = np.minimum(region[mask], tint.astype(np.uint8))
+    for name, values in arrays.items():
+        color = palette[name]
+        keep = np.isfinite(values)
+        if keep.sum() < 2:
+            continue
+        xs = left + np.flatnonzero(keep) * (right - left) / max(length - 1, 1)
+        ys = bottom - (np.clip(values[keep], low, high) - low) * (bottom - top) / (high - low)
+        _line(image, xs, ys, np.array(color, dtype=np.uint8), thickness)
+    return image
+
+
+def encode_png(image):
+    """
+    Encodes an RGB (or greyscale) image as PNG.
+
+    Parameters:
+    image (array): uint8 array of shape (height, width, 3) or (height, width).
+
+    Returns:
+    bytes: The PNG file.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    color_type = 2 if image.ndim == 3 else 0
+    # Filter type 0 (none) in front of every row
+    rows = np.concatenate([np.zeros((height, 1), np.uint8), image.reshape(height, -1)], axis=1)
+
+    def chunk(kind, payload):
+        return (struct.pack('>I', len(payload)) + kind + payload
+                + struct.pack('>I', zlib.crc32(kind + payload) & 0xFFFFFFFF))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(rows.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def write_png(path, image):
+    """
+    Writes an image as a PNG file.
+
+    Parameters:
+    path (str): The output file.
+    image (array): uint8 array of shape (height, width, 3) or (height, width).
+    """
+    with open(path, 'wb') as f:
+        f.write(encode_png(image))
+
+
+def _lzw(indices, min_code_size):
+    clear = 1 << min_code_size
+    end = clear + 1
+    table = {}
+    next_code = end + 1
+    code_size = min_code_size + 1
+    output = bytearray()
+    buffer = bits = 0
+
+    def emit(code):
+        nonlocal buffer, bits
+        buffer |= code << bits
+        bits += code_size
+        while bits >= 8:
+            output.append(buffer & 0xFF)
+            buffer >>= 8
+            bits -= 8
+
+    emit(clear)
+    data = indices.tobytes()
+    current = data[0]
+    for pixel in data[1:]:
+        key = current << 8 | pixel
+        code = table.get(key)
+        if code is not None:
+            current = code
+            continue
+        emit(current)
+        if next_code == 4096:
+            emit(clear)
+            table.clear()
+            next_code = end + 1
+            code_size = min_code_size + 1
+        else:
+            table[key] = next_code
+            if next_code == 1 << code_size:
+                code_size += 1
+            next_code += 1
+        current = pixel
+    emit(current)
+    emit(end)
+    if bits:
+        output.append(buffer & 0xFF)
+    return bytes(output)
+
+
+def encode_gif(frames, delay=10, loop=True):
+    """
+    Encodes palette-index frames (see grid_indices) as an animated GIF with PALETTE.
+
+    Parameters:
+    frames (iterable): uint8 arrays of shape (height, width) with values below len(PALETTE).
+    delay (int, optional): Hundredths of a second per frame. Defaults to 10.
+    loop (bool, optional): Repeat the animation forever. Defaults to True.
+
+    Returns:
+    bytes: The GIF file.
+    """
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape
+    depth = int(np.log2(len(PALETTE)))
+    parts = [b'GIF89a', struct.pack('<HHBBB', width, height, 0x80 | (depth - 1) << 4 | (depth - 1), 0, 0),
+             PALETTE.tobytes()]
+    if loop:
+        parts.append(b'\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')
+    for frame in _chain(first, frames):
+        data = _lzw(np.ascontiguousarray(frame, dtype=np.uint8), max(depth, 2))
+        parts.append(struct.pack('<BBBBHBB', 0x21, 0xF9, 4, 0, delay, 0, 0))
+        parts.append(b'\x2c' + struct.pack('<HHHHB', 0, 0, width, height, 0) + bytes([max(depth, 2)]))
+        parts.extend(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255))
+        parts.append(b'\x00')
+    parts.append(b'\x3b')
+    return b''.join(parts)
+
+
+def _chain(first, rest):
+    yield first
+    yield from rest
+
+
+def write_gif(path, frames, delay=10, loop=True):
+    """
+    Writes palette-index frames as an animated GIF file.
+
+    Parameters:
+    path (str): The output file.
+    frames (iterable): uint8 arrays of shape (height, width), see grid_indices.
+    delay (int, optional): Hundredths of a second per frame. Defaults to 10.
+    loop (bool, optional): Repeat the animation forever. Defaults to True.
+    """
+    with open(path, 'wb') as f:
+        f.write(encode_gif(frames, delay, loop))
+
+
+def write_mp4(path, frames, fps=10):
+    """
+    Writes RGB frames as an H.264 MP4 file through ffmpeg.
+
+    Parameters:
+    path (str): The output file.
+    frames (iterable): uint8 arrays of shape (height, width, 3), all the same size (even sides).
+    fps (int, optional): Frames per second. Defaults to 10.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError("Writing MP4 needs ffmpeg on the PATH; use format='gif' or 'png' instead")
+    frames = iter(frames)
+    first = next(frames)
+    height, width = first.shape[:2]
+    command = [ffmpeg, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}',
+               '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', '-vcodec', 'libx264', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for frame in _chain(first, frames):
+            process.stdin.write(np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+    finally:
+        process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed with exit status {process.returncode}")
+
+
+def render_trace(path, output, format='gif', start=None, stop=None, step=1, scale=None, fps=10):
+    """
+    Renders the frames of a trace as an animation or a directory of PNG files.
+
+    Parameters:
+    path (str): The trace file.
+    output (str): The output file ('gif', 'mp4') or directory ('png', one file per tick).
+    format (str, optional): 'gif', 'png' or 'mp4'. Defaults to 'gif'.
+    start (int, optional): The first tick. Defaults to the first recorded tick.
+    stop (int, optional): The tick to stop before. Defaults to the end.
+    step (int, optional): Render every step-th frame. Defaults to 1.
+    scale (int, optional): Pixels per cell. Defaults to 4 for GIF and 8 otherwise.
+    fps (int, optional): Frames per second of animations. Defaults to 10.
+
+    Returns:
+    str: The output path.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format!r}; expected one of {', '.join(FORMATS)}")
+    scale = scale or (4 if format == 'gif' else 8)
+    with TraceReader(path) as trace:
+        frames = ((tick, grid_indices(trace.status_grid(frame), scale))
+                  for tick, frame in trace.frames(start, stop, step))
+        if format == 'gif':
+            write_gif(output, (indices for _, indices in frames), delay=max(1, round(100 / fps)))
+        elif format == 'mp4':
+            write_mp4(output, (PALETTE[indices] for _, indices in frames), fps)
+        else:
+            os.makedirs(output, exist_ok=True)
+            for tick, indices in frames:
+                write_png(os.path.join(output, f'tick{tick:05d}.png'), PALETTE[indices])
+    return output
+
+
+def render_chart(data, path, **options):
+    """
+    Writes the chart of a run's series as a PNG file.
+
+    Parameters:
+    data (dict): Maps series names to per-tick values (e.g. Model.data).
+    path (str): The output file.
+    **options: Passed to chart_image.
+
+    Returns:
+    str: The output path.
+    """
+    write_png(path, chart_image(data, **options))
+    return path
+
+
+def _map(function, argument_lists, workers):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(argument_lists) <= 1:
+        return [function(*arguments) for arguments in argument_lists]
+    with ProcessPoolExecutor(max_workers=min(workers, len(argument_lists))) as pool:
+        futures = [pool.submit(function, *arguments) for arguments in argument_lists]
+        return [future.result() for future in futures]
+
+
+def render_traces(paths, directory, format='gif', workers=None, **options):
+    """
+    Renders many traces in parallel, one output per trace named after it.
+
+    Parameters:
+    paths (list): The trace files.
+    directory (str): Where the outputs are written; created if missing.
+    format (str, optional): 'gif', 'png' or 'mp4'. Defaults to 'gif'.
+    workers (int, optional): The number of worker processes. Defaults to os.cpu_count().
+    **options: Passed to render_trace (start, stop, step, scale, fps).
+
+    Returns:
+    list: The output paths.
+    """
+    os.makedirs(directory, exist_ok=True)
+    jobs = []
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        output = os.path.join(directory, name if format == 'png' else f'{name}.{format}')
+        jobs.append((path, output, format, options.get('start'), options.get('stop'), options.get('step', 1),
+                     options.get('scale'), options.get('fps', 10)))
+    return _map(render_trace, jobs, workers)
+
+
+def render_charts(runs, workers=None):
+    """
+    Writes the charts of many runs in parallel.
+
+    Parameters:
+    runs (list): (data dict, output path) pairs.
+    workers (int, optional): The number of worker processes. Defaults to os.cpu_count().
+
+    Returns:
+    list: The output paths.
+    """
+    return _map(render_chart, [(data, path) for data, path in runs], workers)
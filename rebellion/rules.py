@@ -0,0 +1,237 @@
+"""
+Model variants as configurations of one engine.
+
+The scripts and notebooks each carry a copy of `Turtle`/`Model` differing in
+a single rule. Here a variant is a `Rules` object instead: the per-turtle
+rules (movement, decision, arrest, jail term) and the policies applied after
+every step. `Model` assembles its step function from the rules once, at
+construction, so a variant costs no lookups per turtle; `KernelModel`
+supports every variant whose rules are data rather than Python callables
+(a fixed jail term and the built-in policies).
+
+The variants of the report:
+
+- `origin`: `scripts/replication/origin.py`.
+- `extension1`: the same rules; the neighbour hardship influence is the
+  `neighbor_influence_percentage` model parameter.
+- `rep1`: permanent jail (term 1000) and legitimacy dropping to 0.5 after
+  tick 80 (`scripts/replication/rep1.py`).
+- `rep2`: permanent jail and legitimacy decaying by 0.0045 per tick
+  (`scripts/replication/rep2.py`).
+- `extension2`: permanent jail and one cop removed per tick, with the cop
+  count recorded as the 'cop' series (`scripts/extension2/extension2.py`; the
+  script additionally prepends the initial counts to its other series).
+
+And of the experiments kept in `rep/` and `extension2/`:
+
+- `rep`: permanent jail alone (`rep/model_v4_rep.py`,
+  `rep/model_v4_rep_export.py`).
+- `extension3`: max_jail_term raised to 50 after tick 100
+  (`extension2/model_extension3.py`).
+- `extension3_origin`: max_jail_term lowered by 1 per tick down to 10
+  (`extension2/model_extension3_origin.py`).
+- `stay_active`: an agent that would turn active where it stands does not
+  move (`extension2/model_extension2.py`); Python rules, so `Model` only.
+
+The other copies are the same model as a variant: `rep/model_v4_rep2*.py`
+are `rep2`, `rep/model_v4_rep1*.py` are `rep1` with the legitimacy dropping
+to 0.65 (`Rules('rep1', jail_term=PERMANENT_JAIL_TERM,
+policies=[legitimacy_drop(80, 0.65)])`), `extension2/model_extension4.py` is
+`extension2`, `extension2/model_orgin.py` and `src/model_v4_lc_new.py` are
+`origin` and `src/model_v4_lc_extension*.py` are `extension1` (they differ
+only in the series they prepend, plot or export). These copies are
+deprecated; their headers name the variant to use instead.
+
+Out of scope are the development versions in `src/` (`model_v1*` to
+`model_v3*`, `model_v4.1`/`v4.2`, `model_v4.5` to `model_v5.5` and
+`model_extension_lwz.py`). They predate the replication and differ from it
+in the engine rather than in a rule (update order, neighbourhoods, placement,
+what the arrest estimate counts), which a `Rules` object does not vary;
+compare them with `python -m rebellion divergence` instead.
+
+Example:
+    model = Model(70, 7.4, 7, 2.3, 0.9, 30, seed=1, rules='rep2')
+    custom = Rules('strict', jail_term=50, policies=[legitimacy_decay(0.001)])
+"""
+
+PERMANENT_JAIL_TERM = 1000
+
+
+class Rules:
+    """The rules and per-tick policies of a model variant."""
+    def __init__(self, name='custom', move=None, decide=None, enforce=None, jail_term=None, policies=(),
+                 series=()):
+        """
+        Initializes a Rules object.
+
+        Parameters:
+        name (str, optional): The variant name. Defaults to 'custom'.
+        move (callable, optional): (model, turtle) replacing Model.move_agent. Defaults to None.
+        decide (callable, optional): (model, agent) replacing Model.determine_behavior. Defaults to None.
+        enforce (callable, optional): (model, cop) replacing Model.enforce. Defaults to None.
+        jail_term (int or callable, optional): The term of an arrested agent: None draws it uniformly
+            from 0 to max_jail_term, an int fixes it and a callable (model, agent) computes it. Defaults to None.
+        policies (iterable, optional): Callables (model) applied after every step, before the tick
+            advances. Defaults to none.
+        series (iterable, optional): Names of extra series the policies append to model.data. Defaults to none.
+        """
+        self.name = name
+        self.move = move
+        self.decide = decide
+        self.enforce = enforce
+        self.jail_term = jail_term
+        self.policies = list(policies)
+        self.series = list(series)
+
+    def __repr__(self):
+        return f"Rules({self.name})"
+
+    @property
+    def compiled(self):
+        """bool: Whether the array kernel can run these rules (no Python callables in the turtle rules)."""
+        return (self.move is None and self.decide is None and self.enforce is None
+                and not callable(self.jail_term)
+                and all(getattr(policy, 'kernel', False) for policy in self.policies))
+
+
+def legitimacy_drop(after_tick, value):
+    """
+    Returns a policy setting the legitimacy to `value` once the tick exceeds `after_tick` (rep1).
+
+    Parameters:
+    after_tick (int): The last tick with the original legitimacy.
+    value (float): The new legitimacy.
+
+    Returns:
+    callable: The policy.
+    """
+    def policy(model):
+        if model.tick > after_tick:
+            model.set_parameter('gov_legitimacy', value)
+    policy.kernel = True
+    return policy
+
+
+def legitimacy_decay(rate):
+    """
+    Returns a policy lowering the legitimacy by `rate` per tick while it is positive (rep2).
+
+    Parameters:
+    rate (float): The decrease per tick.
+
+    Returns:
+    callable: The policy.
+    """
+    def policy(model):
+        if model.gov_legitimacy > 0:
+            model.set_parameter('gov_legitimacy', model.gov_legitimacy - rate)
+    policy.kernel = True
+    return policy
+
+
+def remove_cops(count=1, series='cop'):
+    """
+    Returns a policy recording the number of cops and then removing `count` of them (extension2).
+
+    The removed cop is the first in the tick's update order, i.e. a random one,
+    as in the script (which removes the first cop of its shuffled entity list).
+
+    Parameters:
+    count (int, optional): Cops removed per tick. Defaults to 1.
+    series (str, optional): The data series the cop count is appended to. Defaults to 'cop'.
+
+    Returns:
+    callable: The policy.
+    """
+    def policy(model):
+        model.data[series].append(model.count_cops())
+        for _ in range(count):
+            model.remove_cop()
+    policy.kernel = True
+    return policy
+
+
+def jail_term_rise(after_tick, value):
+    """
+    Returns a policy setting max_jail_term to `value` once the tick exceeds `after_tick` (extension3).
+
+    Parameters:
+    after_tick (int): The last tick with the original maximum term.
+    value (int): The new maximum term.
+
+    Returns:
+    callable: The policy.
+    """
+    def policy(model):
+        if model.tick > after_tick:
+            model.set_parameter('max_jail_term', value)
+    policy.kernel = True
+    return policy
+
+
+def jail_term_decay(rate, floor):
+    """
+    Returns a policy lowering max_jail_term by `rate` per tick while it is above `floor` (extension3_origin).
+
+    Parameters:
+    rate (int): The decrease per tick.
+    floor (int): The term below which it is no longer lowered.
+
+    Returns:
+    callable: The policy.
+    """
+    def policy(model):
+        if model.max_jail_term > floor:
+            model.set_parameter('max_jail_term', model.max_jail_term - rate)
+    policy.kernel = True
+    return policy
+
+
+def stay_while_active(model, turtle):
+    """
+    Moves a turtle, except an agent that would turn active where it stands (stay_active).
+
+    The agent then decides as usual, at its old cell if it stayed and at its new one if it moved.
+
+    Parameters:
+    model (Model): The model.
+    turtle (Turtle): The turtle taking its turn.
+    """
+    if turtle.risk_aversion is not None:  # An agent
+        grievance = turtle.adjusted_hardship * (1 - model.gov_legitimacy)
+        arrest_probability = model.estimate_arrest_probability(turtle.position, turtle.reach)
+        if grievance - turtle.risk_aversion * arrest_probability > 0.1:
+            return
+    model.move_agent(turtle)
+
+
+VARIANTS = {
+    'origin': Rules('origin'),
+    'extension1': Rules('extension1'),
+    'rep1': Rules('rep1', jail_term=PERMANENT_JAIL_TERM, policies=[legitimacy_drop(80, 0.5)]),
+    'rep2': Rules('rep2', jail_term=PERMANENT_JAIL_TERM, policies=[legitimacy_decay(0.0045)]),
+    'extension2': Rules('extension2', jail_term=PERMANENT_JAIL_TERM, policies=[remove_cops(1)], series=['cop']),
+    'rep': Rules('rep', jail_term=PERMANENT_JAIL_TERM),
+    'extension3': Rules('extension3', policies=[jail_term_rise(100, 50)]),
+    'extension3_origin': Rules('extension3_origin', policies=[jail_term_decay(1, 10)]),
+    'stay_active': Rules('stay_active', move=stay_while_active),
+}
+
+
+def get_rules(rules):
+    """
+    Resolves a variant name (or passes a Rules object through).
+
+    Parameters:
+    rules (str or Rules or None): A name from VARIANTS, a Rules object, or None for 'origin'.
+
+    Returns:
+    Rules: The rules.
+    """
+    if rules is None:
+        return VARIANTS['origin']
+    if isinstance(rules, Rules):
+        return rules
+    if rules not in VARIANTS:
+        raise ValueError(f"Unknown variant {rules!r}; expected one of {', '.join(VARIANTS)}")
+    return VARIANTS[rules]
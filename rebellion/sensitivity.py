@@ -0,0 +1,395 @@
+"""
+Global sensitivity analysis (Sobol and Morris) of the Model parameters.
+
+One-dimensional sweeps such as `run_experiment(neighbor_influence_percentage)`
+in extension1 show how one parameter matters with all others held fixed.
+Variance-based (Sobol) indices answer the global question instead: which
+share of the output variance is due to each parameter alone (first order,
+S1) and including all its interactions (total, ST).
+
+Designs follow Saltelli (2010): for N base samples and d parameters, the
+model is run on N*(d+2) points, laid out as groups of d+2 rows (A_j, B_j,
+AB_1j, ..., AB_dj) that share one seed, so within-group differences are not
+swamped by seed noise. Runs are executed in batches on a process pool and
+streamed back; every completed group immediately contributes to the
+estimates, so `SobolAnalysis.run` can report partial indices with bootstrap
+confidence intervals long before the design is finished.
+
+The Saltelli and Jansen estimators assume independent inputs, so the
+design space must be a box in which every point can be run: with
+agent_density + cop_density above 100% the Model refuses to start, and
+leaving such points out would make the two densities dependent.
+`SobolAnalysis` therefore rejects bounds whose box is not feasible as a
+whole; the default `BOUNDS` stop agent_density at 90 for this reason.
+
+Morris elementary effects are provided as a cheaper screening step. A
+Morris trajectory may cross an infeasible point when the bounds allow it;
+`evaluate_point` returns NaN metrics there and `morris_indices` uses the
+remaining effects.
+
+Example:
+    analysis = SobolAnalysis(BOUNDS, base_samples=256, ticks=200, metric='mean_active')
+    for indices in analysis.run(workers=8):
+        print(analysis.completed, indices['S1'])
+"""
+import functools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from .metrics import METRICS, summarize
+from .model import Model
+
+# Ranges used by the NetLogo interface sliders, with agent_density capped so that every point of the box
+# is feasible (agent_density + cop_density at most 100%)
+BOUNDS = {
+    'agent_density': (0, 90),
+    'cop_density': (0, 10),
+    'vision': (1, 10),
+    'k': (1, 3),
+    'gov_legitimacy': (0, 1),
+    'max_jail_term': (0, 50),
+}
+INTEGER_PARAMETERS = ('vision', 'max_jail_term')
+
+
+def _unit_samples(n, d, seed):
+    """Returns n points in [0, 1)^d, scrambled Sobol when scipy is available."""
+    try:
+        from scipy.stats import qmc
+    except ImportError:
+        return np.random.default_rng(seed).random((n, d))
+    return qmc.Sobol(d, scramble=True, seed=seed).random(n)
+
+
+def _to_params(unit, names, bounds, integer):
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+    values = low + unit * (high - low)
+    for i, name in enumerate(names):
+        if name in integer:
+            values[:, i] = np.floor(values[:, i] + 0.5)
+    return values
+
+
+def saltelli_design(bounds, base_samples, seed=None, integer=INTEGER_PARAMETERS):
+    """
+    Builds a Saltelli design.
+
+    Parameters:
+    bounds (dict): Maps each varied parameter to its (low, high) range.
+    base_samples (int): The number N of base samples.
+    seed (int, optional): Seed of the sample generator. Defaults to None.
+    integer (tuple, optional): Parameters rounded to whole numbers.
+
+    Returns:
+    array: N*(d+2) rows of parameter values, in groups of (A, B, AB_1, ..., AB_d).
+    """
+    names = list(bounds)
+    d = len(names)
+    unit = _unit_samples(base_samples, 2 * d, seed)
+    a, b = unit[:, :d], unit[:, d:]
+    groups = np.empty((base_samples, d + 2, d))
+    groups[:, 0] = a
+    groups[:, 1] = b
+    for i in range(d):
+        groups[:, 2 + i] = a
+        groups[:, 2 + i, i] = b[:, i]
+    return _to_params(groups.reshape(-1, d), names, bounds, integer)
+
+
+def sobol_indices(outputs, parameters, bootstrap=200, confidence=0.95, seed=None):
+    """
+    Computes first-order and total Sobol indices from complete Saltelli groups.
+
+    Uses the Saltelli (2010) estimator for S1 and the Jansen estimator for ST.
+
+    Parameters:
+    outputs (array): Shape (groups, d + 2): the model output for every row of each group.
+    parameters (list): The parameter names, in design order.
+    bootstrap (int, optional): The number of bootstrap resamples of the groups. Defaults to 200.
+    confidence (float, optional): The width of the confidence intervals. Defaults to 0.95.
+    seed (int, optional): Seed of the bootstrap. Defaults to None.
+
+    Returns:
+    dict: 'S1', 'ST' (dicts of estimates) and 'S1_conf', 'ST_conf' (dicts of (low, high) intervals).
+    """
+    outputs = np.asarray(outputs, dtype=float)
+
+    def estimate(rows):
+        f_a, f_b, f_ab = rows[:, 0], rows[:, 1], rows[:, 2:]
+        variance = np.var(np.concatenate([f_a, f_b]))
+        if variance == 0:
+            zeros = np.zeros(f_ab.shape[1])
+            return zeros, zeros
+        first = (f_b[:, None] * (f_ab - f_a[:, None])).mean(axis=0) / variance
+        total = 0.5 * ((f_a[:, None] - f_ab) ** 2).mean(axis=0) / variance
+        return first, total
+
+    first, total = estimate(outputs)
+    rng = np.random.default_rng(seed)
+    resampled = [estimate(outputs[rng.integers(0, len(outputs), len(outputs))]) for _ in range(bootstrap)]
+    tail = (1 - confidence) / 2 * 100
+    result = {'S1': dict(zip(parameters, first.tolist())), 'ST': dict(zip(parameters, total.tolist()))}
+    for label, column in (('S1_conf', 0), ('ST_conf', 1)):
+        if resampled:
+            samples = np.array([r[column] for r in resampled])
+            low, high = np.percentile(samples, [tail, 100 - tail], axis=0)
+            result[label] = {name: (lo, hi) for name, lo, hi in zip(parameters, low.tolist(), high.tolist())}
+        else:
+            result[label] = {name: (float('nan'), float('nan')) for name in parameters}
+    return result
+
+
+def morris_design(bounds, trajectories, levels=4, seed=None, integer=INTEGER_PARAMETERS):
+    """
+    Builds a Morris one-at-a-time design.
+
+    Parameters:
+    bounds (dict): Maps each varied parameter to its (low, high) range.
+    trajectories (int): The number of trajectories r.
+    levels (int, optional): The number of grid levels p (even). Defaults to 4.
+    seed (int, optional): Seed of the trajectory generator. Defaults to None.
+    integer (tuple, optional): Parameters rounded to whole numbers.
+
+    Returns:
+    tuple: (rows, changed), where rows has r*(d+1) parameter rows and changed[t, i]
+        is the parameter index changed between rows i and i+1 of trajectory t.
+    """
+    names = list(bounds)
+    d = len(names)
+    rng = np.random.default_rng(seed)
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels // 2) / (levels - 1)  # start levels that leave room for +delta
+    unit = np.empty((trajectories, d + 1, d))
+    changed = np.empty((trajectories, d), dtype=int)
+    for t in range(trajectories):
+        point = rng.choice(grid, size=d)
+        order = rng.permutation(d)
+        unit[t, 0] = point
+        for step, i in enumerate(order):
+            point = point.copy()
+            point[i] += delta
+            unit[t, step + 1] = point
+        changed[t] = order
+    return _to_params(unit.reshape(-1, d), names, bounds, integer), changed
+
+
+def morris_indices(outputs, changed, rows, parameters):
+    """
+    Computes Morris elementary-effect statistics.
+
+    Parameters:
+    outputs (array): The model output of each design row, shape (r * (d + 1),).
+    changed (array): The changed-parameter indices returned by morris_design.
+    rows (array): The design rows returned by morris_design.
+    parameters (list): The parameter names, in design order.
+
+    Returns:
+    dict: 'mu', 'mu_star' and 'sigma', each a dict keyed by parameter, and 'effects', the number of
+        elementary effects per parameter (effects touching a NaN output, e.g. of an infeasible point,
+        are left out).
+    """
+    trajectories, d = changed.shape
+    outputs = np.asarray(outputs, dtype=float).reshape(trajectories, d + 1)
+    rows = rows.reshape(trajectories, d + 1, d)
+    effects = np.empty((trajectories, d))
+    for t in range(trajectories):
+        for step, i in enumerate(changed[t]):
+            dx = rows[t, step + 1, i] - rows[t, step, i]
+            dy = outputs[t, step + 1] - outputs[t, step]
+            effects[t, i] = dy / dx if dx else dy * 0.0  # 0, or NaN for a NaN output
+    counts = (~np.isnan(effects)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = np.nansum(effects, axis=0) / counts
+        mu_star = np.nansum(np.abs(effects), axis=0) / counts
+        sigma = np.sqrt(np.nansum((effects - mu) ** 2, axis=0) / np.maximum(counts - 1, 1))
+    return {
+        'mu': dict(zip(parameters, mu.tolist())),
+        'mu_star': dict(zip(parameters, mu_star.tolist())),
+        'sigma': dict(zip(parameters, sigma.tolist())),
+        'effects': dict(zip(parameters, counts.tolist())),
+    }
+
+
+def evaluate_point(values, seed, parameters, base_params, ticks):
+    """
+    Runs the model at one design row and returns its summary metrics.
+
+    Parameters:
+    values (sequence): The values of the varied parameters.
+    seed (int): The seed of the run.
+    parameters (list): The names of the varied parameters.
+    base_params (dict): The values of the parameters that are not varied.
+    ticks (int): The number of steps.
+
+    Returns:
+    dict: The summary metrics of the run; NaN for every metric at a point the Model cannot run
+        (agent_density + cop_density above 100%).
+    """
+    params = dict(base_params)
+    for name, value in zip(parameters, values):
+        params[name] = int(value) if name in INTEGER_PARAMETERS else float(value)
+    if not feasible(np.asarray([values], dtype=float), parameters, base_params)[0]:
+        return dict.fromkeys(METRICS, float('nan'))
+    return summarize(Model(**params, seed=seed).run(ticks))
+
+
+def feasible(rows, parameters, base_params=None):
+    """
+    Marks the design rows the Model can run (agent and cop densities adding up to at most 100%).
+
+    Parameters:
+    rows (array): The design rows.
+    parameters (list): The names of the varied parameters, in design order.
+    base_params (dict, optional): The values of the parameters that are not varied. Defaults to None.
+
+    Returns:
+    array: One bool per row.
+    """
+    rows = np.atleast_2d(rows)
+    base_params = base_params or {}
+
+    def column(name):
+        if name in parameters:
+            return rows[:, list(parameters).index(name)]
+        return np.full(len(rows), float(base_params.get(name, 0)))
+    return column('agent_density') + column('cop_density') <= 100
+
+
+def _evaluate_batch(evaluate, batch):
+    return [(index, evaluate(values, seed)) for index, values, seed in batch]
+
+
+def run_batches(rows, seeds, evaluate, workers=None, batch_size=16):
+    """
+    Evaluates design rows in batches on a process pool, yielding results as they finish.
+
+    Parameters:
+    rows (array): The design rows.
+    seeds (sequence): The seed of each row.
+    evaluate (callable): A picklable (values, seed) -> metrics function.
+    workers (int, optional): The number of processes; 1 runs in-process. Defaults to os.cpu_count().
+    batch_size (int, optional): The number of rows sent to a worker at once. Defaults to 16.
+
+    Returns:
+    generator: (row index, metrics) pairs in completion order.
+    """
+    jobs = [(i, rows[i], int(seeds[i])) for i in range(len(rows))]
+    batches = [jobs[i:i + batch_size] for i in range(0, len(jobs), batch_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for batch in batches:
+            yield from _evaluate_batch(evaluate, batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded number of batches in flight so results stream back early
+        pending = set()
+        queue = iter(batches)
+        for batch in queue:
+            pending.add(pool.submit(_evaluate_batch, evaluate, batch))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+                batch = next(queue, None)
+                if batch is not None:
+                    pending.add(pool.submit(_evaluate_batch, evaluate, batch))
+
+
+class SobolAnalysis:
+    """A Saltelli/Sobol analysis of one output metric, run in streamed batches."""
+    def __init__(self, bounds=BOUNDS, base_samples=256, base_params=None, ticks=200, metric='mean_active',
+                 seed=0, evaluate=None):
+        """
+        Initializes a SobolAnalysis object.
+
+        Parameters:
+        bounds (dict, optional): Maps each varied parameter to its (low, high) range. Defaults to BOUNDS.
+        base_samples (int, optional): The number N of base samples. Defaults to 256.
+        base_params (dict, optional): Values of Model parameters that are not varied. Defaults to None.
+        ticks (int, optional): The number of steps per run. Defaults to 200.
+        metric (str, optional): The summary metric analysed. Defaults to 'mean_active'.
+        seed (int, optional): Seed of the design; group j runs with seed + j. Defaults to 0.
+        evaluate (callable, optional): A picklable (values, seed) -> metrics function. Defaults to
+            running the Model via evaluate_point.
+        """
+        corner = [[high for _, high in bounds.values()]]
+        if not feasible(np.asarray(corner, dtype=float), list(bounds), base_params)[0]:
+            raise ValueError("The bounds allow agent_density + cop_density above 100%; narrow them so that every "
+                             "point can be run (e.g. agent_density up to 90 with cop_density up to 10)")
+        self.parameters = list(bounds)
+        self.metric = metric
+        self.rows = saltelli_design(bounds, base_samples, seed)
+        group = len(self.parameters) + 2
+        self.seeds = seed + np.arange(len(self.rows)) // group
+        self.evaluate = evaluate or functools.partial(
+            evaluate_point, parameters=self.parameters, base_params=base_params or {}, ticks=ticks)
+        self.outputs = np.full(len(self.rows), np.nan)
+        self.group_size = group
+        self.completed = 0
+
+    def complete_groups(self):
+        """
+        Returns the outputs of the groups whose every row has finished.
+
+        Returns:
+        array: Shape (complete groups, d + 2).
+        """
+        groups = self.outputs.reshape(-1, self.group_size)
+        return groups[~np.isnan(groups).any(axis=1)]
+
+    def indices(self, bootstrap=200, confidence=0.95):
+        """
+        Computes the indices from the groups completed so far.
+
+        Parameters:
+        bootstrap (int, optional): The number of bootstrap resamples. Defaults to 200.
+        confidence (float, optional): The width of the confidence intervals. Defaults to 0.95.
+
+        Returns:
+        dict: See sobol_indices, plus 'groups', the number of groups used.
+        """
+        groups = self.complete_groups()
+        if len(groups) < 2:
+            return None
+        result = sobol_indices(groups, self.parameters, bootstrap, confidence)
+        result['groups'] = len(groups)
+        return result
+
+    def run(self, workers=None, batch_size=16, report_every=None, bootstrap=200):
+        """
+        Executes the design, yielding partial indices as results stream in.
+
+        Parameters:
+        workers (int, optional): The number of processes. Defaults to os.cpu_count().
+        batch_size (int, optional): The number of rows per batch. Defaults to 16.
+        report_every (int, optional): Yield indices after this many finished rows. Defaults to 10% of the design.
+        bootstrap (int, optional): The number of bootstrap resamples per report. Defaults to 200.
+
+        Returns:
+        generator: Index dicts (see `indices`), each covering more groups than the one before; the last
+            one covers the whole design.
+        """
+        report_every = report_every or max(1, len(self.rows) // 10)
+        todo = np.flatnonzero(np.isnan(self.outputs))
+        results = run_batches(self.rows[todo], self.seeds[todo], self.evaluate, workers, batch_size)
+        since_report = 0
+        reported = -1  # The number of groups in the last yielded indices
+        for position, metrics in results:
+            self.outputs[todo[position]] = metrics[self.metric]
+            self.completed += 1
+            since_report += 1
+            if since_report >= report_every and len(self.complete_groups()) > reported:
+                since_report = 0
+                partial = self.indices(bootstrap)
+                if partial is not None:
+                    reported = partial['groups']
+                    yield partial
+        if len(self.complete_groups()) > reported:
+            final = self.indices(bootstrap)
+            if final is not None:
+                yield final
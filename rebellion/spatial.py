@@ -0,0 +1,252 @@
+"""
+Spatial statistics of recorded runs.
+
+Works on stacks of active-cell masks of shape (ticks, width, height), taken
+from `trace.TraceReader` frames, and computes per tick:
+
+- clusters of active agents: connected components on the torus (Moore
+  neighbourhood, as NetLogo's `neighbors`), with their count, largest and
+  mean size;
+- Moran's I of the active indicator with Moore weights, i.e. how much more
+  active cells cluster than a random arrangement of the same count would;
+- the rebellion front: for every cell that turned active, the torus distance
+  to the nearest cell active in the previous tick. `front_speed` is the mean
+  of these distances and `contact_fraction` the share of new activations next
+  to an existing one, which is what a chain-reaction spread predicts.
+
+All statistics are vectorised over the whole stack; `analyze_traces` spreads
+many runs over a process pool.
+
+Example:
+    results = analyze_traces(glob.glob('traces/*.trace'), workers=8)
+    results[0]['largest_cluster'], results[0]['morans_i']
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .trace import ACTIVE, TraceReader
+
+# Moore neighbourhood offsets
+NEIGHBORS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+STATISTICS = ('active', 'clusters', 'largest_cluster', 'mean_cluster', 'morans_i', 'front_speed',
+              'contact_fraction')
+
+
+def label_clusters(masks):
+    """
+    Labels the connected components of a stack of masks on the torus.
+
+    Every cell starts with its own index as label; labels are lowered to the
+    smallest label among occupied neighbours and then shortcut through the
+    label of the cell they point to, until nothing changes. All frames are
+    processed at once.
+
+    Parameters:
+    masks (array): Boolean array of shape (ticks, width, height) (or (width, height)).
+
+    Returns:
+    array: int32 labels of the same shape; -1 outside the masks, otherwise the smallest
+        flat index (within the frame) of the component.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    single = masks.ndim == 2
+    if single:
+        masks = masks[None]
+    ticks, width, height = masks.shape
+    cells = width * height
+    big = np.int32(cells)
+    labels = np.where(masks, np.arange(cells, dtype=np.int32).reshape(width, height), big)
+    frame_offset = (np.arange(ticks, dtype=np.int64) * (cells + 1))[:, None]
+    while True:
+        lowest = labels
+        for dx, dy in NEIGHBORS:
+            lowest = np.minimum(lowest, np.roll(labels, (dx, dy), axis=(1, 2)))
+        lowest = np.where(masks, lowest, big)
+        # Pointer jumping: adopt the label of the cell the label points to
+        flat = np.concatenate([lowest.reshape(ticks, cells), np.full((ticks, 1), big, np.int32)], axis=1).ravel()
+        jumped = flat[(lowest.reshape(ticks, cells) + frame_offset).ravel()].reshape(ticks, width, height)
+        lowest = np.minimum(lowest, jumped)
+        if np.array_equal(lowest, labels):
+            break
+        labels = lowest
+    labels = np.where(masks, labels, -1)
+    return labels[0] if single else labels
+
+
+def cluster_sizes(labels):
+    """
+    Lists the cluster sizes of one labelled frame.
+
+    Parameters:
+    labels (array): The labels of one frame (see label_clusters).
+
+    Returns:
+    array: The size of every cluster, largest first.
+    """
+    counts = np.bincount(labels[labels >= 0].ravel())
+    return np.sort(counts[counts > 0])[::-1]
+
+
+def cluster_statistics(masks):
+    """
+    Counts the clusters of active cells per frame.
+
+    Parameters:
+    masks (array): Boolean array of shape (ticks, width, height).
+
+    Returns:
+    dict: 'clusters', 'largest_cluster' and 'mean_cluster' arrays with one value per frame.
+    """
+    labels = label_clusters(masks)
+    ticks, width, height = labels.shape
+    cells = width * height
+    # Histogram of labels per frame in one bincount: frame t's labels are shifted by t * cells
+    flat = labels.reshape(ticks, cells)
+    shifted = flat + (np.arange(ticks) * cells)[:, None]
+    sizes = np.bincount(shifted[flat >= 0], minlength=ticks * cells).reshape(ticks, cells)
+    clusters = np.count_nonzero(sizes, axis=1)
+    active = sizes.sum(axis=1)
+    return {
+        'clusters': clusters,
+        'largest_cluster': sizes.max(axis=1),
+        'mean_cluster': np.divide(active, clusters, out=np.zeros(ticks), where=clusters > 0),
+    }
+
+
+def morans_i(values):
+    """
+    Computes Moran's I with Moore weights on the torus, per frame.
+
+    Parameters:
+    values (array): Array of shape (ticks, width, height) (or (width, height)).
+
+    Returns:
+    array: One value per frame; NaN for constant frames.
+    """
+    values = np.asarray(values, dtype=float)
+    single = values.ndim == 2
+    if single:
+        values = values[None]
+    deviations = values - values.mean(axis=(1, 2), keepdims=True)
+    neighbor_sum = sum(np.roll(deviations, offset, axis=(1, 2)) for offset in NEIGHBORS)
+    cells = values.shape[1] * values.shape[2]
+    weight_total = len(NEIGHBORS) * cells
+    numerator = (deviations * neighbor_sum).sum(axis=(1, 2))
+    denominator = (deviations ** 2).sum(axis=(1, 2))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = cells / weight_total * numerator / denominator
+    return result[0] if single else result
+
+
+def front_statistics(masks):
+    """
+    Measures how far activation travels from one frame to the next.
+
+    Parameters:
+    masks (array): Boolean array of shape (ticks, width, height).
+
+    Returns:
+    dict: 'front_speed' (mean torus distance from a newly active cell to the nearest
+        previously active cell) and 'contact_fraction' (share of newly active cells
+        within distance 1.5 of one); NaN for the first frame and frames without new
+        activations or without previous activity.
+    """
+    ticks, width, height = masks.shape
+    speed = np.full(ticks, np.nan)
+    contact = np.full(ticks, np.nan)
+    for t in range(1, ticks):
+        new = np.argwhere(masks[t] & ~masks[t - 1])
+        old = np.argwhere(masks[t - 1])
+        if not len(new) or not len(old):
+            continue
+        delta = np.abs(new[:, None, :] - old[None, :, :])
+        delta = np.minimum(delta, np.array([width, height]) - delta)
+        nearest = np.sqrt((delta ** 2).sum(axis=2).min(axis=1))
+        speed[t] = nearest.mean()
+        contact[t] = np.mean(nearest <= 1.5)
+    return {'front_speed': speed, 'contact_fraction': contact}
+
+
+def analyze_masks(masks):
+    """
+    Computes every spatial statistic of a stack of active masks.
+
+    Parameters:
+    masks (array): Boolean array of shape (ticks, width, height).
+
+    Returns:
+    dict: One array per name in STATISTICS.
+    """
+    masks = np.asarray(masks, dtype=bool)
+    result = {'active': masks.sum(axis=(1, 2))}
+    result.update(cluster_statistics(masks))
+    result['morans_i'] = morans_i(masks)
+    result.update(front_statistics(masks))
+    return result
+
+
+def analyze_trace(path, start=None, stop=None, step=1, chunk=128):
+    """
+    Streams a trace and computes its spatial statistics chunk by chunk.
+
+    Parameters:
+    path (str): The trace file.
+    start (int, optional): The first tick. Defaults to the first recorded tick.
+    stop (int, optional): The tick to stop before. Defaults to the end.
+    step (int, optional): Analyse every step-th frame. Defaults to 1.
+    chunk (int, optional): Frames decoded and analysed at once. Defaults to 128.
+
+    Returns:
+    dict: 'tick' and one array per name in STATISTICS, plus the trace's 'metadata'.
+    """
+    parts = []
+    ticks = []
+    previous = None  # Last mask of the previous chunk, so fronts span chunk borders
+    with TraceReader(path) as trace:
+        masks = []
+        for tick, frame in trace.frames(start, stop, step):
+            ticks.append(tick)
+            masks.append(trace.status_grid(frame) == ACTIVE)
+            if len(masks) == chunk:
+                parts.append(_analyze_chunk(masks, previous))
+                previous = masks[-1]
+                masks = []
+        if masks:
+            parts.append(_analyze_chunk(masks, previous))
+        metadata = trace.metadata
+    result = {name: np.concatenate([part[name] for part in parts]) if parts else np.zeros(0)
+              for name in STATISTICS}
+    result['tick'] = np.array(ticks, dtype=np.int64)
+    result['metadata'] = metadata
+    return result
+
+
+def _analyze_chunk(masks, previous):
+    stack = np.array(masks if previous is None else [previous] + masks)
+    result = analyze_masks(stack)
+    if previous is not None:
+        result = {name: values[1:] for name, values in result.items()}
+    return result
+
+
+def analyze_traces(paths, workers=None, **options):
+    """
+    Analyses many traces in parallel.
+
+    Parameters:
+    paths (list): The trace files.
+    workers (int, optional): The number of worker processes; 1 runs in-process. Defaults to os.cpu_count().
+    **options: Passed to analyze_trace (start, stop, step, chunk).
+
+    Returns:
+    list: The analyze_trace result of every path, in order.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        return [analyze_trace(path, **options) for path in paths]
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        futures = [pool.submit(analyze_trace, path, **options) for path in paths]
+        return [future.result() for future in futures]
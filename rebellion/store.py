@@ -0,0 +1,487 @@
+"""
+A queryable store of run results.
+
+Results used to land as loose CSV files (`extension1_0.3.csv`,
+`origin.py.csv`, `rep/agent_status.csv`) with the parameters encoded in
+the file name or lost, so every analysis started by globbing and parsing
+them again. A `ResultStore` is a directory holding
+
+- `catalog.db`, an SQLite catalog (WAL mode, safe for concurrent writers)
+  with one row per run: its key (the `cache.run_key`), experiment,
+  variant, engine, seed, ticks and schedule, one indexed column per model
+  parameter and one per summary metric, and the location of its series;
+- `segments/`, the per-tick series in columnar form: every batch of runs
+  added together becomes a segment directory with one `.npy` matrix per
+  series (one row per run), read through a memory map, so loading the
+  series of a few runs touches only their rows.
+
+Parameters that are tables (e.g. `agent_vision = {low = 3, high = 9}`) are
+stored as JSON text; parameters and metrics not seen before get a column
+when they first appear. Filtered aggregations run in SQL on the catalog
+and never open a segment:
+
+    store = ResultStore('results')
+    store.aggregate('peak_active', where={'vision': 7, 'k': 2.3}, by=['gov_legitimacy'])
+
+Sweeps record their runs with `store = "DIR"` in the experiment file (or
+`python -m rebellion sweep FILE --store DIR`), existing caches and CSV
+files are imported with `import_cache` and `import_csv`, and `python -m
+rebellion query DIR METRIC --where k=2.3 --by gov_legitimacy` prints an
+aggregation.
+"""
+import csv
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+import uuid
+
+import numpy as np
+
+from .cache import CACHE_VERSION, RunCache, run_key
+from .experiment import MODEL_PARAMETERS
+from .metrics import METRICS, summarize
+
+STATISTICS = ('count', 'mean', 'std', 'min', 'max')
+# Column headers of the scripts' CSV files, mapped to series names
+CSV_SERIES = {'quiet': 'quiet', 'quiet agents': 'quiet', 'jail': 'jail', 'jailed agents': 'jail',
+              'active': 'active', 'active agents': 'active', 'cop': 'cop', 'cops': 'cop'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    experiment TEXT,
+    variant TEXT NOT NULL,
+    engine TEXT NOT NULL,
+    seed INTEGER,
+    ticks INTEGER NOT NULL,
+    schedule TEXT,
+    params TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    segment TEXT,
+    row INTEGER,
+    source TEXT,
+    created REAL NOT NULL
+);
+"""
+_FIXED = ('id', 'key', 'experiment', 'variant', 'engine', 'seed', 'ticks', 'schedule', 'params', 'summary',
+          'segment', 'row', 'source', 'created')
+_INDEXED = ('experiment', 'variant', 'engine', 'seed', 'schedule')
+_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def _column_value(value):
+    """Stores scalars as they are and tables (dicts, lists) as canonical JSON."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, (dict, list, tuple)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+class ResultStore:
+    """A directory with an SQLite catalog of runs and their series in columnar segments."""
+    def __init__(self, directory, timeout=60.0):
+        """
+        Initializes a ResultStore object, creating the directory and catalog if needed.
+
+        Parameters:
+        directory (str): The store directory.
+        timeout (float, optional): Seconds to wait for a lock held by another process. Defaults to 60.
+        """
+        self.directory = directory
+        os.makedirs(os.path.join(directory, 'segments'), exist_ok=True)
+        # Autocommit mode: transactions are opened explicitly where they are needed
+        self.connection = sqlite3.connect(os.path.join(directory, 'catalog.db'), timeout=timeout,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+        self._columns = set(self.columns)
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            for name in _INDEXED:
+                self.connection.execute(f'CREATE INDEX IF NOT EXISTS runs_{name} ON runs ({name})')
+            for name in MODEL_PARAMETERS + tuple(METRICS):
+                self._add_column(name)
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+    def __repr__(self):
+        return f"ResultStore({self.directory}, {len(self)} runs)"
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+    def close(self):
+        """
+        Closes the catalog connection.
+        """
+        self.connection.close()
+
+    @property
+    def columns(self):
+        """list: The column names of the catalog."""
+        return [row[1] for row in self.connection.execute('PRAGMA table_info(runs)')]
+
+    def _add_column(self, name):
+        # Called inside a write transaction; every parameter and metric column is indexed
+        if name in self._columns:
+            return
+        if not _NAME.match(name):
+            raise ValueError(f"{name!r} cannot be a catalog column")
+        self._columns = set(self.columns)  # Another process may have added it
+        if name not in self._columns:
+            self.connection.execute(f'ALTER TABLE runs ADD COLUMN "{name}"')
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS "runs_{name}" ON runs ("{name}")')
+            self._columns.add(name)
+
+    def add(self, params, seed, ticks, data=None, summary=None, variant='origin', engine='object', schedule=None,
+            experiment=None, source=None):
+        """
+        Adds one run (see add_many).
+
+        Parameters:
+        params (dict): The model parameters (without the seed).
+        seed (int): The seed, or None when unknown.
+        ticks (int): The number of steps.
+        data (dict, optional): The per-tick series. Defaults to none (catalog only).
+        summary (dict, optional): The summary metrics. Defaults to summarize(data).
+        variant (str, optional): The model variant. Defaults to 'origin'.
+        engine (str, optional): The engine that produced the run. Defaults to 'object'.
+        schedule (list, optional): The schedule of the run. Defaults to none.
+        experiment (str, optional): The experiment name. Defaults to none.
+        source (str, optional): The file the run was imported from. Defaults to none.
+
+        Returns:
+        int: 1 if the run was added, 0 if it was already in the store.
+        """
+        return self.add_many([dict(params=params, seed=seed, ticks=ticks, data=data, summary=summary,
+                                   variant=variant, engine=engine, schedule=schedule, experiment=experiment,
+                                   source=source)])
+
+    def add_many(self, runs):
+        """
+        Adds runs, writing the series of those not yet stored as one segment per series layout.
+
+        Parameters:
+        runs (iterable): Dicts with the arguments of add ('params', 'seed' and 'ticks' are required).
+
+        Returns:
+        int: The number of runs added (runs already in the store are skipped).
+        """
+        entries = []
+        for run in runs:
+            entry = dict(run)
+            entry.setdefault('variant', 'origin')
+            entry.setdefault('engine', 'object')
+            data = entry.get('data')
+            if entry.get('summary') is None:
+                if data is None:
+                    raise ValueError("A run needs its series or its summary")
+                entry['summary'] = summarize({name: list(values) for name, values in data.items()})
+            # Like the run cache, the kernel's runs are keyed apart from the object model's
+            variant = entry['variant'] if entry['engine'] == 'object' else f"{entry['variant']}@{entry['engine']}"
+            if entry.get('seed') is None:
+                entry['key'] = 'source:' + os.path.abspath(entry.get('source') or uuid.uuid4().hex)
+            else:
+                entry['key'] = run_key(entry['params'], entry['seed'], entry['ticks'], variant,
+                                       entry.get('schedule') or None)
+            entries.append(entry)
+        known = set()
+        keys = [entry['key'] for entry in entries]
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            known.update(row[0] for row in self.connection.execute(
+                f"SELECT key FROM runs WHERE key IN ({','.join('?' * len(chunk))})", chunk))
+        unique = {}
+        for entry in entries:
+            if entry['key'] not in known:
+                unique.setdefault(entry['key'], entry)
+        entries = list(unique.values())
+        layouts = {}
+        for entry in entries:
+            if entry.get('data') is not None:
+                layout = (len(next(iter(entry['data'].values()))), tuple(entry['data']))
+                layouts.setdefault(layout, []).append(entry)
+        for group in layouts.values():
+            segment = self._write_segment([entry['data'] for entry in group])
+            for row, entry in enumerate(group):
+                entry['segment'], entry['row'] = segment, row
+        return self._insert(entries)
+
+    def _write_segment(self, runs):
+        name = f'{time.strftime("%Y%m%d")}-{uuid.uuid4().hex[:12]}'
+        final = os.path.join(self.directory, 'segments', name)
+        staging = final + '.tmp'
+        os.makedirs(staging)
+        try:
+            for series in runs[0]:
+                np.save(os.path.join(staging, f'{series}.npy'), np.array([run[series] for run in runs]))
+            os.replace(staging, final)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return name
+
+    def _insert(self, entries):
+        now = time.time()
+        before = self.connection.total_changes
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            for entry in entries:
+                values = {
+                    'key': entry['key'], 'experiment': entry.get('experiment'), 'variant': entry['variant'],
+                    'engine': entry['engine'], 'seed': entry.get('seed'), 'ticks': int(entry['ticks']),
+                    'schedule': json.dumps(entry['schedule'], sort_keys=True) if entry.get('schedule') else None,
+                    'params': json.dumps(entry['params'], sort_keys=True, default=_column_value),
+                    'summary': json.dumps(entry['summary'], sort_keys=True, default=_column_value),
+                    'segment': entry.get('segment'), 'row': entry.get('row'), 'source': entry.get('source'),
+                    'created': now,
+                }
+                for name, value in list(entry['params'].items()) + list(entry['summary'].items()):
+                    if name in _FIXED:
+                        raise ValueError(f"{name!r} is reserved in the catalog")
+                    self._add_column(name)
+                    values[name] = _column_value(value)
+                columns = ', '.join(f'"{name}"' for name in values)
+                self.connection.execute(f"INSERT OR IGNORE INTO runs ({columns}) VALUES "
+                                        f"({', '.join('?' * len(values))})", list(values.values()))
+            self.connection.execute('COMMIT')
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        return self.connection.total_changes - before
+
+    def _where(self, where):
+        """Turns {column: value, list of values, or (low, high)} into an SQL condition and its arguments."""
+        clauses, arguments = [], []
+        columns = set(self.columns)
+        for name, value in (where or {}).items():
+            if name not in columns:
+                raise ValueError(f"Unknown column {name!r}")
+            if value is None:
+                clauses.append(f'"{name}" IS NULL')
+            elif isinstance(value, tuple):
+                low, high = value
+                clauses.append(f'"{name}" BETWEEN ? AND ?')
+                arguments += [low, high]
+            elif isinstance(value, (list, set)):
+                values = [_column_value(v) for v in value]
+                clauses.append(f'"{name}" IN ({", ".join("?" * len(values))})')
+                arguments += values
+            else:
+                clauses.append(f'"{name}" = ?')
+                arguments.append(_column_value(value))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), arguments
+
+    def query(self, where=None, columns=None, limit=None):
+        """
+        Lists the catalog rows of the runs matching a filter.
+
+        Parameters:
+        where (dict, optional): Maps columns to a value, a list of values (any of them) or a (low, high)
+            range. Defaults to all runs.
+        columns (iterable, optional): The columns returned. Defaults to all.
+        limit (int, optional): The largest number of rows. Defaults to all.
+
+        Returns:
+        list: One dict per run, in insertion order.
+        """
+        names = list(columns) if columns is not None else self.columns
+        unknown = set(names) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        condition, arguments = self._where(where)
+        quoted = ', '.join(f'"{name}"' for name in names)
+        sql = f'SELECT {quoted} FROM runs{condition} ORDER BY id'
+        if limit is not None:
+            sql += f' LIMIT {int(limit)}'
+        return [dict(zip(names, row)) for row in self.connection.execute(sql, arguments)]
+
+    def aggregate(self, metric, where=None, by=(), statistics=STATISTICS):
+        """
+        Aggregates a catalog column over the runs matching a filter, grouped by other columns.
+
+        Runs in SQL on the catalog; no series is loaded.
+
+        Parameters:
+        metric (str): The aggregated column, e.g. 'peak_active'.
+        where (dict, optional): The filter (see query). Defaults to all runs.
+        by (iterable, optional): The grouping columns. Defaults to one group.
+        statistics (iterable, optional): Some of STATISTICS. Defaults to all.
+
+        Returns:
+        list: One dict per group, sorted by the grouping columns, with their values and the statistics.
+        """
+        by = list(by)
+        unknown = ({metric} | set(by)) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Unknown columns: {', '.join(sorted(unknown))}")
+        wrong = set(statistics) - set(STATISTICS)
+        if wrong:
+            raise ValueError(f"Unknown statistics: {', '.join(sorted(wrong))}; expected some of "
+                             f"{', '.join(STATISTICS)}")
+        condition, arguments = self._where(where)
+        column = f'"{metric}"'
+        groups = ', '.join(f'"{name}"' for name in by)
+        selected = (groups + ', ' if by else '') + (f'COUNT({column}), AVG({column}), '
+                                                    f'AVG({column} * {column}), MIN({column}), MAX({column})')
+        sql = f'SELECT {selected} FROM runs{condition}'
+        if by:
+            sql += f' GROUP BY {groups} ORDER BY {groups}'
+        results = []
+        for row in self.connection.execute(sql, arguments):
+            count, mean, square, low, high = row[len(by):]
+            variance = (square - mean * mean) * count / (count - 1) if count and count > 1 else None
+            values = {'count': count, 'mean': mean, 'std': None if variance is None else max(variance, 0.0) ** 0.5,
+                      'min': low, 'max': high}
+            entry = dict(zip(by, row[:len(by)]))
+            entry.update({name: values[name] for name in statistics})
+            results.append(entry)
+        return results
+
+    def series(self, name, where=None):
+        """
+        Loads one series of the runs matching a filter, reading only their rows of each segment.
+
+        Parameters:
+        name (str): The series, e.g. 'active'.
+        where (dict, optional): The filter (see query). Defaults to all runs.
+
+        Returns:
+        tuple: (catalog rows as in query, array of shape (runs, ticks)); runs without stored series
+            are left out. All selected runs must have the same number of ticks.
+        """
+        rows = [row for row in self.query(where) if row['segment'] is not None]
+        if len({row['ticks'] for row in rows}) > 1:
+            raise ValueError("The selected runs differ in length; filter by 'ticks'")
+        by_segment = {}
+        for position, row in enumerate(rows):
+            by_segment.setdefault(row['segment'], []).append((row['row'], position))
+        values = None
+        for segment, members in by_segment.items():
+            path = os.path.join(self.directory, 'segments', segment, f'{name}.npy')
+            if not os.path.exists(path):
+                raise ValueError(f"Series {name!r} is not stored for every selected run")
+            matrix = np.load(path, mmap_mode='r')
+            if values is None:
+                values = np.empty((len(rows), matrix.shape[1]), dtype=matrix.dtype)
+            indices, positions = zip(*members)
+            values[list(positions)] = matrix[list(indices)]
+        return rows, (values if values is not None else np.empty((0, 0)))
+
+    def import_cache(self, directory, experiment=None):
+        """
+        Catalogs every run of a run cache (series included).
+
+        Parameters:
+        directory (str): The RunCache directory.
+        experiment (str, optional): The experiment name recorded. Defaults to none.
+
+        Returns:
+        int: The number of runs added.
+        """
+        cache = RunCache(directory)
+        runs = []
+        for spec, _ in cache.summaries():
+            if spec.get('version') != CACHE_VERSION:
+                continue  # Produced by an older model version
+            stored = cache.get(run_key(spec['params'], spec['seed'], spec['ticks'], spec['variant'],
+                                       spec['schedule']))
+            if stored is None:
+                continue
+            variant, _, engine = spec['variant'].partition('@')
+            runs.append(dict(params=spec['params'], seed=spec['seed'], ticks=spec['ticks'], data=stored.data,
+                             summary=stored.summary, variant=variant, engine=engine or 'object',
+                             schedule=spec['schedule'], experiment=experiment))
+        return self.add_many(runs)
+
+    def import_csv(self, path, params, seed=None, variant='origin', engine='object', experiment=None):
+        """
+        Imports a run saved by the scripts (a tick column and quiet/jail/active columns).
+
+        Parameters:
+        path (str): The CSV file, e.g. scripts/extension1/extension1_0.3.csv.
+        params (dict): The model parameters of the run (CSV files do not record them).
+        seed (int, optional): The seed, when known. Defaults to None.
+        variant (str, optional): The model variant. Defaults to 'origin'.
+        engine (str, optional): The engine, e.g. 'netlogo' for NetLogo exports. Defaults to 'object'.
+        experiment (str, optional): The experiment name recorded. Defaults to none.
+
+        Returns:
+        int: 1 if the run was added, 0 if the file was already imported.
+        """
+        with open(path, newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            header = next(reader)
+            columns = {index: CSV_SERIES[label.strip().lower()] for index, label in enumerate(header)
+                       if label.strip().lower() in CSV_SERIES}
+            if not columns:
+                raise ValueError(f"{path}: no quiet/jail/active column in {header}")
+            data = {series: [] for series in columns.values()}
+            for row in reader:
+                for index, series in columns.items():
+                    data[series].append(int(float(row[index])))
+        return self.add(params, seed, len(next(iter(data.values()))), data, variant=variant, engine=engine,
+                        experiment=experiment, source=os.path.abspath(path))
+
+
+def record_experiment(experiment, results, directory=None, backend='serial'):
+    """
+    Adds the runs of an executed experiment to its store, with their series when they are cached.
+
+    Parameters:
+    experiment (Experiment): The experiment.
+    results (list): The value returned by experiment.execute.
+    directory (str, optional): The store directory. Defaults to experiment.store.
+    backend (str, optional): The backend the runs were executed with. Defaults to 'serial'.
+
+    Returns:
+    int: The number of runs added.
+    """
+    engine = 'kernel' if backend == 'array' else 'object'
+    variant = experiment.variant if engine == 'object' else f'{experiment.variant}@kernel'
+    cache = RunCache(experiment.cache) if experiment.cache else None
+    store = ResultStore(directory or experiment.store)
+    try:
+        runs = []
+        for params, seed, summary in results:
+            stored = None
+            if cache is not None:
+                stored = cache.get(run_key(params, seed, experiment.ticks, variant, experiment.schedule or None))
+            runs.append(dict(params=params, seed=seed, ticks=experiment.ticks, summary=summary,
+                             data=None if stored is None else stored.data, variant=experiment.variant,
+                             engine=engine, schedule=experiment.schedule or None, experiment=experiment.name))
+        return store.add_many(runs)
+    finally:
+        store.close()
+
+
+def format_table(rows):
+    """
+    Formats query or aggregate results as an aligned text table.
+
+    Parameters:
+    rows (list): Dicts with the same keys.
+
+    Returns:
+    str: A header line and one line per row.
+    """
+    if not rows:
+        return '(no runs)'
+    names = list(rows[0])
+    cells = [names] + [[_cell(row[name]) for name in names] for row in rows]
+    widths = [max(len(line[i]) for line in cells) for i in range(len(names))]
+    return '\n'.join('  '.join(cell.rjust(width) for cell, width in zip(line, widths)) for line in cells)
+
+
+def _cell(value):
+    if isinstance(value, float):
+        return f'{value:.4g}'
+    return '' if value is None else str(value)
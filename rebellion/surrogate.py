@@ -0,0 +1,259 @@
+"""
+Gaussian-process emulator of run summaries for instant what-if queries.
+
+A full Model run takes seconds; an emulator trained on the runs already
+accumulated (e.g. in a `cache.RunCache`) answers "what would the mean active
+count be at this point?" in microseconds to milliseconds, together with a
+standard deviation telling how far the answer can be trusted. Points where
+that uncertainty is large are the ones worth simulating next (`suggest`).
+
+The emulator is a plain NumPy Gaussian process with a squared-exponential
+kernel on inputs scaled to [0, 1]. Each target gets its own lengthscale and
+noise level, chosen by maximising the marginal likelihood over a small grid;
+the noise term absorbs the seed-to-seed variation of replicate runs.
+
+Example:
+    emulator = Emulator.from_cache(RunCache('.rebellion-cache'))
+    mean, std = emulator.predict(dict(agent_density=70, cop_density=4, vision=7, k=2.3,
+                                      gov_legitimacy=0.8, max_jail_term=30))
+"""
+import numpy as np
+
+from .sensitivity import INTEGER_PARAMETERS, feasible
+
+PARAMETERS = ('agent_density', 'cop_density', 'vision', 'k', 'gov_legitimacy', 'max_jail_term')
+TARGETS = ('mean_active', 'outburst_count', 'peak_active')
+
+# Candidate hyperparameters (on unit-scaled inputs and standardised outputs)
+LENGTHSCALES = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+NOISES = (1e-4, 1e-3, 1e-2, 0.05, 0.2, 0.5)
+
+
+class _TargetProcess:
+    """The fitted Gaussian process of one target."""
+    def __init__(self, lengthscale, noise, offset, scale, points, weights, inverse):
+        self.lengthscale = lengthscale
+        self.noise = noise
+        self.offset = offset
+        self.scale = scale
+        self.points = points  # training inputs divided by the lengthscale
+        self.weights = weights  # K^-1 y
+        self.inverse = inverse  # K^-1, for the predictive variance
+
+    def predict(self, x):
+        """Predicts mean and latent standard deviation for rows of unit-scaled inputs."""
+        scaled = x / self.lengthscale
+        distances = ((scaled[:, None, :] - self.points[None, :, :]) ** 2).sum(axis=2)
+        covariance = np.exp(-0.5 * distances)
+        mean = covariance @ self.weights
+        variance = 1.0 - ((covariance @ self.inverse) * covariance).sum(axis=1)
+        std = np.sqrt(np.clip(variance, 0.0, None))
+        return mean * self.scale + self.offset, std * self.scale
+
+
+def _fit_target(x, y):
+    """Selects hyperparameters by marginal likelihood and returns the fitted process."""
+    offset = y.mean()
+    scale = y.std() or 1.0
+    z = (y - offset) / scale
+    squared = ((x[:, None, :] - x[None, :, :]) ** 2).sum(axis=2)
+    best = None
+    for lengthscale in LENGTHSCALES:
+        base = np.exp(-0.5 * squared / lengthscale ** 2)
+        for noise in NOISES:
+            try:
+                chol = np.linalg.cholesky(base + noise * np.eye(len(z)))
+            except np.linalg.LinAlgError:
+                continue
+            solved = np.linalg.solve(chol, z)
+            log_likelihood = -0.5 * solved @ solved - np.log(np.diag(chol)).sum()
+            if best is None or log_likelihood > best[0]:
+                best = (log_likelihood, lengthscale, noise, chol)
+    _, lengthscale, noise, chol = best
+    chol_inverse = np.linalg.inv(chol)
+    inverse = chol_inverse.T @ chol_inverse
+    return _TargetProcess(lengthscale, noise, offset, scale, x / lengthscale, inverse @ z, inverse)
+
+
+class Emulator:
+    """A multi-output emulator mapping Model parameters to run summaries."""
+    def __init__(self, parameters=PARAMETERS, targets=TARGETS):
+        """
+        Initializes an Emulator object.
+
+        Parameters:
+        parameters (tuple, optional): The Model constructor arguments used as inputs.
+        targets (tuple, optional): The summary metrics to emulate.
+        """
+        self.parameters = tuple(parameters)
+        self.targets = tuple(targets)
+        self.low = None
+        self.span = None
+        self.processes = {}
+        self.samples = 0
+
+    def _scale(self, x):
+        return (np.atleast_2d(np.asarray(x, dtype=float)) - self.low) / self.span
+
+    def fit(self, x, y):
+        """
+        Fits one Gaussian process per target.
+
+        Parameters:
+        x (array): Inputs, one row per run and one column per parameter.
+        y (array): Outputs, one row per run and one column per target.
+
+        Returns:
+        Emulator: The fitted emulator itself.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float).reshape(len(x), len(self.targets))
+        if len(x) < 2:
+            raise ValueError("At least two runs are needed to fit an emulator")
+        self.low = x.min(axis=0)
+        span = x.max(axis=0) - self.low
+        self.span = np.where(span > 0, span, 1.0)  # Constant inputs carry no information
+        unit = self._scale(x)
+        self.processes = {name: _fit_target(unit, y[:, i]) for i, name in enumerate(self.targets)}
+        self.samples = len(x)
+        return self
+
+    @classmethod
+    def from_runs(cls, runs, parameters=PARAMETERS, targets=TARGETS):
+        """
+        Fits an emulator to (params, summary) pairs.
+
+        Parameters:
+        runs (iterable): (params dict, summary dict) pairs; params missing an input are skipped.
+        parameters (tuple, optional): The Model constructor arguments used as inputs.
+        targets (tuple, optional): The summary metrics to emulate.
+
+        Returns:
+        Emulator: The fitted emulator.
+        """
+        x, y = [], []
+        for params, summary in runs:
+            if all(name in params for name in parameters) and all(name in summary for name in targets):
+                x.append([params[name] for name in parameters])
+                y.append([summary[name] for name in targets])
+        return cls(parameters, targets).fit(x, y)
+
+    @classmethod
+    def from_cache(cls, cache, variant='origin', parameters=PARAMETERS, targets=TARGETS):
+        """
+        Fits an emulator to every run of one variant stored in a RunCache.
+
+        Parameters:
+        cache (RunCache): The cache holding the runs.
+        variant (str, optional): Only runs of this variant are used. Defaults to 'origin'.
+        parameters (tuple, optional): The Model constructor arguments used as inputs.
+        targets (tuple, optional): The summary metrics to emulate.
+
+        Returns:
+        Emulator: The fitted emulator.
+        """
+        runs = ((spec['params'], summary) for spec, summary in cache.summaries()
+                if spec['variant'] == variant)
+        return cls.from_runs(runs, parameters, targets)
+
+    def _rows(self, points):
+        if isinstance(points, dict):
+            points = [points]
+        if isinstance(points, (list, tuple)) and points and isinstance(points[0], dict):
+            points = [[point[name] for name in self.parameters] for point in points]
+        return self._scale(points)
+
+    def predict(self, point):
+        """
+        Predicts the targets at one parameter point.
+
+        Parameters:
+        point (dict): Maps each input parameter to its value.
+
+        Returns:
+        tuple: (mean dict, standard deviation dict), keyed by target.
+        """
+        unit = self._rows(point)
+        mean, std = {}, {}
+        for name, process in self.processes.items():
+            m, s = process.predict(unit)
+            mean[name], std[name] = float(m[0]), float(s[0])
+        return mean, std
+
+    def predict_many(self, points):
+        """
+        Predicts the targets at many points at once.
+
+        Parameters:
+        points (list or array): Parameter dicts, or rows ordered like `parameters`.
+
+        Returns:
+        tuple: (mean dict, standard deviation dict) of arrays, keyed by target.
+        """
+        unit = self._rows(points)
+        mean, std = {}, {}
+        for name, process in self.processes.items():
+            mean[name], std[name] = process.predict(unit)
+        return mean, std
+
+    def uncertainty(self, points):
+        """
+        Returns the largest relative uncertainty over the targets at each point.
+
+        The standard deviation of each target is divided by that target's
+        standard deviation in the training data, so 1 means "no better than
+        knowing nothing about this point".
+
+        Parameters:
+        points (list or array): Parameter dicts, or rows ordered like `parameters`.
+
+        Returns:
+        array: One relative uncertainty per point.
+        """
+        _, std = self.predict_many(points)
+        relative = [std[name] / self.processes[name].scale for name in self.targets]
+        return np.max(relative, axis=0)
+
+    def needs_simulation(self, point, tolerance=0.25):
+        """
+        Returns whether the emulator is too uncertain at a point to be trusted.
+
+        Parameters:
+        point (dict): Maps each input parameter to its value.
+        tolerance (float, optional): The acceptable relative uncertainty. Defaults to 0.25.
+
+        Returns:
+        bool: True if the point should be simulated.
+        """
+        return bool(self.uncertainty(point)[0] > tolerance)
+
+    def suggest(self, bounds, n=10, candidates=4096, seed=None, integer=INTEGER_PARAMETERS, base_params=None):
+        """
+        Proposes the most uncertain points within a box as the next runs.
+
+        Candidates are rounded before they are scored, and candidates the Model cannot run
+        (agent_density + cop_density above 100%) are dropped, so every suggestion can be run as it is.
+
+        Parameters:
+        bounds (dict): Maps each input parameter to a (low, high) pair.
+        n (int, optional): The number of points to return. Defaults to 10.
+        candidates (int, optional): The number of random candidates scored. Defaults to 4096.
+        seed (int, optional): Seed of the candidate generator. Defaults to None.
+        integer (tuple, optional): Parameters rounded to whole numbers. Defaults to INTEGER_PARAMETERS.
+        base_params (dict, optional): The values of Model parameters that are not inputs, used for the
+            feasibility check. Defaults to None.
+
+        Returns:
+        list: Parameter dicts, most uncertain first; fewer than n if the box holds fewer feasible points.
+        """
+        rng = np.random.default_rng(seed)
+        low = np.array([bounds[name][0] for name in self.parameters], dtype=float)
+        high = np.array([bounds[name][1] for name in self.parameters], dtype=float)
+        rows = low + rng.random((candidates, len(low))) * (high - low)
+        rounded = [i for i, name in enumerate(self.parameters) if name in integer]
+        rows[:, rounded] = np.floor(rows[:, rounded] + 0.5)
+        rows = np.unique(rows, axis=0)
+        rows = rows[feasible(rows, self.parameters, base_params)]
+        order = np.argsort(-self.uncertainty(rows))[:n]
+        return [{name: int(value) if i in rounded else value
+                 for i, (name, value) in enumerate(zip(self.parameters, rows[j].tolist()))} for j in order]
@@ -0,0 +1,234 @@
+"""
+Adaptive one-parameter sweeps that spend runs where the behaviour changes.
+
+`scripts/extension1/extension1.py` sweeps neighbor_influence_percentage on a
+fixed 0.1 grid, and extension2 shows an outburst that appears suddenly once
+the cop count drops below a threshold. A dense grid wastes most of its runs
+on the flat parts of such curves. `AdaptiveSweep` runs a coarse grid first,
+then repeatedly bisects the intervals over which the outburst metrics change
+the most (relative to their overall range), so the sampled points cluster
+around tipping points.
+
+Every (parameter values, seed, ticks) run is memoised in `cache`, so
+refinement rounds and later sweeps over overlapping ranges reuse prior runs.
+Pass a `cache.RunCache` to keep those runs on disk between sessions.
+
+Example:
+    sweep = AdaptiveSweep('cop_density', 1, 15, dict(agent_density=70, vision=7, k=2.3,
+                          gov_legitimacy=0.82, max_jail_term=30), seeds=range(3))
+    sweep.run(max_points=15)
+    sweep.steepest('peak_active')
+"""
+import functools
+
+from .cache import RunCache, run_key
+from .metrics import summarize
+from .model import Model
+
+
+def run_point(params, seed, ticks, rules='origin'):
+    """
+    Runs the model once and summarises the result.
+
+    Parameters:
+    params (dict): Keyword arguments of the Model constructor (without the seed).
+    seed (int): The seed of the run.
+    ticks (int): The number of steps to run.
+    rules (str, optional): The model variant (see rebellion.rules.VARIANTS). Defaults to 'origin'.
+
+    Returns:
+    dict: The summary metrics of the run (see `metrics.summarize`).
+    """
+    model = Model(**params, seed=seed, rules=rules)
+    return summarize(model.run(ticks))
+
+
+class AdaptiveSweep:
+    """A coarse-to-fine sweep of one Model parameter."""
+    def __init__(self, parameter, low, high, base_params, ticks=200, seeds=(0,), coarse_points=5,
+                 metrics=('peak_active', 'time_to_first_outburst'), min_step=None, integer=False,
+                 cache=None, run=None, variant='origin'):
+        """
+        Initializes an AdaptiveSweep object.
+
+        Parameters:
+        parameter (str): The name of the swept Model constructor argument.
+        low (float): The lower end of the swept range.
+        high (float): The upper end of the swept range.
+        base_params (dict): The values of the other constructor arguments.
+        ticks (int, optional): The number of steps per run. Defaults to 200.
+        seeds (iterable, optional): The replicate seeds run at every point. Defaults to (0,).
+        coarse_points (int, optional): The number of points of the initial grid. Defaults to 5.
+        metrics (tuple, optional): The metrics whose change drives refinement.
+        min_step (float, optional): Intervals narrower than this are not split. Defaults to 1/64 of the range.
+        integer (bool, optional): Whether the parameter only takes integer values. Defaults to False.
+        cache (dict or RunCache, optional): Memoises runs; pass one in to share it between sweeps.
+            A RunCache stores the full series of each run and ignores `run`.
+        run (callable, optional): The function (params, seed, ticks) -> metrics dict; it must run
+            `variant`. Defaults to run_point with the rules of `variant`.
+        variant (str, optional): The model variant (see rebellion.rules.VARIANTS); part of every
+            cache key. Defaults to 'origin'.
+        """
+        if high <= low:
+            raise ValueError("high must be greater than low")
+        if coarse_points < 2:
+            raise ValueError("coarse_points must be at least 2")
+        self.parameter = parameter
+        self.low = low
+        self.high = high
+        self.base_params = dict(base_params)
+        self.ticks = ticks
+        self.seeds = list(seeds)
+        self.coarse_points = coarse_points
+        self.metrics = tuple(metrics)
+        self.min_step = min_step if min_step is not None else (high - low) / 64
+        self.integer = integer
+        self.cache = cache if cache is not None else {}
+        self.variant = variant
+        self.run_function = run if run is not None else functools.partial(run_point, rules=variant)
+        self.results = {}  # value -> mean metrics over seeds
+        self.runs_executed = 0
+
+    def evaluate(self, value):
+        """
+        Returns the seed-averaged metrics at one parameter value, running only uncached seeds.
+
+        Parameters:
+        value (float): The value of the swept parameter.
+
+        Returns:
+        dict: Maps each metric name to its mean over the seeds.
+        """
+        if value in self.results:
+            return self.results[value]
+        params = dict(self.base_params, **{self.parameter: value})
+        per_seed = []
+        for seed in self.seeds:
+            if isinstance(self.cache, RunCache):
+                if run_key(params, seed, self.ticks, self.variant) not in self.cache:
+                    self.runs_executed += 1
+                per_seed.append(self.cache.get_or_run(params, seed, self.ticks, self.variant).summary)
+                continue
+            key = (self.variant, tuple(sorted(params.items())), seed, self.ticks)
+            if key not in self.cache:
+                self.cache[key] = self.run_function(params, seed, self.ticks)
+                self.runs_executed += 1
+            per_seed.append(self.cache[key])
+        means = {name: sum(run[name] for run in per_seed) / len(per_seed) for name in per_seed[0]}
+        self.results[value] = means
+        return means
+
+    def coarse_grid(self):
+        """
+        Returns the values of the initial evenly spaced grid.
+
+        Returns:
+        list: The coarse grid, including both ends of the range.
+        """
+        step = (self.high - self.low) / (self.coarse_points - 1)
+        values = [self.low + i * step for i in range(self.coarse_points)]
+        if self.integer:
+            values = sorted(set(round(value) for value in values))
+        return values
+
+    def interval_scores(self):
+        """
+        Scores every interval between neighbouring evaluated points.
+
+        The score of an interval is the largest change of any refinement metric
+        across it, divided by that metric's range over all points, so 1 means
+        the whole variation of some metric happens inside the interval.
+
+        Returns:
+        list: (score, left value, right value) tuples in ascending value order.
+        """
+        values = sorted(self.results)
+        spans = {}
+        for name in self.metrics:
+            observed = [self.results[value][name] for value in values]
+            spans[name] = max(observed) - min(observed)
+        scores = []
+        for left, right in zip(values, values[1:]):
+            score = 0.0
+            for name in self.metrics:
+                if spans[name] > 0:
+                    change = abs(self.results[right][name] - self.results[left][name])
+                    score = max(score, change / spans[name])
+            scores.append((score, left, right))
+        return scores
+
+    def _midpoint(self, left, right):
+        if self.integer:
+            middle = (left + right) // 2
+            return middle if left < middle < right else None
+        if right - left < 2 * self.min_step:
+            return None
+        return (left + right) / 2
+
+    def refine(self, per_round=2, tolerance=0.05):
+        """
+        Splits the highest-scoring intervals once.
+
+        Parameters:
+        per_round (int, optional): The maximum number of intervals split. Defaults to 2.
+        tolerance (float, optional): Intervals scoring below this are left alone. Defaults to 0.05.
+
+        Returns:
+        list: The newly evaluated parameter values (empty when nothing is left to refine).
+        """
+        added = []
+        for score, left, right in sorted(self.interval_scores(), reverse=True):
+            if len(added) == per_round or score < tolerance:
+                break
+            middle = self._midpoint(left, right)
+            if middle is not None and middle not in self.results:
+                self.evaluate(middle)
+                added.append(middle)
+        return added
+
+    def run(self, max_points=20, per_round=2, tolerance=0.05):
+        """
+        Runs the coarse grid and then refines until the point budget is spent.
+
+        Parameters:
+        max_points (int, optional): The maximum number of evaluated parameter values. Defaults to 20.
+        per_round (int, optional): The number of intervals split per round. Defaults to 2.
+        tolerance (float, optional): The minimum interval score worth refining. Defaults to 0.05.
+
+        Returns:
+        list: (value, metrics) pairs sorted by value.
+        """
+        for value in self.coarse_grid():
+            self.evaluate(value)
+        while len(self.results) < max_points:
+            if not self.refine(min(per_round, max_points - len(self.results)), tolerance):
+                break
+        return self.points()
+
+    def points(self):
+        """
+        Returns the evaluated points.
+
+        Returns:
+        list: (value, metrics) pairs sorted by value.
+        """
+        return [(value, self.results[value]) for value in sorted(self.results)]
+
+    def steepest(self, metric=None):
+        """
+        Returns the interval over which a metric changes the most.
+
+        Parameters:
+        metric (str, optional): The metric to inspect. Defaults to the combined refinement score.
+
+        Returns:
+        tuple: (left value, right value) of the steepest interval, or None before any run.
+        """
+        if len(self.results) < 2:
+            return None
+        if metric is None:
+            _, left, right = max(self.interval_scores())
+            return left, right
+        values = sorted(self.results)
+        pairs = zip(values, values[1:])
+        return max(pairs, key=lambda pair: abs(self.results[pair[1]][metric] - self.results[pair[0]][metric]))
@@ -0,0 +1,381 @@
+"""
+Compact binary traces of a run's full spatial history.
+
+The `data` dict of a run only keeps aggregate counts. A trace additionally
+stores, for every recorded tick, the occupant of each cell and the position
+and status of each turtle, so rebellion waves, cop clustering and the like
+can be analysed (or replayed) afterwards.
+
+The grid is mostly implied by the turtles: every free turtle occupies its
+own cell. It is therefore stored as the XOR with the grid rebuilt from the
+positions, which is zero except where a jailed agent is still referenced.
+Frames are delta-encoded: every `keyframe_interval`-th frame is stored whole
+and the frames in between as the XOR with their predecessor. Each frame is
+compressed with zlib. The file ends with an index of (tick, offset,
+keyframe) rows, so a reader seeks to the keyframe preceding any tick and
+decodes at most `keyframe_interval` frames to reach it. A trace whose writer
+was killed before writing the index is still readable: the reader rebuilds
+the index by scanning the frame headers.
+
+Layout (little endian)::
+
+    b'RBTRACE\\x01'  uint32 header length  header JSON
+    frame*:         uint32 tick  uint8 flags  uint32 length  zlib payload
+    index:          int64[frames, 3] (tick, offset, flags)
+    trailer:        uint64 index offset  uint64 frames  b'RBTRIDX\\x01'
+
+Example:
+    model = Model(70, 4, 7, 2.3, 0.82, 30, seed=1)
+    with TraceRecorder('run.trace', model) as recorder:
+        for _ in range(1000):
+            model.step()
+            recorder.record()
+    trace = TraceReader('run.trace')
+    for tick, frame in trace.frames(500, 600):
+        frame['grid'], frame['status']
+"""
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from .model import EntityType
+
+MAGIC = b'RBTRACE\x01'
+INDEX_MAGIC = b'RBTRIDX\x01'
+# 2: removed turtles have status REMOVED and are left out of the implied grid
+FORMAT_VERSION = 2
+KEYFRAME = 1
+
+# Turtle status codes of a frame's 'status' field
+QUIET = 0
+ACTIVE = 1
+JAILED = 2
+COP = 3
+REMOVED = 4  # A turtle taken out of the model (extension2 cops); it keeps its index
+EMPTY = -1
+
+_FRAME_HEADER = struct.Struct('<IBI')
+_TRAILER = struct.Struct('<QQ8s')
+
+
+def snapshot(model):
+    """
+    Captures the spatial state of a model.
+
+    Works with rebellion.model.Model and rebellion.kernel.KernelModel; cells are
+    numbered x * height + y and turtles by their index (agents first, then cops).
+
+    Parameters:
+    model (object): The model.
+
+    Returns:
+    dict: 'grid' (int16 occupant per cell, -1 if empty), 'position' (int16 cell per turtle)
+        and 'status' (uint8 QUIET/ACTIVE/JAILED/COP/REMOVED per turtle).
+    """
+    if hasattr(model, 'entities'):
+        height = model.height
+        grid = np.array([[EMPTY if cell is None else cell.agent_id for cell in column] for column in model.grid],
+                        dtype=np.int16).ravel()
+        entities = model.entities
+        position = np.array([x * height + y for x, y in (entity.position for entity in entities)], dtype=np.int16)
+        status = np.array([REMOVED if entity.removed else COP if entity.type is EntityType.COP
+                           else JAILED if entity.jail_term > 0 else ACTIVE if entity.active else QUIET
+                           for entity in entities], dtype=np.uint8)
+    else:
+        grid = model.grid.astype(np.int16)
+        position = model.position.astype(np.int16)
+        present = np.zeros(len(model.is_cop), dtype=bool)
+        present[model.order] = True
+        status = np.where(~present, REMOVED, np.where(model.is_cop, COP, np.where(
+            model.jail_term > 0, JAILED, np.where(model.active, ACTIVE, QUIET)))).astype(np.uint8)
+    return {'grid': grid, 'position': position, 'status': status}
+
+
+def implied_grid(position, status, cells):
+    """
+    Rebuilds the grid from the positions of the free turtles (neither jailed nor removed).
+
+    Parameters:
+    position (array): The cell of every turtle.
+    status (array): The status of every turtle.
+    cells (int): The number of cells.
+
+    Returns:
+    array: int16 occupant per cell, -1 where no free turtle stands.
+    """
+    grid = np.full(cells, EMPTY, dtype=np.int16)
+    free = np.flatnonzero((status != JAILED) & (status != REMOVED))
+    grid[position[free]] = free
+    return grid
+
+
+class TraceRecorder:
+    """Appends frames of a running model to a trace file."""
+    def __init__(self, path, model, keyframe_interval=64, level=6, metadata=None, record_initial=True):
+        """
+        Initializes a TraceRecorder object and writes the header.
+
+        Parameters:
+        path (str): The trace file; overwritten if it exists.
+        model (object): The Model or KernelModel to record.
+        keyframe_interval (int, optional): Frames between two whole frames. Defaults to 64.
+        level (int, optional): The zlib compression level. Defaults to 6.
+        metadata (dict, optional): JSON-serialisable information stored in the header
+            (e.g. parameters and seed). Defaults to None.
+        record_initial (bool, optional): Record the state before the next step right away. Defaults to True.
+        """
+        if keyframe_interval < 1:
+            raise ValueError(f"keyframe_interval should be at least 1, got {keyframe_interval}")
+        self.path = path
+        self.model = model
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.index = []
+        self.previous = None
+        first = snapshot(model)
+        # The grid goes last so readers can rebuild it from the decoded turtles
+        self.fields = [(name, str(first[name].dtype), len(first[name])) for name in ('position', 'status', 'grid')]
+        header = json.dumps({
+            'version': FORMAT_VERSION,
+            'width': model.width,
+            'height': model.height,
+            'num_agents': sum(1 for entity in model.entities if entity.type is EntityType.AGENT)
+            if hasattr(model, 'entities') else model.num_agents,
+            'fields': self.fields,
+            'keyframe_interval': keyframe_interval,
+            'metadata': metadata or {},
+        }).encode('utf-8')
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC + struct.pack('<I', len(header)) + header)
+        if record_initial:
+            self.record(first)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def record(self, state=None, tick=None):
+        """
+        Appends the model's current state as a frame.
+
+        Parameters:
+        state (dict, optional): A snapshot to store instead of capturing the model. Defaults to None.
+        tick (int, optional): The frame's tick. Defaults to the number of steps the model has run.
+        """
+        if state is None:
+            state = snapshot(self.model)
+        if tick is None:
+            tick = len(self.model.data['active'])
+        if self.index and tick <= self.index[-1][0]:
+            raise ValueError(f"Ticks must increase; got {tick} after {self.index[-1][0]}")
+        residual = state['grid'] ^ implied_grid(state['position'], state['status'], len(state['grid']))
+        state = dict(state, grid=residual)
+        raw = np.concatenate([state[name].astype(dtype, copy=False).view(np.uint8)
+                              for name, dtype, _ in self.fields])
+        keyframe = self.previous is None or len(self.index) % self.keyframe_interval == 0
+        payload = raw if keyframe else raw ^ self.previous
+        self.previous = raw
+        compressed = zlib.compress(payload.tobytes(), self.level)
+        flags = KEYFRAME if keyframe else 0
+        self.index.append((tick, self.file.tell(), flags))
+        self.file.write(_FRAME_HEADER.pack(tick, flags, len(compressed)))
+        self.file.write(compressed)
+
+    def close(self):
+        """
+        Writes the tick index and closes the file.
+        """
+        if self.file.closed:
+            return
+        offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype='<i8').reshape(-1, 3).tobytes())
+        self.file.write(_TRAILER.pack(offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+
+
+class TraceReader:
+    """Random access to the frames of a trace file."""
+    def __init__(self, path):
+        """
+        Initializes a TraceReader object by reading the header and the tick index.
+
+        Parameters:
+        path (str): The trace file.
+        """
+        self.path = path
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a rebellion trace")
+        (length,) = struct.unpack('<I', self.file.read(4))
+        self.header = json.loads(self.file.read(length).decode('utf-8'))
+        self.frames_offset = len(MAGIC) + 4 + length
+        self.width = self.header['width']
+        self.height = self.header['height']
+        self.num_agents = self.header['num_agents']
+        self.metadata = self.header['metadata']
+        self.fields = [(name, np.dtype(dtype), size) for name, dtype, size in self.header['fields']]
+        self.frame_size = sum(dtype.itemsize * size for _, dtype, size in self.fields)
+        self.index = self._read_index()
+        self.ticks = self.index[:, 0]
+        self._cache = None  # (row, raw) of the last decoded frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        """
+        Closes the file.
+        """
+        self.file.close()
+
+    def _read_index(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if size >= self.frames_offset + _TRAILER.size:
+            self.file.seek(size - _TRAILER.size)
+            offset, count, magic = _TRAILER.unpack(self.file.read(_TRAILER.size))
+            if magic == INDEX_MAGIC:
+                self.file.seek(offset)
+                return np.frombuffer(self.file.read(count * 24), dtype='<i8').reshape(count, 3)
+        # No index (the writer did not finish): scan the frame headers, dropping a truncated last frame
+        rows = []
+        offset = self.frames_offset
+        while offset + _FRAME_HEADER.size <= size:
+            self.file.seek(offset)
+            tick, flags, length = _FRAME_HEADER.unpack(self.file.read(_FRAME_HEADER.size))
+            if offset + _FRAME_HEADER.size + length > size:
+                break
+            rows.append((tick, offset, flags))
+            offset += _FRAME_HEADER.size + length
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    def _payload(self, row):
+        _, offset, _ = self.index[row]
+        self.file.seek(int(offset))
+        _, _, length = _FRAME_HEADER.unpack(self.file.read(_FRAME_HEADER.size))
+        return np.frombuffer(zlib.decompress(self.file.read(length)), dtype=np.uint8)
+
+    def _raw(self, row):
+        # Continue from the last decoded frame when it lies between the keyframe and the target
+        start = row
+        while not self.index[start, 2] & KEYFRAME:
+            start -= 1
+        if self._cache is not None and start <= self._cache[0] <= row:
+            start, raw = self._cache
+        else:
+            raw = self._payload(start)
+        for following in range(start + 1, row + 1):
+            raw = raw ^ self._payload(following)
+        self._cache = (row, raw)
+        return raw
+
+    def _split(self, raw):
+        frame = {}
+        offset = 0
+        for name, dtype, size in self.fields:
+            nbytes = dtype.itemsize * size
+            frame[name] = raw[offset:offset + nbytes].view(dtype)
+            offset += nbytes
+        frame['grid'] = frame['grid'] ^ implied_grid(frame['position'], frame['status'], len(frame['grid']))
+        return frame
+
+    def row(self, tick):
+        """
+        Finds the position of a tick in the index.
+
+        Parameters:
+        tick (int): The tick.
+
+        Returns:
+        int: The frame number.
+        """
+        row = int(np.searchsorted(self.ticks, tick))
+        if row >= len(self.ticks) or self.ticks[row] != tick:
+            raise KeyError(f"Tick {tick} is not in the trace")
+        return row
+
+    def frame(self, tick):
+        """
+        Decodes the frame of one tick.
+
+        Parameters:
+        tick (int): The tick (the number of steps run when the frame was recorded).
+
+        Returns:
+        dict: 'grid', 'position' and 'status' arrays (see snapshot).
+        """
+        return self._split(self._raw(self.row(tick)))
+
+    def frames(self, start=None, stop=None, step=1):
+        """
+        Decodes a range of frames, reading only from the keyframe preceding `start`.
+
+        Parameters:
+        start (int, optional): The first tick. Defaults to the first recorded tick.
+        stop (int, optional): The tick to stop before. Defaults to past the last recorded tick.
+        step (int, optional): Yield every step-th frame of the range. Defaults to 1.
+
+        Returns:
+        generator: (tick, frame dict) pairs.
+        """
+        first = 0 if start is None else int(np.searchsorted(self.ticks, start))
+        last = len(self.ticks) if stop is None else int(np.searchsorted(self.ticks, stop))
+        for row in range(first, last, step):
+            yield int(self.ticks[row]), self._split(self._raw(row))
+
+    def status_grid(self, frame):
+        """
+        Maps a frame's occupants to their status.
+
+        Parameters:
+        frame (dict): A decoded frame.
+
+        Returns:
+        array: Shape (width, height) of status codes, EMPTY (-1) for empty cells.
+        """
+        grid = frame['grid']
+        codes = np.where(grid >= 0, frame['status'][np.maximum(grid, 0)].astype(np.int8), EMPTY)
+        return codes.reshape(self.width, self.height)
+
+
+def record_run(params, seed, ticks, path, engine='object', schedule=(), every=1, **options):
+    """
+    Runs a model and records its trace.
+
+    Parameters:
+    params (dict): Keyword arguments of the model constructor (without the seed).
+    seed (int): The seed of the run.
+    ticks (int): The number of steps.
+    path (str): The trace file.
+    engine (str, optional): 'object' (rebellion.model) or 'kernel' (rebellion.kernel). Defaults to 'object'.
+    schedule (list, optional): Experiment schedule entries applied between steps. Defaults to none.
+    every (int, optional): Record every every-th tick. Defaults to 1.
+    **options: Passed to TraceRecorder (keyframe_interval, level).
+
+    Returns:
+    dict: The run's 'quiet', 'jail' and 'active' series.
+    """
+    from .experiment import apply_schedule
+    if engine == 'kernel':
+        from .kernel import KernelModel as engine_class
+    else:
+        from .model import Model as engine_class
+    model = engine_class(**params, seed=seed)
+    metadata = {'params': params, 'seed': seed, 'engine': engine, 'schedule': list(schedule)}
+    with TraceRecorder(path, model, metadata=metadata, **options) as recorder:
+        for tick in range(ticks):
+            apply_schedule(model, schedule, tick)
+            model.step()
+            if (tick + 1) % every == 0:
+                recorder.record()
+    return model.data
@@ -1,7 +1,7 @@
+# Deprecated: this copy is the rep1 variant of rebellion.rules with legitimacy_drop(80, 0.65) (see rebellion.rules)
 import csv
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import Enum
 
 
@@ -177,31 +177,32 @@ class Model:
             cop.position = (nx, ny)
 
 
-# 实例化并运行模型
-AGENT_DENSITY = 70
-COP_DENSITY = 7.4
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.9
-MAX_JAIL_TERM = 30
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(200):
-    model.step()
-
-# 将数据导出到 CSV 文件
-with open('agent_status.csv', 'w', newline='') as csvfile:
-    fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-
-    writer.writeheader()
-    for i in range(len(model.data['quiet'])):
-        writer.writerow({
-            'Time Step': i,
-            'Quiet Agents': model.data['quiet'][i],
-            'Jailed Agents': model.data['jail'][i],
-            'Active Agents': model.data['active'][i]
-        })
-
-print("CSV 文件已生成。")
+if __name__ == '__main__':
+    # 实例化并运行模型
+    AGENT_DENSITY = 70
+    COP_DENSITY = 7.4
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.9
+    MAX_JAIL_TERM = 30
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(200):
+        model.step()
+
+    # 将数据导出到 CSV 文件
+    with open('agent_status.csv', 'w', newline='') as csvfile:
+        fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+
+        writer.writeheader()
+        for i in range(len(model.data['quiet'])):
+            writer.writerow({
+                'Time Step': i,
+                'Quiet Agents': model.data['quiet'][i],
+                'Jailed Agents': model.data['jail'][i],
+                'Active Agents': model.data['active'][i]
+            })
+
+    print("CSV 文件已生成。")
 
 
@@ -262,10 +262,11 @@ def run_experiment(neighbor_influence_percentage):
                              'active': model.data['active'][t]})
 
 
-# Experiment
-# Experiment parameters
-neighbor_influence_percentages = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
+if __name__ == '__main__':
+    # Experiment
+    # Experiment parameters
+    neighbor_influence_percentages = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
 
-# Run experiments
-for nip in neighbor_influence_percentages:
-    run_experiment(nip)
+    # Run experiments
+    for nip in neighbor_influence_percentages:
+        run_experiment(nip)
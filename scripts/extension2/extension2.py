@@ -234,33 +234,34 @@ class Model:
             cop.position = (nx, ny)
 
 
-# Model parameters
-AGENT_DENSITY = 50
-COP_DENSITY = 15
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.20
-MAX_JAIL_TERM = 30
+if __name__ == '__main__':
+    # Model parameters
+    AGENT_DENSITY = 50
+    COP_DENSITY = 15
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.20
+    MAX_JAIL_TERM = 30
 
-# Instantiate the model and run for 500 time steps
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(500):
-    model.step()
+    # Instantiate the model and run for 500 time steps
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(500):
+        model.step()
 
 
-# Export data to CSV file
-with open('extension2.py.csv', 'w', newline='') as csvfile:
-    fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents',"Cops"]
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    # Export data to CSV file
+    with open('extension2.py.csv', 'w', newline='') as csvfile:
+        fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents',"Cops"]
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-    writer.writeheader()
-    for i in range(len(model.data['cop'])):
-        writer.writerow({
-            'Time Step': i,
-            'Quiet Agents': model.data['quiet'][i],
-            'Jailed Agents': model.data['jail'][i],
-            'Active Agents': model.data['active'][i],
-            'Cops': model.data['cop'][i]
-        })
-              
-print("CSV generated successfully!")
+        writer.writeheader()
+        for i in range(len(model.data['cop'])):
+            writer.writerow({
+                'Time Step': i,
+                'Quiet Agents': model.data['quiet'][i],
+                'Jailed Agents': model.data['jail'][i],
+                'Active Agents': model.data['active'][i],
+                'Cops': model.data['cop'][i]
+            })
+                  
+    print("CSV generated successfully!")
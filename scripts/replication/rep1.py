@@ -226,31 +226,32 @@ class Model:
             cop.position = (nx, ny)
 
 
-# Model parameters
-AGENT_DENSITY = 70
-COP_DENSITY = 7.4
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.9
-MAX_JAIL_TERM = 30
+if __name__ == '__main__':
+    # Model parameters
+    AGENT_DENSITY = 70
+    COP_DENSITY = 7.4
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.9
+    MAX_JAIL_TERM = 30
 
-# Instantiate the model and run for 200 time steps
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(200):
-    model.step()
+    # Instantiate the model and run for 200 time steps
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(200):
+        model.step()
 
-# Export data to CSV file
-with open('rep1.py.csv', 'w', newline='') as csvfile:
-    fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents']
-    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+    # Export data to CSV file
+    with open('rep1.py.csv', 'w', newline='') as csvfile:
+        fieldnames = ['Time Step', 'Quiet Agents', 'Jailed Agents', 'Active Agents']
+        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
 
-    writer.writeheader()
-    for i in range(len(model.data['quiet'])):
-        writer.writerow({
-            'Time Step': i,
-            'Quiet Agents': model.data['quiet'][i],
-            'Jailed Agents': model.data['jail'][i],
-            'Active Agents': model.data['active'][i]
-        })
-              
-print("CSV generated successfully!")
+        writer.writeheader()
+        for i in range(len(model.data['quiet'])):
+            writer.writerow({
+                'Time Step': i,
+                'Quiet Agents': model.data['quiet'][i],
+                'Jailed Agents': model.data['jail'][i],
+                'Active Agents': model.data['active'][i]
+            })
+                  
+    print("CSV generated successfully!")
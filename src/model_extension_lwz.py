@@ -1,6 +1,5 @@
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import Enum
 
 
@@ -168,26 +167,27 @@ class Model:
         
 
 
-# 实例化并运行模型
-AGENT_DENSITY = 70
-COP_DENSITY = 3
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.3
-MAX_JAIL_TERM = 30
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(200):
-    model.step()
-
-# 绘制结果
-plt.figure(figsize=(10, 6))
-plt.plot(model.data['quiet'], label='Quiet Agents')
-plt.plot(model.data['jail'], label='Jailed Agents')
-plt.plot(model.data['active'], label='Active Agents')
-plt.xlabel('Time Steps')
-plt.ylabel('Number of Agents')
-plt.title('Agent Status Over Time')
-plt.legend()
-plt.show()
-
-
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    # 实例化并运行模型
+    AGENT_DENSITY = 70
+    COP_DENSITY = 3
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.3
+    MAX_JAIL_TERM = 30
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(200):
+        model.step()
+
+    # 绘制结果
+    plt.figure(figsize=(10, 6))
+    plt.plot(model.data['quiet'], label='Quiet Agents')
+    plt.plot(model.data['jail'], label='Jailed Agents')
+    plt.plot(model.data['active'], label='Active Agents')
+    plt.xlabel('Time Steps')
+    plt.ylabel('Number of Agents')
+    plt.title('Agent Status Over Time')
+    plt.legend()
+    plt.show()
@@ -1,6 +1,5 @@
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import Enum
 
 
@@ -159,24 +158,27 @@ class Model:
                 break  # Assume each cop can arrest only one agent per step
 
 
-# 实例化并运行模型
-AGENT_DENSITY = 70
-COP_DENSITY = 7
-VISION = 7
-K = 2.3
-GOV_LEGITIMACY = 0.76
-MAX_JAIL_TERM = 30
-model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
-for _ in range(300):
-    model.step()
-
-# 绘制结果
-plt.figure(figsize=(10, 6))
-plt.plot(model.data['quiet'], label='Quiet Agents')
-plt.plot(model.data['jail'], label='Jailed Agents')
-plt.plot(model.data['active'], label='Active Agents')
-plt.xlabel('Time Steps')
-plt.ylabel('Number of Agents')
-plt.title('Agent Status Over Time')
-plt.legend()
-plt.show()
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    # 实例化并运行模型
+    AGENT_DENSITY = 70
+    COP_DENSITY = 7
+    VISION = 7
+    K = 2.3
+    GOV_LEGITIMACY = 0.76
+    MAX_JAIL_TERM = 30
+    model = Model(AGENT_DENSITY, COP_DENSITY, VISION, K, GOV_LEGITIMACY, MAX_JAIL_TERM)
+    for _ in range(300):
+        model.step()
+
+    # 绘制结果
+    plt.figure(figsize=(10, 6))
+    plt.plot(model.data['quiet'], label='Quiet Agents')
+    plt.plot(model.data['jail'], label='Jailed Agents')
+    plt.plot(model.data['active'], label='Active Agents')
+    plt.xlabel('Time Steps')
+    plt.ylabel('Number of Agents')
+    plt.title('Agent Status Over Time')
+    plt.legend()
+    plt.show()
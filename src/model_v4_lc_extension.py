@@ -1,7 +1,7 @@
+# Deprecated: this copy is a variant of rebellion.rules; use rebellion.model.Model(..., rules='extension1')
 # 添加了扩展，增加了一个neighborhood的不满程度可以影响到个人的不满程度。可以通过调节社会不满程度 的百分比来调节
 import random
 import math
-import matplotlib.pyplot as plt
 from enum import Enum
 
 
@@ -192,6 +192,8 @@ class Model:
 
 
 def run_experiment(neighbor_influence_percentage):
+    import matplotlib.pyplot as plt
+
     # 假设 Model 类和其他相关设置已经按照前面的讨论正确配置
     model = Model(
         agent_density=70,
@@ -219,10 +221,9 @@ def run_experiment(neighbor_influence_percentage):
     plt.close()  # 关闭图形窗口以释放资源
 
 
-# 实验参数
-neighbor_influence_percentages = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
-# 运行实验
-for nip in neighbor_influence_percentages:
-    run_experiment(nip)
-
-
+if __name__ == '__main__':
+    # 实验参数
+    neighbor_influence_percentages = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1]
+    # 运行实验
+    for nip in neighbor_influence_percentages:
+        run_experiment(nip)
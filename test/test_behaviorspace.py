@@ -0,0 +1,95 @@
+"""
+Regression checks of rebellion.behaviorspace (run with `python -m pytest test` from the repository root).
+"""
+import os
+
+import numpy as np
+import pytest
+
+from rebellion.behaviorspace import read_behaviorspace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TABLE = '''"BehaviorSpace results (NetLogo 6.3.0)","Table version 2.0"
+"Rebellion.nlogo"
+"experiment"
+"10/19/2026 10:00:00:000 +0000"
+"min-pxcor","max-pxcor","min-pycor","max-pycor"
+"-20","19","-20","19"
+"[run number]","government-legitimacy","visualize","[step]","count agents with [active?]","label"
+"1","0.9","true","0","0","a"
+"1","0.9","true","1","3.5","b"
+"2","0.8","false","0","2","c"
+'''
+
+# Two runs side by side; the second is one step shorter and leaves empty cells
+SPREADSHEET = '''"BehaviorSpace results (NetLogo 6.4.0)","Spreadsheet version 2.0"
+"Rebellion.nlogo"
+"exp"
+"05/13/2024 22:51:23:628 +1000"
+"min-pxcor","max-pxcor","min-pycor","max-pycor"
+"0","39","0","39"
+"[run number]","1","1","2","2"
+"government-legitimacy","0.9",,"0.8",
+"[reporter]","[step]","count agents with [active?]","[step]","count agents with [active?]"
+"[final]","2","5","1","1"
+"[total steps]","2","2","1","1"
+
+"[all run data]","[step]","count agents with [active?]","[step]","count agents with [active?]"
+,"0","1","0","0.5"
+,"1","2","1","1"
+,"2","5",,
+'''
+
+
+@pytest.fixture(params=['numpy', 'arrow'])
+def engine(request):
+    if request.param == 'arrow':
+        pytest.importorskip('pyarrow.csv')
+    return request.param
+
+
+def write(tmp_path, text):
+    path = tmp_path / 'export.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_table_format(tmp_path, engine):
+    result = read_behaviorspace(write(tmp_path, TABLE), engine=engine)
+    assert result.format == 'table' and result.experiment == 'experiment'
+    assert result.world == {'min-pxcor': -20, 'max-pxcor': 19, 'min-pycor': -20, 'max-pycor': 19}
+    assert result.runs == {1: {'government-legitimacy': 0.9, 'visualize': True},
+                           2: {'government-legitimacy': 0.8, 'visualize': False}}
+    columns = result.columns
+    assert columns['[run number]'].tolist() == [1, 1, 2]
+    assert columns['[step]'].dtype.kind == 'i'
+    assert columns['visualize'].tolist() == [True, True, False]
+    assert columns['count agents with [active?]'].tolist() == [0.0, 3.5, 2.0]
+    assert columns['label'].tolist() == ['a', 'b', 'c']
+    assert result.run(2)['[step]'].tolist() == [0]
+
+
+def test_spreadsheet_runs_of_different_length(tmp_path, engine):
+    result = read_behaviorspace(write(tmp_path, SPREADSHEET), engine=engine)
+    assert result.format == 'spreadsheet'
+    assert result.reporters == ['count agents with [active?]']
+    assert result.runs == {1: {'government-legitimacy': 0.9}, 2: {'government-legitimacy': 0.8}}
+    assert result.columns['[run number]'].tolist() == [1, 1, 1, 2, 2]
+    assert result.columns['[step]'].tolist() == [0, 1, 2, 0, 1]
+    assert np.allclose(result.columns['count agents with [active?]'], [1, 2, 5, 0.5, 1])
+
+
+def test_engines_agree_on_a_netlogo_export(engine):
+    path = os.path.join(ROOT, 'scripts', 'replication', 'rep1.nlogo.csv')
+    result = read_behaviorspace(path, engine=engine)
+    reference = read_behaviorspace(path, engine='numpy')
+    assert len(result) == 202 and result.runs[1]['government-legitimacy'] == 0.9
+    for name, values in reference.columns.items():
+        assert result.columns[name].dtype.kind == values.dtype.kind
+        assert (result.columns[name] == values).all()
+
+
+def test_rejects_other_files(tmp_path):
+    with pytest.raises(ValueError):
+        read_behaviorspace(write(tmp_path, 'a,b\n1,2\n'))
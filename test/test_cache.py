@@ -0,0 +1,75 @@
+"""
+Regression checks of rebellion.cache and the cached adaptive sweep (run with `python -m pytest test`).
+"""
+import os
+
+import numpy as np
+import pytest
+
+from rebellion.cache import RunCache, run_key
+from rebellion.model import Model
+from rebellion.sweep import AdaptiveSweep
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def put(cache, index, length=20):
+    key = f'{index:064x}'
+    return cache.put(key, {'index': index}, {'active': np.arange(length)}, {'peak_active': index})
+
+
+def test_round_trip(tmp_path):
+    cache = RunCache(str(tmp_path))
+    put(cache, 7)
+    run = cache.get(f'{7:064x}')
+    assert run.spec == {'index': 7} and run.summary == {'peak_active': 7}
+    assert run.data['active'].tolist() == list(range(20))
+    assert cache.get(f'{8:064x}') is None and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_keys_depend_on_every_part_of_the_run():
+    key = run_key(PARAMETERS, 1, 100)
+    assert key == run_key(dict(PARAMETERS, agent_density=70.0), 1, 100)
+    assert len({key, run_key(PARAMETERS, 2, 100), run_key(PARAMETERS, 1, 101), run_key(PARAMETERS, 1, 100, 'rep2'),
+                run_key(PARAMETERS, 1, 100, schedule=[{'tick': 5}])}) == 5
+
+
+def test_eviction_keeps_the_limit_and_the_recently_used_entries(tmp_path):
+    cache = RunCache(str(tmp_path), max_entries=30)
+    for index in range(30):
+        put(cache, index)
+        os.utime(cache.path(f'{index:064x}'), (index, index))  # A distinct LRU clock per entry
+    cache.get(f'{0:064x}')  # A hit makes the oldest entry the most recently used
+    for index in range(30, 40):
+        put(cache, index)
+    assert len(cache) <= 30
+    assert f'{0:064x}' in cache and f'{39:064x}' in cache and f'{1:064x}' not in cache
+    # The running total matches the directory after a scan
+    cache.evict()
+    assert cache._bytes == cache.size() and cache._count == len(cache)
+
+
+def test_eviction_by_size(tmp_path):
+    cache = RunCache(str(tmp_path), max_bytes=20000)
+    for index in range(200):
+        put(cache, index, length=100)
+    assert cache.size() <= 20000 and f'{199:064x}' in cache
+
+
+def test_get_or_run_runs_the_variant_of_the_key(tmp_path):
+    cache = RunCache(str(tmp_path))
+    run = cache.get_or_run(PARAMETERS, 3, 40, variant='rep2')
+    assert run.data['active'].tolist() == Model(**PARAMETERS, seed=3, rules='rep2').run(40)['active']
+    assert cache.get_or_run(PARAMETERS, 3, 40, variant='rep2').data['active'].tolist() == run.data['active'].tolist()
+    with pytest.raises(ValueError):
+        cache.get_or_run(PARAMETERS, 3, 40, variant='no-such-variant')
+
+
+def test_adaptive_sweep_caches_per_variant(tmp_path):
+    base = dict(PARAMETERS)
+    del base['gov_legitimacy']
+    cache = RunCache(str(tmp_path))
+    sweep = AdaptiveSweep('gov_legitimacy', 0.6, 0.9, base, ticks=20, coarse_points=2, cache=cache, variant='rep2')
+    sweep.evaluate(0.6)
+    assert run_key(dict(base, gov_legitimacy=0.6), 0, 20, 'rep2') in cache
+    assert run_key(dict(base, gov_legitimacy=0.6), 0, 20) not in cache
@@ -0,0 +1,56 @@
+"""
+Regression checks of rebellion.counter and the keyed draws of both engines (run with `python -m pytest test`
+from the repository root).
+"""
+import numpy as np
+import pytest
+
+from rebellion import counter, kernel
+from rebellion.kernel import KernelModel
+from rebellion.model import Model
+from rebellion.trace import snapshot
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+MASK = counter.MASK
+
+# Known-answer vectors of threefry2x64_13 from Random123 (kat_vectors): counter, key, output
+KAT = [
+    ((0, 0), (0, 0), (0xf167b032c3b480bd, 0xe91f9fee4b7a6fb5)),
+    ((MASK, MASK), (MASK, MASK), (0xccdec5c917a874b1, 0x4df53abca26ceb01)),
+    ((0x243f6a8885a308d3, 0x13198a2e03707344), (0xa4093822299f31d0, 0x082efa98ec4e6c89),
+     (0xc3aac71561042993, 0x3fe7ae8801aff316)),
+]
+
+
+@pytest.mark.parametrize('block, key, expected', KAT)
+def test_threefry_known_answers(block, key, expected):
+    assert counter.threefry(*key, *block) == expected
+    words = [np.uint64(word) for word in (*key, *block)]
+    with np.errstate(over='ignore'):
+        assert int(kernel._threefry(*words)) == expected[0]
+
+
+@pytest.mark.filterwarnings('error')
+def test_pure_python_fallback_does_not_warn(monkeypatch):
+    # Without numba the kernel functions run as plain Python on NumPy scalars, which warn on uint64 overflow
+    for name in ('_threefry', '_keyed', '_keyed_uniform', '_keyed_order', '_keyed_setup', '_keyed_randints'):
+        function = getattr(kernel, name)
+        monkeypatch.setattr(kernel, name, getattr(function, 'py_func', function))
+    vision = {'low': 2, 'high': 7}
+    model = KernelModel(**PARAMETERS, seed=5, rng='counter', agent_vision=vision, cop_vision=vision)
+    reference = Model(**PARAMETERS, seed=5, rng='counter', agent_vision=vision, cop_vision=vision)
+    assert model.visions.tolist() == [entity.vision for entity in reference.entities]
+
+
+@pytest.mark.filterwarnings('error')
+def test_engines_draw_the_same_run():
+    vision = {'low': 2, 'high': 7}
+    model = Model(**PARAMETERS, seed=11, rng='counter', cop_vision=vision)
+    fast = KernelModel(**PARAMETERS, seed=11, rng='counter', cop_vision=vision)
+    for tick in range(20):
+        model.step()
+        fast.step()
+        first, second = snapshot(model), snapshot(fast)
+        for field in ('grid', 'position', 'status'):
+            assert (first[field] == second[field]).all(), f"tick {tick}: {field} differs"
+    assert model.data == fast.data
@@ -0,0 +1,61 @@
+"""
+Regression checks of rebellion.ensemble (run with `python -m pytest test` from the repository root).
+"""
+import numpy as np
+import pytest
+
+from rebellion.ensemble import Ensemble, QuantileSketch, RunningStats, aggregate
+from rebellion.experiment import simulate
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def test_merged_statistics_match_numpy():
+    values = np.random.default_rng(1).lognormal(3, 1, size=(500, 8))
+    values[:, 0] += 1e3  # An offset, where the naive sum of squares loses digits
+    parts = []
+    for chunk in np.array_split(values, [7, 8, 250, 251]):  # Includes an empty and single-run parts
+        stats = RunningStats(8)
+        for row in chunk:
+            stats.add(row)
+        parts.append(stats)
+    merged = RunningStats(8)
+    for stats in parts:
+        merged.merge(stats)
+    assert merged.count == 500
+    assert np.allclose(merged.mean, values.mean(axis=0), rtol=1e-13, atol=0)
+    assert np.allclose(merged.variance, values.var(axis=0, ddof=1), rtol=1e-13, atol=0)
+    assert (merged.min == values.min(axis=0)).all() and (merged.max == values.max(axis=0)).all()
+
+
+def test_sketch_quantiles_are_within_the_relative_accuracy():
+    values = np.random.default_rng(2).normal(0, 50, size=(2000, 3))
+    first, second = QuantileSketch(3), QuantileSketch(3)
+    for row in values[:1200]:
+        first.add(row)
+    for row in values[1200:]:
+        second.add(row)
+    first.merge(second)
+    for q in (0, 0.05, 0.5, 0.95, 1):
+        exact = np.quantile(values, q, axis=0, method='lower')
+        assert np.all(np.abs(first.quantile(q) - exact) <= 0.01 * np.abs(exact) + 1e-12), q
+    with pytest.raises(ValueError):
+        first.quantile(1.5)
+
+
+def test_sketch_counts_are_exact_below_fifty():
+    sketch = QuantileSketch(1)
+    for value in [0, 3, 3, 7, 12, 49]:
+        sketch.add([value])
+    assert [round(sketch.quantile(q)[0]) for q in (0, 0.2, 0.6, 1)] == [0, 3, 7, 49]
+
+
+def test_aggregate_matches_the_runs():
+    ensemble = aggregate(PARAMETERS, seeds=range(6), ticks=30, workers=1, batch_size=4)
+    runs = np.array([simulate(PARAMETERS, seed, 30)['active'] for seed in range(6)], dtype=float)
+    assert ensemble.runs == 6
+    assert np.allclose(ensemble.mean('active'), runs.mean(axis=0), rtol=1e-13)
+    assert np.allclose(ensemble.std('active'), runs.std(axis=0, ddof=1), rtol=1e-12, atol=1e-12)
+    assert set(ensemble.summary()) == set(ensemble.metrics) and ensemble.summary()['peak_active']['count'] == 6
+    with pytest.raises(ValueError):
+        Ensemble().mean('active')
@@ -0,0 +1,38 @@
+"""
+Regression checks of rebellion.equivalence (run with `python -m pytest test` from the repository root).
+"""
+from rebellion.equivalence import check, format_report, ks_test, z_score
+from rebellion.kernel import KernelModel
+
+
+class SwappingKernel(KernelModel):
+    """A kernel that swaps the hardship of two agents after its fifth step; the counts stay the same."""
+    def step(self):
+        super().step()
+        if self.tick == 5:
+            self.hardship[[0, 1]] = self.hardship[[1, 0]]
+
+
+def test_exact_mode_on_two_cases():
+    report = check('kernel', mode='exact', names=['origin', 'extension2'], ticks=30, exact_seeds=1, workers=1)
+    assert report['passed'], format_report(report)
+    assert all(entry['exact'] == [(0, None)] for entry in report['cases'].values())
+
+
+def test_exact_mode_compares_the_turtles():
+    report = check(SwappingKernel, mode='exact', names=['origin'], ticks=30, exact_seeds=1, workers=1)
+    (seed, (tick, what, expected, actual)), = report['cases']['origin']['exact']
+    assert not report['passed'] and (tick, what) == (4, 'turtle 0 hardship') and expected != actual
+    assert "'turtle 0 hardship' differs first at tick 4" in format_report(report)
+
+
+def test_statistical_mode_on_a_short_case():
+    report = check('kernel', mode='statistical', names=['origin'], ticks=40, seeds=8, workers=1)
+    assert report['passed'], format_report(report)
+    assert report['cases']['origin']['statistical']['metrics']
+
+
+def test_statistics():
+    assert z_score([1, 1], [1, 1]) == 0.0 and z_score([1, 2, 3], [1, 2, 3]) == 0.0
+    assert ks_test([1, 2, 3, 4], [1, 2, 3, 4])[1] == 1.0
+    assert ks_test(list(range(50)), list(range(100, 150)))[1] < 1e-6
@@ -0,0 +1,91 @@
+"""
+Regression checks of rebellion.ledger and ledger-backed sweeps (run with `python -m pytest test` from the
+repository root).
+"""
+import shutil
+
+import pytest
+
+from rebellion.experiment import Experiment, execute
+from rebellion.ledger import DONE, FAILED, PENDING, RUNNING, JobLedger
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def jobs(count):
+    return [(f'{index:064x}', dict(PARAMETERS, index=index), index) for index in range(count)]
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = JobLedger(str(tmp_path / 'jobs.db'), stale_after=60, max_attempts=2)
+    yield ledger
+    ledger.close()
+
+
+def fail_for_good(ledger, worker='w'):
+    for _ in range(ledger.max_attempts):
+        for job in ledger.claim(worker, limit=100):
+            assert ledger.fail(job, 'boom')
+
+
+def test_claims_are_exclusive(ledger, tmp_path):
+    assert ledger.add_jobs('e', jobs(5)) == 5 and ledger.add_jobs('e', jobs(6)) == 1
+    other = JobLedger(str(tmp_path / 'jobs.db'))
+    first, second = ledger.claim('a', limit=4), other.claim('b', limit=4)
+    other.close()
+    assert len(first) == 4 and len(second) == 2
+    assert not {job.key for job in first} & {job.key for job in second}
+    assert ledger.claim('c') == [] and ledger.counts('e')[RUNNING] == 6
+    assert first[0].params['index'] == 0 and first[0].attempts == 1
+
+
+def test_stale_jobs_are_reclaimed_and_only_the_holder_records(ledger):
+    ledger.add_jobs('e', jobs(1))
+    (job,) = ledger.claim('a')
+    assert 0 < ledger.wait_time('e') <= 60
+    ledger.connection.execute('UPDATE jobs SET heartbeat = heartbeat - 120')  # Worker a stops beating
+    assert ledger.wait_time('e') == 0
+    (again,) = ledger.claim('b')
+    assert again.attempts == 2
+    assert not ledger.complete(job, 'out', 0.0) and not ledger.fail(job, 'late')
+    assert ledger.complete(again, 'out', 0.0)
+    assert ledger.counts('e') == {PENDING: 0, RUNNING: 0, DONE: 1, FAILED: 0}
+    assert ledger.wait_time('e') is None
+
+
+def test_failed_jobs_stop_after_max_attempts_until_reset(ledger):
+    ledger.add_jobs('e', jobs(3))
+    fail_for_good(ledger)
+    assert ledger.claim('a') == [] and ledger.wait_time('e') is None
+    assert [failure[3] for failure in ledger.failures('e')] == ['boom'] * 3
+    assert ledger.reset('e', keys=[f'{0:064x}']) == 1
+    assert ledger.reset('e') == 2 and ledger.failures('e') == []
+    assert [job.attempts for job in ledger.claim('a', limit=5)] == [1, 1, 1]
+
+
+def experiment(tmp_path, cache='cache'):
+    spec = dict(name='e', ticks=5, seeds=2, parameters=dict(PARAMETERS, gov_legitimacy=[0.6, 0.9]),
+                cache=cache, ledger='jobs.db')
+    return Experiment(spec, str(tmp_path))
+
+
+def test_sweep_reruns_done_jobs_missing_from_the_cache(tmp_path):
+    results = execute(experiment(tmp_path), workers=1, progress=None)
+    shutil.rmtree(tmp_path / 'cache')
+    assert execute(experiment(tmp_path), workers=1, progress=None) == results
+    # A different cache directory holds none of the outputs either
+    assert execute(experiment(tmp_path, cache='other'), workers=1, progress=None) == results
+
+
+def test_sweep_retries_failed_jobs_on_request(tmp_path):
+    first = experiment(tmp_path)
+    ledger = JobLedger(first.ledger)
+    execute(first, workers=1, progress=None)  # Registers the jobs
+    ledger.reset('e', DONE)
+    fail_for_good(ledger)
+    with pytest.raises(RuntimeError, match='retry-failed'):
+        execute(first, workers=1, progress=None)
+    results = execute(first, workers=1, progress=None, retry_failed=True)
+    assert len(results) == 4 and ledger.counts('e')[DONE] == 4
+    ledger.close()
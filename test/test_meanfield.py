@@ -0,0 +1,28 @@
+"""
+Regression checks of rebellion.meanfield (run with `python -m pytest test` from the repository root).
+"""
+from rebellion.meanfield import MeanFieldModel, screen
+
+BASE = dict(agent_density=70, cop_density=4, vision=7, k=2.3, max_jail_term=30)
+
+
+def entry(gov_legitimacy, agrees):
+    return {'params': dict(BASE, gov_legitimacy=gov_legitimacy), 'agrees': agrees}
+
+
+def test_mean_field_conserves_the_agents():
+    model = MeanFieldModel(**BASE, gov_legitimacy=0.6)
+    data = model.run(50)
+    totals = [sum(counts) for counts in zip(data['quiet'], data['active'], data['jail'])]
+    assert max(totals) - min(totals) < 1e-6 * totals[0]
+
+
+def test_screen_marks_points_outside_the_calibrated_region():
+    grid = {'gov_legitimacy': [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]}
+    # As calibrate reports: agreement at high legitimacy only
+    calibration = [entry(0.95, True), entry(0.82, False), entry(0.3, False)]
+    results = screen(BASE, grid, ticks=100, calibration=calibration)
+    inside = {result['params']['gov_legitimacy']: result['calibrated'] for result in results}
+    assert inside == {0.5: False, 0.6: False, 0.7: False, 0.8: False, 0.9: True, 0.95: True}
+    assert all(result['simulate'] for result in results if not result['calibrated'])
+    assert all(result['calibrated'] is None for result in screen(BASE, grid, ticks=100))
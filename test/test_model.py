@@ -0,0 +1,18 @@
+"""
+Regression checks of rebellion.model (run with `python -m pytest test` from the repository root).
+"""
+from rebellion.model import EntityType, Model
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def test_each_turtle_takes_one_turn_per_tick():
+    # Seeds 0-2 all arrest and release an agent within one tick in the first few ticks
+    for seed in range(3):
+        model = Model(**PARAMETERS, seed=seed)
+        num_agents = sum(entity.type == EntityType.AGENT for entity in model.entities)
+        for tick in range(30):
+            model.step()
+            ids = [entity.agent_id for entity in model.free_entities]
+            assert len(ids) == len(set(ids)), f"seed {seed}, tick {tick}: a turtle is listed twice"
+            assert model.data['quiet'][-1] + model.data['active'][-1] + model.data['jail'][-1] == num_agents
@@ -0,0 +1,49 @@
+"""
+Regression checks of rebellion.rules (run with `python -m pytest test` from the repository root).
+"""
+import pytest
+
+from rebellion.kernel import KernelModel
+from rebellion.model import EntityType, Model
+from rebellion.rules import stay_while_active
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+@pytest.mark.parametrize('engine', [Model, KernelModel])
+def test_jail_term_policies(engine):
+    rise = engine(**PARAMETERS, seed=1, rules='extension3')
+    rise.run(101)
+    assert rise.max_jail_term == 30
+    rise.run(1)
+    assert rise.max_jail_term == 50
+    decay = engine(**PARAMETERS, seed=1, rules='extension3_origin')
+    decay.run(5)
+    assert decay.max_jail_term == 25
+    decay.run(30)
+    assert decay.max_jail_term == 10
+
+
+def test_engines_agree_on_the_jail_term_decay():
+    model = Model(**PARAMETERS, seed=4, rules='extension3_origin', rng='counter')
+    kernel = KernelModel(**PARAMETERS, seed=4, rules='extension3_origin', rng='counter')
+    assert model.run(40) == kernel.run(40)
+
+
+def test_agents_about_to_turn_active_stay():
+    model = Model(**PARAMETERS, seed=2, rules='stay_active')
+    agents = [entity for entity in model.entities if entity.type is EntityType.AGENT]
+    model.set_parameter('gov_legitimacy', 0.0)
+    restless = max(agents, key=lambda agent: agent.hardship - agent.risk_aversion)
+    assert restless.hardship - restless.risk_aversion * model.estimate_arrest_probability(restless.position) > 0.1
+    position = restless.position
+    stay_while_active(model, restless)
+    assert restless.position == position
+    model.set_parameter('gov_legitimacy', 1.0)  # No grievance: every agent moves
+    starts = [agent.position for agent in agents[:50]]
+    for agent in agents[:50]:
+        stay_while_active(model, agent)
+    assert sum(agent.position != start for agent, start in zip(agents, starts)) > 25
+    model.run(5)
+    with pytest.raises(ValueError):
+        KernelModel(**PARAMETERS, seed=2, rules='stay_active')
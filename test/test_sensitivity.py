@@ -0,0 +1,57 @@
+"""
+Regression checks of rebellion.sensitivity (run with `python -m pytest test` from the repository root).
+"""
+import math
+
+import numpy as np
+import pytest
+
+from rebellion.sensitivity import (BOUNDS, SobolAnalysis, evaluate_point, feasible, morris_design, morris_indices,
+                                   saltelli_design)
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+UNIT = {'x1': (0, 1), 'x2': (0, 1), 'x3': (0, 1)}
+
+
+def additive(values, seed):
+    # Var(4 x1) = 16/12, Var(2 x2) = 4/12, x3 has no effect: S1 = ST = (0.8, 0.2, 0)
+    return {'mean_active': 4 * values[0] + 2 * values[1]}
+
+
+def test_default_bounds_are_feasible():
+    rows, _ = morris_design(BOUNDS, 10, seed=1)
+    assert feasible(rows, list(BOUNDS)).all()
+    rows = saltelli_design(BOUNDS, 32, seed=1)
+    assert rows.shape == (32 * (len(BOUNDS) + 2), len(BOUNDS)) and feasible(rows, list(BOUNDS)).all()
+
+
+def test_sobol_indices_of_an_additive_function():
+    analysis = SobolAnalysis(UNIT, base_samples=512, seed=1, evaluate=additive)
+    reports = list(analysis.run(workers=1, bootstrap=100))
+    groups = [report['groups'] for report in reports]
+    assert groups == sorted(set(groups)) and groups[-1] == 512
+    final = reports[-1]
+    for name, expected in zip(UNIT, (0.8, 0.2, 0.0)):
+        low, high = final['S1_conf'][name]
+        assert low <= expected <= high
+        assert final['ST'][name] == pytest.approx(expected, abs=0.05)
+    assert final['S1']['x3'] == final['ST']['x3'] == 0
+
+
+def test_sobol_rejects_infeasible_bounds():
+    with pytest.raises(ValueError):
+        SobolAnalysis(dict(BOUNDS, agent_density=(0, 100)), base_samples=4)
+    with pytest.raises(ValueError):
+        SobolAnalysis({'agent_density': (0, 90)}, base_samples=4, base_params={'cop_density': 20})
+
+
+def test_morris_skips_infeasible_points():
+    bounds = {'agent_density': (50, 100), 'cop_density': (0, 10)}
+    rows, changed = morris_design(bounds, 4, seed=0)
+    ok = feasible(rows, list(bounds))
+    assert not ok.all()
+    outputs = [evaluate_point(row, 0, list(bounds), PARAMETERS, 5)['mean_active'] for row in rows]
+    assert np.isnan(outputs).tolist() == (~ok).tolist()
+    result = morris_indices(outputs, changed, rows, list(bounds))
+    assert all(0 < count <= 4 for count in result['effects'].values())
+    assert all(math.isfinite(value) for value in result['mu_star'].values())
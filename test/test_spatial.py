@@ -0,0 +1,66 @@
+"""
+Regression checks of rebellion.spatial (run with `python -m pytest test` from the repository root).
+"""
+import numpy as np
+
+from rebellion.spatial import NEIGHBORS, analyze_trace, cluster_statistics, label_clusters, morans_i
+from rebellion.trace import record_run
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def reference_labels(mask):
+    # Breadth-first search on the torus; each component is labelled by its smallest flat index
+    width, height = mask.shape
+    labels = np.full(mask.shape, -1)
+    for start in zip(*np.nonzero(mask)):
+        if labels[start] >= 0:
+            continue
+        component, frontier = {start}, [start]
+        while frontier:
+            x, y = frontier.pop()
+            for dx, dy in NEIGHBORS:
+                cell = ((x + dx) % width, (y + dy) % height)
+                if mask[cell] and cell not in component:
+                    component.add(cell)
+                    frontier.append(cell)
+        label = min(x * height + y for x, y in component)
+        for cell in component:
+            labels[cell] = label
+    return labels
+
+
+def test_clusters_wrap_around_the_torus():
+    mask = np.zeros((6, 5), dtype=bool)
+    for cell in ((0, 0), (5, 0), (0, 4), (5, 4), (3, 2)):  # Four corners touch across both edges
+        mask[cell] = True
+    labels = label_clusters(mask)
+    assert {labels[cell] for cell in ((0, 0), (5, 0), (0, 4), (5, 4))} == {0}
+    assert labels[3, 2] == 3 * 5 + 2 and (labels[~mask] == -1).all()
+    statistics = cluster_statistics(mask[None])
+    assert statistics['clusters'].tolist() == [2] and statistics['largest_cluster'].tolist() == [4]
+
+
+def test_labels_match_a_breadth_first_search():
+    masks = np.random.default_rng(0).random((8, 12, 9)) < 0.35
+    labels = label_clusters(masks)
+    for mask, frame in zip(masks, labels):
+        assert (frame == reference_labels(mask)).all()
+
+
+def test_morans_i_of_known_patterns():
+    x = np.arange(6)[:, None] + np.zeros(6, dtype=int)[None]
+    checkerboard = (x + x.T) % 2
+    stripes = x % 2
+    # Of the 8 Moore neighbours, a checkerboard cell has 4 alike and a striped cell 2
+    assert np.allclose(morans_i(np.array([checkerboard, stripes])), [0.0, -0.5])
+    assert np.isnan(morans_i(np.ones((4, 4))))
+
+
+def test_trace_statistics_do_not_depend_on_the_chunk(tmp_path):
+    path = str(tmp_path / 'run.trace')
+    record_run(dict(PARAMETERS, gov_legitimacy=0.6), 2, 30, path)
+    whole, chunked = analyze_trace(path), analyze_trace(path, chunk=7)
+    assert whole['tick'].tolist() == list(range(31)) and whole['active'].max() > 0
+    for name in ('active', 'clusters', 'largest_cluster', 'morans_i', 'front_speed', 'contact_fraction'):
+        assert np.array_equal(whole[name], chunked[name], equal_nan=True), name
@@ -0,0 +1,81 @@
+"""
+Regression checks of rebellion.store (run with `python -m pytest test` from the repository root).
+"""
+import numpy as np
+import pytest
+
+from rebellion.store import ResultStore
+
+PARAMETERS = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+
+
+def runs(legitimacies=(0.6, 0.7, 0.8), seeds=range(3), ticks=10):
+    result = []
+    for legitimacy in legitimacies:
+        for seed in seeds:
+            active = np.arange(ticks) * seed + int(legitimacy * 10)
+            result.append(dict(params=dict(PARAMETERS, gov_legitimacy=legitimacy), seed=seed, ticks=ticks,
+                               data={'quiet': 100 - active, 'jail': np.zeros(ticks, int), 'active': active}))
+    return result
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResultStore(str(tmp_path / 'results'))
+    assert store.add_many(runs()) == 9
+    yield store
+    store.close()
+
+
+def test_add_many_skips_stored_and_repeated_runs(store):
+    assert store.add_many(runs() + runs(legitimacies=[0.9]) * 2) == 3
+    assert len(store) == 12
+    # The kernel's runs of the same point are other runs
+    assert store.add_many(dict(run, engine='kernel') for run in runs(legitimacies=[0.9])) == 3
+
+
+def test_where_forms(store):
+    assert len(store.query({'gov_legitimacy': 0.7})) == 3
+    assert len(store.query({'gov_legitimacy': (0.65, 0.85)})) == 6
+    assert [row['seed'] for row in store.query({'seed': [0, 2], 'gov_legitimacy': 0.6})] == [0, 2]
+    assert store.query({'experiment': None}, columns=['seed'], limit=2) == [{'seed': 0}, {'seed': 1}]
+    with pytest.raises(ValueError):
+        store.query({'no_such_column': 1})
+
+
+def test_aggregate_by_a_parameter(store):
+    groups = store.aggregate('peak_active', where={'vision': 7}, by=['gov_legitimacy'])
+    assert [group['gov_legitimacy'] for group in groups] == [0.6, 0.7, 0.8]
+    for group, legitimacy in zip(groups, (0.6, 0.7, 0.8)):
+        peaks = [9 * seed + int(legitimacy * 10) for seed in range(3)]
+        assert group['count'] == 3 and group['min'] == min(peaks) and group['max'] == max(peaks)
+        assert group['mean'] == pytest.approx(np.mean(peaks))
+        assert group['std'] == pytest.approx(np.std(peaks, ddof=1))
+    with pytest.raises(ValueError):
+        store.aggregate('peak_active', statistics=['median'])
+
+
+def test_series_reads_the_selected_rows(store):
+    store.add_many(runs(legitimacies=[0.9]))  # A second segment
+    rows, values = store.series('active', where={'seed': 2})
+    assert [row['gov_legitimacy'] for row in rows] == [0.6, 0.7, 0.8, 0.9]
+    expected = [np.arange(10) * 2 + int(row['gov_legitimacy'] * 10) for row in rows]
+    assert values.shape == (4, 10) and (values == expected).all()
+    store.add(PARAMETERS, 5, 20, summary={'peak_active': 0})  # Catalog only, and of another length
+    assert len(store.series('active')[0]) == 12
+    store.add(PARAMETERS, 6, 20, data={'active': np.zeros(20, int)})
+    with pytest.raises(ValueError):
+        store.series('active')
+
+
+def test_import_csv(store, tmp_path):
+    path = tmp_path / 'extension1_0.3.csv'
+    path.write_text('tick,quiet agents,jailed agents,active agents\n0,90,0,10\n1,80,5,15\n2,85,5,10\n')
+    params = dict(PARAMETERS, gov_legitimacy=0.3)
+    assert store.import_csv(str(path), params, experiment='extension1') == 1
+    assert store.import_csv(str(path), params, experiment='extension1') == 0
+    rows, values = store.series('active', where={'experiment': 'extension1'})
+    assert values.tolist() == [[10, 15, 10]] and rows[0]['peak_active'] == 15 and rows[0]['seed'] is None
+    path.write_text('tick,other\n0,1\n')
+    with pytest.raises(ValueError):
+        store.import_csv(str(path), params)
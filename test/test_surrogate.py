@@ -0,0 +1,47 @@
+"""
+Regression checks of rebellion.surrogate (run with `python -m pytest test` from the repository root).
+"""
+import numpy as np
+import pytest
+
+from rebellion.sensitivity import feasible
+from rebellion.surrogate import PARAMETERS, Emulator
+
+BOUNDS = {'agent_density': (50, 100), 'cop_density': (0, 20), 'vision': (1, 10), 'k': (1, 3),
+          'gov_legitimacy': (0, 1), 'max_jail_term': (0, 50)}
+
+
+def synthetic(rows):
+    # A smooth response standing in for the run summaries
+    rows = np.asarray(rows, dtype=float)
+    mean_active = rows[:, 0] * (1 - rows[:, 4]) + rows[:, 2]
+    return np.column_stack([mean_active, np.sin(rows[:, 3]), rows[:, 1] ** 2])
+
+
+@pytest.fixture
+def emulator():
+    rng = np.random.default_rng(0)
+    low = np.array([BOUNDS[name][0] for name in PARAMETERS], dtype=float)
+    high = np.array([BOUNDS[name][1] for name in PARAMETERS], dtype=float)
+    x = low + rng.random((120, len(low))) * (high - low)
+    return Emulator().fit(x, synthetic(x))
+
+
+def test_predictions_interpolate_the_training_function(emulator):
+    point = dict(agent_density=70, cop_density=4, vision=7, k=2.3, gov_legitimacy=0.82, max_jail_term=30)
+    mean, std = emulator.predict(point)
+    expected = synthetic([[point[name] for name in PARAMETERS]])[0]
+    assert mean['mean_active'] == pytest.approx(expected[0], abs=3 * std['mean_active'] + 1)
+    assert all(value >= 0 for value in std.values())
+    with pytest.raises(ValueError):
+        Emulator().fit([[0] * len(PARAMETERS)], [[0, 0, 0]])
+
+
+def test_suggestions_are_feasible_and_rounded(emulator):
+    suggestions = emulator.suggest(BOUNDS, n=20, candidates=2000, seed=1)
+    assert len(suggestions) == 20
+    rows = np.array([[point[name] for name in PARAMETERS] for point in suggestions])
+    assert feasible(rows, PARAMETERS).all()
+    assert all(isinstance(point['vision'], int) and isinstance(point['max_jail_term'], int) for point in suggestions)
+    uncertainty = emulator.uncertainty(rows)
+    assert (np.diff(uncertainty) <= 1e-12).all()